@@ -0,0 +1,37 @@
+// Unpacks the base64 arrays sent by `viz.figure_update` into the figure
+const TYPED_ARRAYS = { f4: Float32Array, i4: Int32Array };
+
+function decodeArray(value) {
+  if (!value || value.bdata === undefined) {
+    return value;
+  }
+  const bytes = Uint8Array.from(atob(value.bdata), (c) => c.charCodeAt(0));
+  const array = new TYPED_ARRAYS[value.dtype](bytes.buffer);
+  if (!value.categories) {
+    return array;
+  }
+  // Code -1 is a missing value
+  return Array.from(array, (code) => (code < 0 ? null : value.categories[code]));
+}
+
+// Copies only the objects along `location`, like Dash's own Patch does
+function assign(target, location, value) {
+  const [key, ...rest] = location;
+  const copy = Array.isArray(target) ? target.slice() : { ...target };
+  copy[key] = rest.length ? assign(copy[key] || {}, rest, value) : value;
+  return copy;
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+  network: {
+    apply_update: function (update, figure) {
+      if (!update || !figure) {
+        return window.dash_clientside.no_update;
+      }
+      return update.reduce(
+        (next, [location, value]) => assign(next, location, decodeArray(value)),
+        figure
+      );
+    },
+  },
+});
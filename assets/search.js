@@ -0,0 +1,69 @@
+// Decides which edits to the search table's filter need the server
+const SEARCH_DEBOUNCE_MS = 300;
+let lastEdit = 0;
+
+// Splits a filter query into clauses, or returns null if it can't
+function parseQuery(query) {
+  if (!query) {
+    return [];
+  }
+  const clauses = [];
+  for (const part of query.split(" && ")) {
+    const match = part.match(/^\{([^}]+)\}\s+(\S+)\s+(.*)$/);
+    if (!match) {
+      return null;
+    }
+    const value = match[3].replace(/^(["'`])(.*)\1$/, "$2");
+    clauses.push({ column: match[1], operator: match[2], value: value });
+  }
+  return clauses;
+}
+
+// Whether every row matching `query` also matches `base`
+function refines(base, query) {
+  const before = parseQuery(base);
+  const after = parseQuery(query);
+  if (before === null || after === null) {
+    return false;
+  }
+  return before.every((old) =>
+    after.some(
+      (clause) =>
+        clause.column === old.column &&
+        clause.operator === old.operator &&
+        (clause.value === old.value ||
+          (old.operator === "contains" && clause.value.includes(old.value)))
+    )
+  );
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+  search: {
+    request: function (query, page, _ticks, local, request) {
+      const no_update = window.dash_clientside.no_update;
+      const triggered = window.dash_clientside.callback_context.triggered.map(
+        (t) => t.prop_id
+      );
+      if (local !== null && local !== undefined && refines(local, query || "")) {
+        // The table holds every match already and filters them itself
+        return [no_update, true];
+      }
+      if (triggered.includes("search.filter_query")) {
+        // Wait for a pause in typing before asking the server
+        lastEdit = Date.now();
+        return [no_update, false];
+      }
+      if (triggered.includes("search-debounce.n_intervals")) {
+        if (Date.now() - lastEdit < SEARCH_DEBOUNCE_MS) {
+          return [no_update, false];
+        }
+        return [{ query: query || "", page: 0 }, true];
+      }
+      const paged = triggered.includes("search.page_current");
+      if (paged && request && page !== request.page) {
+        return [{ query: request.query, page: page || 0 }, no_update];
+      }
+      return [no_update, no_update];
+    },
+  },
+});
@@ -0,0 +1,129 @@
+"""Times the figure and table builders at several network sizes
+
+Voters and contacts come from the synthetic generator, with random
+positions, so only the builders themselves are timed. `mock_data`
+includes its layout, which is not cached here, and is only run up to
+--mock-limit voters. `split_filter_part` parses one filter part per
+voter. Run from the repository root and compare runs to catch
+regressions:
+
+    python -m benchmarks.builders
+    python -m benchmarks.builders --sizes 1000 100000 --repeat 5
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import layouts
+from datasets import mock_data
+from graph import graph_core
+from synthetic import contact_batches, node_batches, precinct_starts
+from viz import (
+    display_table,
+    graph_edges,
+    split_filter_part,
+    unpack_edges,
+    unpack_nodes,
+)
+
+COLUMNS = ["voter_id", "first_name", "last_name", "precinct", "support"]
+FILTER_PARTS = [
+    "{voter_id} eq IA-{}",
+    "{last_name} contains {}",
+    "{precinct} gt {}",
+    '{support} eq "{}"',
+    "{first_name} datestartswith {}",
+]
+
+
+def synthetic_network(n_nodes: int, n_edges: int, dim: int = 3, seed: int = 538):
+    """Voters, contacts and a GraphCore with random positions"""
+    rng = np.random.default_rng(seed)
+    starts = precinct_starts(n_nodes, max(n_nodes // 1_000, 1), rng)
+    nodes = pa.Table.from_batches(node_batches(n_nodes, starts, rng)).to_pandas()
+    edges = pa.Table.from_batches(
+        contact_batches(n_nodes, n_edges, starts, rng)
+    ).to_pandas()
+    ids = pd.Index(nodes["voter_id"])
+    edge_index = np.column_stack(
+        [ids.get_indexer(edges["source"]), ids.get_indexer(edges["target"])]
+    )
+    positions = rng.random((n_nodes, dim))
+    return nodes, edges, graph_core(nodes, edges, positions, edge_index)
+
+
+def filter_parts(nodes: pd.DataFrame) -> list:
+    """One filter part per voter, cycling through the operators"""
+    values = [
+        nodes["voter_id"].str[3:],
+        nodes["last_name"].astype(str).str[:3],
+        nodes["precinct"].astype(str),
+        nodes["support"].astype(str),
+        nodes["first_name"].astype(str).str[:2],
+    ]
+    return [
+        FILTER_PARTS[row % len(FILTER_PARTS)].replace(
+            "{}", values[row % len(values)].iat[row]
+        )
+        for row in range(len(nodes))
+    ]
+
+
+def best_of(func, *args, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--edges-per-voter", type=int, default=5)
+    parser.add_argument("--mock-limit", type=int, default=10_000)
+    parser.add_argument("--layout", default="multilevel")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    # Time the layout mock_data runs rather than a cached copy of it
+    layouts.LAYOUT_CACHE_DIR = ""
+
+    print(f"{'voters':>8} {'contacts':>9} {'function':>20} {'time (s)':>9}")
+    for size in args.sizes:
+        nodes, edges, core = synthetic_network(size, size * args.edges_per_voter)
+        lines = unpack_edges(core)
+        matches = nodes["voter_id"].iloc[:: max(size // 1_000, 1)]
+        parts = filter_parts(nodes)
+        timings = {
+            "unpack_edges": (unpack_edges, core),
+            "unpack_nodes": (unpack_nodes, core),
+            "unpack_nodes matches": (unpack_nodes, core, matches),
+            "graph_edges": (lambda: graph_edges(*lines, ids=None),),
+            "display_table": (display_table, nodes, COLUMNS, "search"),
+            "display_table page": (
+                lambda: display_table(nodes, COLUMNS, "search", page_size=25),
+            ),
+            "split_filter_part": (lambda: [split_filter_part(p) for p in parts],),
+        }
+        if size <= args.mock_limit:
+            timings["mock_data"] = (
+                mock_data,
+                size,
+                size * args.edges_per_voter,
+                3,
+                args.layout,
+            )
+        for name, (func, *func_args) in timings.items():
+            elapsed = best_of(func, *func_args, repeat=args.repeat)
+            print(f"{size:>8} {len(edges):>9} {name:>20} {elapsed:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compares the layout engines on runtime and layout stress
+
+Stress measures how well distances in the layout follow shortest-path
+distances in the graph, after the best uniform scaling; lower is better.
+It is estimated from a sample of source nodes.
+
+Run from the repository root:
+
+    python -m benchmarks.layouts
+    python -m benchmarks.layouts --sizes 1000 10000 --spring-limit 1000
+
+spring_layout needs scipy above 500 nodes and is O(N^2) per iteration,
+so it only runs up to --spring-limit nodes.
+"""
+
+import argparse
+import time
+
+import networkx as nx
+import numpy as np
+
+from layouts import LAYOUTS
+
+
+def layout_stress(network: nx.Graph, positions, sources: int = 30, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    nodes = list(network.nodes())
+    rows = {node: row for row, node in enumerate(nodes)}
+    coords = np.array([positions[node] for node in nodes])
+
+    graph_distances = []
+    layout_distances = []
+    for source in rng.choice(len(nodes), min(sources, len(nodes)), replace=False):
+        lengths = nx.single_source_shortest_path_length(network, nodes[source])
+        lengths.pop(nodes[source])
+        targets = np.array([rows[node] for node in lengths])
+        graph_distances.append(np.fromiter(lengths.values(), dtype=float))
+        layout_distances.append(
+            np.linalg.norm(coords[targets] - coords[source], axis=1)
+        )
+    graph_distance = np.concatenate(graph_distances)
+    layout_distance = np.concatenate(layout_distances)
+
+    weight = graph_distance**-2
+    scale = (weight * graph_distance * layout_distance).sum() / (
+        weight * layout_distance**2
+    ).sum()
+    residual = scale * layout_distance - graph_distance
+    return (weight * residual**2).sum() / len(graph_distance)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, default=[100, 1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--layouts", nargs="+", default=list(LAYOUTS))
+    parser.add_argument("--spring-limit", type=int, default=3_000)
+    parser.add_argument("--dim", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'nodes':>8} {'layout':>12} {'time (s)':>9} {'stress':>7}")
+    for size in args.sizes:
+        # Heavy-tailed degrees with some clustering, like a contact graph
+        network = nx.powerlaw_cluster_graph(size, 2, 0.1, seed=538)
+        edge_index = np.array(network.edges(), dtype=np.int64).reshape(-1, 2)
+        for name in args.layouts:
+            if name == "spring" and size > args.spring_limit:
+                continue
+            start = time.perf_counter()
+            coords = LAYOUTS[name](size, edge_index, dim=args.dim, seed=538)
+            elapsed = time.perf_counter() - start
+            stress = layout_stress(network, dict(enumerate(coords)))
+            print(f"{size:>8} {name:>12} {elapsed:>9.2f} {stress:>7.4f}")
+
+
+if __name__ == "__main__":
+    main()
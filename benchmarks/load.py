@@ -0,0 +1,252 @@
+"""Replays organizer sessions against the callbacks, without a browser
+
+Each session searches by name, pages through the matches, clicks a
+few people, widens their neighborhood, pages their contacts, zooms the
+overview in and back out and limits the search to the people in view.
+Callbacks are called directly, like Dash would on each request, and
+their responses are serialized the way Dash sends them. Latency covers
+both, so one worker serves about 1 / mean requests per second of this
+mix. Background jobs and the network between browser and server are
+not included.
+
+Voters and contacts come from the synthetic generator unless --data
+points at a directory holding its nodes.arrow and edges.arrow.
+
+Run from the repository root:
+
+    python -m benchmarks.load
+    python -m benchmarks.load --nodes 100000 --edges 500000 --sessions 50
+    python -m benchmarks.load --data data --transport json
+"""
+
+import argparse
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from dash import no_update
+from dash._callback_context import context_value
+from dash._utils import AttributeDict, to_json
+
+import main as callbacks
+from loaders import voter_files
+from synthetic import generate
+
+PERCENTILES = [50, 95, 99]
+PAGE_SIZE = callbacks.PAGE_SIZE
+
+
+@contextmanager
+def triggered(*prop_ids):
+    """Stands in for the callback context Dash sets up for a request"""
+    inputs = [{"prop_id": prop_id, "value": None} for prop_id in prop_ids]
+    token = context_value.set(AttributeDict(triggered_inputs=inputs))
+    try:
+        yield
+    finally:
+        context_value.reset(token)
+
+
+class Recorder:
+    """Latency and response size of every call, by callback"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.sizes = defaultdict(list)
+
+    def call(self, func, *args, trigger=()):
+        """Calls a callback and serializes what it returns, like Dash
+
+        Outputs left as `no_update` aren't sent.
+        """
+        start = time.perf_counter()
+        with triggered(*trigger):
+            result = func(*args)
+        outputs = result if isinstance(result, (tuple, list)) else [result]
+        payload = to_json([output for output in outputs if output is not no_update])
+        self.latencies[func.__name__].append(time.perf_counter() - start)
+        self.sizes[func.__name__].append(len(payload))
+        return result
+
+    def report(self):
+        print(
+            f"{'callback':>20} {'calls':>6}"
+            + "".join(f" {f'p{p} (ms)':>9}" for p in PERCENTILES)
+            + f" {'mean (ms)':>9} {'mean (kB)':>10} {'max (kB)':>9}"
+        )
+        for name, latencies in self.latencies.items():
+            milliseconds = 1_000 * np.array(latencies)
+            kilobytes = np.array(self.sizes[name]) / 1_000
+            print(
+                f"{name:>20} {len(latencies):>6}"
+                + "".join(
+                    f" {value:>9.1f}"
+                    for value in np.percentile(milliseconds, PERCENTILES)
+                )
+                + f" {milliseconds.mean():>9.1f} {kilobytes.mean():>10.1f}"
+                f" {kilobytes.max():>9.1f}"
+            )
+        every = 1_000 * np.concatenate([*map(np.array, self.latencies.values())])
+        print(
+            f"{'all':>20} {len(every):>6}"
+            + "".join(f" {value:>9.1f}" for value in np.percentile(every, PERCENTILES))
+            + f" {every.mean():>9.1f}"
+        )
+        print(f"one worker serves about {1_000 / every.mean():.0f} requests/s")
+
+
+def search(recorder: Recorder, query: str, page: int = 0, viewport=None):
+    """The search table's rows, as the browser would show them"""
+    in_view = ["in-view"] if viewport else []
+    request = {"query": query, "page": page}
+    records, _, _, paging, *_ = recorder.call(
+        callbacks.update_names,
+        request,
+        PAGE_SIZE,
+        callbacks.dataset.version,
+        viewport,
+        in_view,
+        trigger=["search-request.data"],
+    )
+    if paging == "custom":
+        return records
+    # Every match was sent, the browser pages through them itself
+    return records[page * PAGE_SIZE : (page + 1) * PAGE_SIZE]
+
+
+def click(recorder: Recorder, rows, row: int, shown=None, radius: int = 1):
+    """Selects a person in the search table and draws their neighborhood
+
+    Clicking the person already `shown` leaves everything as it is.
+    """
+    selection = recorder.call(
+        callbacks.update_selection,
+        {"row": row, "column": 0},
+        rows,
+        0,
+        PAGE_SIZE,
+        0,
+        PAGE_SIZE,
+        shown,
+        trigger=["search.active_cell"],
+    )[-1]
+    if selection is no_update:
+        return shown
+    recorder.call(callbacks.update_network, progress, selection, radius)
+    return selection
+
+
+def progress(_):
+    """Background jobs report progress here, nobody is listening"""
+
+
+def session(recorder: Recorder, rng):
+    """One organizer looking people up and around the network"""
+    nodes = callbacks.dataset.nodes
+    person = nodes.iloc[rng.integers(len(nodes))]
+
+    # Pages load with the whole network and every table filled in
+    recorder.call(
+        callbacks.update_names, {"query": "", "page": 0}, PAGE_SIZE, 1, None, []
+    )
+    recorder.call(
+        callbacks.update_selection, None, None, 0, PAGE_SIZE, 0, PAGE_SIZE, None
+    )
+    recorder.call(callbacks.update_network, progress, None, 1)
+
+    # Typing a last name, sent once typing pauses, then a first name
+    last_name = str(person["last_name"])
+    for length in (2, len(last_name)):
+        rows = search(recorder, f"{{last_name}} contains {last_name[:length]}")
+    query = (
+        f"{{last_name}} eq {last_name} && "
+        f"{{first_name}} datestartswith {person['first_name']}"
+    )
+    rows = search(recorder, query)
+    selection = click(recorder, rows, 0)
+    rows = search(recorder, f"{{precinct}} eq {person['precinct']}", page=1)
+
+    # Clicking around the matches, and further out from one of them
+    row = 0
+    for row in rng.choice(len(rows), size=min(3, len(rows)), replace=False):
+        selection = click(recorder, rows, row, selection)
+    for radius in (2, 3):
+        recorder.call(callbacks.update_network, progress, selection, radius)
+    for page in (1, 2):
+        recorder.call(
+            callbacks.update_selection,
+            {"row": row, "column": 0},
+            rows,
+            page,
+            PAGE_SIZE,
+            0,
+            PAGE_SIZE,
+            selection,
+            trigger=["source.page_current"],
+        )
+
+    # Back to the whole network, zoomed in on part of it and out again
+    recorder.call(callbacks.update_network, progress, None, 1)
+    view = "overview"
+    eye = rng.normal(size=3)
+    for distance in (1.2, 0.3, 0.15, 1.2):
+        camera = {"eye": dict(zip("xyz", distance * eye / np.linalg.norm(eye)))}
+        relayout = {"scene.camera": camera}
+        _, new_view = recorder.call(
+            callbacks.update_camera,
+            relayout,
+            None,
+            view,
+            trigger=["network.relayoutData"],
+        )
+        view = view if new_view is no_update else new_view
+        viewport = recorder.call(
+            callbacks.update_viewport, relayout, view, trigger=["network.relayoutData"]
+        )
+        if isinstance(viewport, dict):
+            search(recorder, "", viewport=viewport)
+    recorder.call(callbacks.poll_data_version, 1, callbacks.dataset.version)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=20_000)
+    parser.add_argument("--edges", type=int, default=100_000)
+    parser.add_argument("--data", type=Path)
+    parser.add_argument("--layout", default="multilevel")
+    parser.add_argument("--transport", choices=["binary", "json"], default="binary")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=538)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.data is None:
+            nodes_path, edges_path, _ = generate(
+                scratch, args.nodes, args.edges, args.seed
+            )
+        else:
+            nodes_path, edges_path = (
+                args.data / "nodes.arrow",
+                args.data / "edges.arrow",
+            )
+        start = time.perf_counter()
+        callbacks.load_data(*voter_files(nodes_path, edges_path, layout=args.layout))
+    print(
+        f"{len(callbacks.dataset.nodes):,} voters and"
+        f" {len(callbacks.dataset.edges):,} contacts"
+        f" loaded in {time.perf_counter() - start:.1f}s"
+    )
+    callbacks.BINARY_FIGURES = args.transport == "binary"
+
+    recorder = Recorder()
+    rng = np.random.default_rng(args.seed)
+    for _ in range(args.sessions):
+        session(recorder, rng)
+    recorder.report()
+
+
+if __name__ == "__main__":
+    main()
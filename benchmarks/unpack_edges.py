@@ -0,0 +1,88 @@
+"""Compares the vectorized edge builder against the original per-edge loop
+
+"vector" includes converting the graph from networkx to a GraphCore,
+"arrays only" is the cost of building the line buffers from a core that
+is already built, which is what the app pays.
+
+Run from the repository root:
+
+    python -m benchmarks.unpack_edges
+    python -m benchmarks.unpack_edges --sizes 10000 100000
+"""
+
+import argparse
+import time
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from graph import from_networkx
+from viz import unpack_edges
+
+
+def loop_unpack_edges(network):
+    """The original implementation of `viz.unpack_edges`"""
+    positions = []
+    for edge in network.edges():
+        source_coords = network.nodes[edge[0]]["position"]
+        target_coords = network.nodes[edge[1]]["position"]
+        padding = [None for _ in source_coords]
+
+        positions.append(source_coords)
+        positions.append(target_coords)
+        positions.append(padding)
+
+    return pd.DataFrame(positions).T.values
+
+
+def random_network(n_edges: int, dim: int = 3, seed: int = 538) -> nx.Graph:
+    rng = np.random.default_rng(seed)
+    n_nodes = max(n_edges // 5, 10)
+    pairs = rng.integers(0, n_nodes, size=(n_edges, 2))
+    network = nx.Graph()
+    network.add_nodes_from(range(n_nodes))
+    network.add_edges_from(pairs.tolist())
+    positions = dict(enumerate(rng.random((n_nodes, dim))))
+    nx.set_node_attributes(network, name="position", values=positions)
+    return network
+
+
+def best_of(func, *args, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'edges':>10} {'loop (s)':>10} {'vector (s)':>11} {'speedup':>8}"
+        f" {'arrays only (s)':>16}"
+    )
+    for size in args.sizes:
+        network = random_network(size)
+        loop = best_of(loop_unpack_edges, network, repeat=args.repeat)
+        vector = best_of(
+            lambda: unpack_edges(from_networkx(network)), repeat=args.repeat
+        )
+        # Once the core is built, redrawing skips networkx entirely
+        arrays = best_of(unpack_edges, from_networkx(network), repeat=args.repeat)
+        edges = network.number_of_edges()
+        print(
+            f"{edges:>10} {loop:>10.3f} {vector:>11.3f} {loop / vector:>7.1f}x"
+            f" {arrays:>16.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,148 +1,208 @@
-import networkx as nx
 import numpy as np
 import pandas as pd
-from networkx.classes.graph import Graph
 from pandas.core.frame import DataFrame
 
-np.random.seed(538)
-
-
-def get_first_names(n: int):
+from graph import (
+    GraphCore,
+    contact_codes,
+    extend_adjacency,
+    first_rows,
+    graph_core,
+    has_pairs,
+    index_contacts,
+    pair_keys,
+    undirected_edges,
+)
+from layouts import LAYOUTS, cached_layout, extend_layout
+from synthetic import PRECINCT_SIZE, tables
+
+# Voter file columns with few distinct values, stored once per value
+CATEGORY_COLUMNS = ["first_name", "last_name", "precinct", "support", "gender"]
+# Fewest precincts a mock voter file is split into
+MOCK_PRECINCTS = 5
+
+
+def compact_nodes(nodes: DataFrame) -> DataFrame:
+    """Shrinks the nodes table for serving
+
+    Columns with few distinct values become Categoricals, so each value is
+    stored once and rows hold small integer codes. Other text moves into
+    Arrow memory instead of one Python object per value. The index is reset,
+    so each voter's row number is their code in `graph.GraphCore`.
     """
-    Sample n first names from the most popular names for
-    American babies born in 2000. Does not consider
-    gender assigned at birth
-
-    See https://www.ssa.gov/cgi-bin/popularnames.cgi
+    dtypes = {column: "category" for column in CATEGORY_COLUMNS if column in nodes}
+    for column in nodes.columns.difference(dtypes):
+        if nodes[column].dtype == object:
+            dtypes[column] = "string[pyarrow]"
+    return nodes.astype(dtypes).reset_index(drop=True)
+
+
+def layout_network(
+    nodes: DataFrame,
+    edges: DataFrame,
+    dim: int = 3,
+    layout: str = "multilevel",
+    id_field: str = "voter_id",
+    source_field: str = "source",
+    target_field: str = "target",
+    seed: int = 538,
+) -> GraphCore:
+    """Lays out the contact network straight from the tables
+
+    Codes follow the rows of `nodes`. Everyone with a contact is placed
+    and everyone else keeps NaN positions. Layouts are cached by the
+    placed ids and edges and the `seed`, see `layouts.cached_layout`, so
+    a cached layout is the one a fresh run would give.
     """
-    possible_names = [
-        "Jacob",
-        "Michael",
-        "Matthew",
-        "Joshua",
-        "Christopher",
-        "Nicholas",
-        "Andrew",
-        "Joseph",
-        "Daniel",
-        "Tyler",
-        "Emily",
-        "Hannah",
-        "Madison",
-        "Ashley",
-        "Sarah",
-        "Alexis",
-        "Samantha",
-        "Jessica",
-        "Elizabeth",
-        "Taylor",
-    ]
-    return np.random.choice(possible_names, n)
-
-
-def get_last_names(n: int):
-    """
-    Sample n surnames from the 25 most common surnames
-    in the 2010 USA census.
-
-
-    See https://www.census.gov/topics/population/genealogy/data/2010_surnames.html
-    """
-    possible_names = [
-        "Smith",
-        "Johnson",
-        "Williams",
-        "Brown",
-        "Jones",
-        "Garcia",
-        "Miller",
-        "Davis",
-        "Rodriguez",
-        "Martinez",
-        "Hernandez",
-        "Lopez",
-        "Gonzalez",
-        "Wilson",
-        "Anderson",
-        "Thomas",
-        "Taylor",
-        "Moore",
-        "Jackson",
-        "Martin",
-        "Lee",
-        "Perez",
-    ]
-    return np.random.choice(possible_names, n)
-
-
-def sort_nodes_by_graph(nodes: DataFrame, network: Graph, id_field: str) -> DataFrame:
-    """Sorts the nodes table by the values in the graph
-
-    This ensures the data in the network and the data in the table match
-    """
-    nodes["graph_order"] = nodes[id_field].astype("category")
-    graph_node_order = list(network.nodes())
-    nodes.graph_order = nodes.graph_order.cat.set_categories(graph_node_order)
-    return nodes.sort_values("graph_order")
-
-
-def make_nodes(n):
-    voter_ids = [f"IA-{_id}" for _id in np.random.randint(0, 100_000, n)]
-    first_names = get_first_names(n)
-    last_names = get_last_names(n)
-    phones = "(123)-555-0123"
-    precincts = np.random.randint(0, 5, n)
-    supports = np.random.choice(
-        [
-            "1 - Support",
-            "2 - Lean Support",
-            "3 - Undecided",
-            "4 - Lean Oppose",
-            "5 - Oppose",
-        ],
-        n,
+    lookup, contacts = contact_codes(nodes, edges, id_field, source_field, target_field)
+    edge_index = undirected_edges(contacts, len(nodes))
+    placed = np.unique(edge_index)
+    positions = np.full((len(nodes), dim), np.nan)
+    positions[placed] = cached_layout(
+        nodes[id_field].to_numpy()[placed],
+        np.searchsorted(placed, edge_index),
+        LAYOUTS[layout],
+        dim=dim,
+        seed=seed,
     )
-    genders = np.random.choice(["M", "F", "O"], n)
-
-    return pd.DataFrame(
-        {
-            "voter_id": voter_ids,
-            "first_name": first_names,
-            "last_name": last_names,
-            "phone": phones,
-            "precinct": precincts,
-            "support": supports,
-            "gender": genders,
-        }
+    adjacency = index_contacts(lookup, contacts, len(nodes))
+    return graph_core(
+        nodes, edges, positions, edge_index, id_field, adjacency=adjacency
     )
 
 
-def make_edges(nodes, n, source_field, target_field):
-    assert n > nodes.shape[0]
+def mock_data(n_nodes=100, n_edges=150, dim=3, layout="multilevel", seed=538):
+    """A small synthetic voter file and contact list, laid out
 
-    # Generate too many points, discard invalid ones
-    pairs = np.random.choice(nodes["voter_id"], size=(n * 5, 2))
-    df = pd.DataFrame(pairs)
+    Comes from the load testing generator, see `synthetic.tables`, so
+    voter ids are unique. Small files get smaller precincts, so there are
+    always at least `MOCK_PRECINCTS` to filter by.
+    """
+    precinct_size = min(max(n_nodes // MOCK_PRECINCTS, 1), PRECINCT_SIZE)
+    nodes, edges = tables(n_nodes, n_edges, seed, precinct_size=precinct_size)
+    nodes = compact_nodes(nodes)
+    return nodes, edges, layout_network(nodes, edges, dim, layout, seed=seed)
 
-    df.drop_duplicates(inplace=True)
-    unique = df[df[0] != df[1]]
 
-    # May error if proportions are off
-    sample = unique.sample(n)
-    sample.columns = [source_field, target_field]
-    return sample
+def append_nodes(nodes: DataFrame, new_nodes: DataFrame) -> DataFrame:
+    """Appends rows to a table from `compact_nodes`, keeping its dtypes
 
+    Categoricals gain any new values as extra categories and existing
+    rows keep their codes, so nothing already there is encoded again.
+    """
+    added = new_nodes.reindex(columns=nodes.columns)
+    widened = {}
+    for column in added:
+        dtype = nodes[column].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            values = pd.Index(added[column].dropna().unique())
+            unseen = values.difference(dtype.categories)
+            if len(unseen):
+                widened[column] = nodes[column].cat.add_categories(unseen)
+                dtype = widened[column].dtype
+        if isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype)):
+            added[column] = added[column].astype(dtype)
+    return pd.concat([nodes.assign(**widened), added], ignore_index=True)
+
+
+def add_contacts(
+    nodes: DataFrame,
+    edges: DataFrame,
+    core: GraphCore,
+    new_nodes: DataFrame,
+    new_edges: DataFrame,
+    id_field: str = "voter_id",
+    source_field: str = "source",
+    target_field: str = "target",
+    seed: int | None = None,
+):
+    """Adds newly logged voters and contacts to existing data
+
+    Rows are only appended, so existing people keep their codes and only
+    the new rows are looked up and indexed. New people are placed next to
+    the people they're connected to and only the part of the layout they
+    touch is relaxed, so this takes a fraction of a second rather than a
+    full layout. Contacts with someone in neither table are left out, as
+    are ones already logged. The inputs are left untouched, and the same
+    `seed` places people the same way every time. Returns the new
+    `(nodes, edges, core)`.
+    """
+    n_old = len(nodes)
+    added = new_nodes[core.codes(new_nodes[id_field]) < 0]
+    nodes = append_nodes(nodes, added)
+    n_rows = len(nodes)
+    added_rows = first_rows(added[id_field]) + n_old
+
+    def codes(voter_ids: pd.Series) -> np.ndarray:
+        found = core.codes(voter_ids)
+        missing = found < 0
+        found[missing] = added_rows.reindex(voter_ids[missing]).fillna(-1).to_numpy()
+        return found
+
+    new_edges = new_edges[new_edges[source_field] != new_edges[target_field]]
+    new_contacts = np.column_stack(
+        [codes(new_edges[source_field]), codes(new_edges[target_field])]
+    )
+    known = (new_contacts >= 0).all(axis=1)
+    new_edges, new_contacts = new_edges[known], new_contacts[known]
+    contacts = new_contacts
+    if len(added):
+        # Logged contacts with someone who is only now in the nodes table
+        reached = edges[source_field].isin(added[id_field]) | edges[target_field].isin(
+            added[id_field]
+        )
+        reached = edges[reached.to_numpy()]
+        old_contacts = np.column_stack(
+            [codes(reached[source_field]), codes(reached[target_field])]
+        )
+        contacts = np.concatenate([old_contacts, new_contacts])
+    contacts = contacts[(contacts >= 0).all(axis=1)]
+
+    keys = pair_keys(core.adjacency.out_offsets, core.adjacency.out_indices, n_rows)
+    logged = has_pairs(keys, new_contacts[:, 0], new_contacts[:, 1], n_rows)
+    _, first = np.unique(
+        new_contacts[:, 0] * n_rows + new_contacts[:, 1], return_index=True
+    )
+    fresh = np.zeros(len(new_contacts), dtype=bool)
+    fresh[first] = True
+    edges = pd.concat(
+        [edges, new_edges.loc[fresh & ~logged, [source_field, target_field]]],
+        ignore_index=True,
+    )
 
-def mock_data(n_nodes=100, n_edges=150, dim=3):
-    source = "source"
-    target = "target"
-    nodes = make_nodes(n_nodes)
-    edges = make_edges(nodes, n_edges, source, target)
-    network = nx.from_pandas_edgelist(edges, source, target)
-    # initalizing a graph doesn't do anything
-    # so we add some math to spread points out
-    positions = nx.spring_layout(network, dim=dim)
-    nx.set_node_attributes(network, name="position", values=positions)
+    # The network is undirected, so a contact back doesn't add an edge
+    linked = has_pairs(keys, contacts[:, 0], contacts[:, 1], n_rows) | has_pairs(
+        keys, contacts[:, 1], contacts[:, 0], n_rows
+    )
+    new_edge_index = undirected_edges(contacts[~linked], n_rows)
+    edge_index = np.concatenate([core.edge_index, new_edge_index])
+    adjacency = extend_adjacency(core.adjacency, added[id_field], contacts)
+
+    positions = np.full((n_rows, core.dim), np.nan)
+    positions[:n_old] = core.positions
+    placed = ~np.isnan(positions).any(axis=1)
+    linked = np.zeros(n_rows, dtype=bool)
+    linked[new_edge_index.ravel()] = True
+    # The layout works on the placed people followed by the newly linked
+    order = np.concatenate([np.flatnonzero(placed), np.flatnonzero(~placed & linked)])
+    layout_rows = np.full(n_rows, -1)
+    layout_rows[order] = np.arange(len(order))
+    positions[order] = extend_layout(
+        positions[placed],
+        layout_rows[edge_index],
+        layout_rows[new_edge_index],
+        len(order),
+        seed=seed,
+    )
 
-    nodes = sort_nodes_by_graph(nodes, network, "voter_id")
-    return nodes, edges, network
+    core = graph_core(
+        nodes,
+        edges,
+        positions,
+        edge_index,
+        id_field,
+        source_field,
+        target_field,
+        adjacency=adjacency,
+    )
+    return nodes, edges, core
@@ -0,0 +1,78 @@
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable
+
+import numpy as np
+
+# Memory the figure cache may hold before it drops the least recent figure
+FIGURE_CACHE_BYTES = int(os.environ.get("FIGURE_CACHE_MB", 512)) << 20
+
+
+def figure_nbytes(value: Any) -> int:
+    """Roughly how much memory a figure dict holds, counting arrays by size"""
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return sum(figure_nbytes(item) for item in value.ravel()) + value.nbytes
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(figure_nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(figure_nbytes(item) for item in value)
+    if isinstance(value, str):
+        return len(value)
+    return 8
+
+
+class FigureCache:
+    """Figures built recently, kept most recently used first within a budget
+
+    Figures are stored as the plain dicts plotly validated them into, so a
+    hit skips building the traces and goes straight to serialization.
+    Callers put the data version in the key and clear the cache when the
+    data changes.
+    """
+
+    def __init__(self, max_bytes: int = FIGURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = Lock()
+        # Lookups since the process started, for the hit rate
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Dict | None:
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def put(self, key: Hashable, figure: Dict) -> Dict:
+        size = figure_nbytes(figure)
+        if size > self.max_bytes:
+            # Caching it would only push everything else out
+            return figure
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key)[1]
+            self.entries[key] = (figure, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.nbytes -= evicted
+        return figure
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Dict]) -> Dict:
+        figure = self.get(key)
+        if figure is None:
+            figure = self.put(key, build())
+        return figure
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
@@ -0,0 +1,192 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+from pandas.core.frame import DataFrame
+from pandas.core.series import Series
+
+from graph import GraphCore, first_rows
+from viz import split_filter_part
+
+# These operators match pandas series operator method names
+COMPARISONS = ("eq", "ne", "lt", "le", "gt", "ge")
+
+
+class Clause(NamedTuple):
+    column: str
+    operator: str
+    value: Any
+
+
+@lru_cache(maxsize=512)
+def compile_query(filter_query: str) -> Tuple[Clause, ...]:
+    """Parses a DataTable filter query into clauses that are all ANDed
+
+    Parsed queries are cached by their text, so retyping a query, or
+    asking for the same one from several callbacks, skips the parsing.
+    Clauses that can't be parsed are dropped, like the table does.
+    """
+    clauses = []
+    for filter_part in filter_query.split(" && "):
+        col_name, operator, filter_value = split_filter_part(filter_part)
+        if operator in COMPARISONS or operator in ("contains", "datestartswith"):
+            clauses.append(Clause(col_name, operator, filter_value))
+    return tuple(clauses)
+
+
+def as_text(value: Any) -> str:
+    """Undoes the float parsing of values like `IA-12` or `12`"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def clause_mask(values: Series, clause: Clause) -> np.ndarray:
+    """Evaluates one clause against a column, comparing by the column's dtype"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Test each category once, then look the answers up by code
+        categories = pd.Series(values.cat.categories)
+        hits = np.append(clause_mask(categories, clause), False)
+        return hits[values.cat.codes.to_numpy()]
+
+    value = clause.value
+    numeric = is_numeric_dtype(values.dtype) and not is_bool_dtype(values.dtype)
+    if clause.operator in COMPARISONS:
+        if numeric:
+            try:
+                value = float(value)
+            except ValueError:
+                # Text never equals a number
+                return np.full(len(values), clause.operator == "ne")
+        else:
+            value = as_text(value)
+        mask = getattr(values, clause.operator)(value)
+    else:
+        text = values.astype(str) if numeric else values
+        if clause.operator == "contains":
+            mask = text.str.contains(as_text(value), regex=False, na=False)
+        else:
+            # this is a simplification of the front-end filtering logic,
+            # only works with complete fields in standard format
+            mask = text.str.startswith(as_text(value), na=False)
+    # Missing values never match
+    return mask.to_numpy(dtype=bool, na_value=False)
+
+
+def query_rows(
+    df: DataFrame, filter_query: str, indexes: Dict[str, Any] | None = None
+) -> np.ndarray:
+    """Sorted positions of the rows matching a filter query
+
+    Clauses on columns in `indexes` are answered by the index, and the
+    rest are only evaluated on the rows those leave.
+    """
+    indexes = indexes or {}
+    rows = None
+    scanned = []
+    for clause in compile_query(filter_query):
+        found = None
+        if clause.column in indexes:
+            found = indexes[clause.column].search(clause)
+        if found is None:
+            scanned.append(clause)
+        elif rows is None:
+            rows = found
+        else:
+            rows = np.intersect1d(rows, found, assume_unique=True)
+    if rows is None:
+        mask = np.ones(len(df), dtype=bool)
+        for clause in scanned:
+            mask &= clause_mask(df[clause.column], clause)
+        return np.flatnonzero(mask)
+    for clause in scanned:
+        rows = rows[clause_mask(df[clause.column].take(rows), clause)]
+    return rows
+
+
+@dataclass(frozen=True)
+class EdgeView:
+    """The edge table as if merged with node attributes at both ends
+
+    Only the node row of each endpoint is kept per edge. Filters on
+    `<column>_source` or `<column>_target` are tested once per node and
+    gathered through those rows, and node attributes are only joined onto
+    the edges that make it into a result.
+    """
+
+    nodes: DataFrame
+    edges: DataFrame
+    ends: Dict[str, np.ndarray]
+
+    def clause_mask(self, clause: Clause) -> np.ndarray:
+        if clause.column in self.edges:
+            return clause_mask(self.edges[clause.column], clause)
+        column, _, end = clause.column.rpartition("_")
+        node_mask = clause_mask(self.nodes[column], clause)
+        # Endpoints missing from the nodes table have row -1 and never match
+        return np.append(node_mask, False)[self.ends[end]]
+
+    def select(self, filter_query: str, columns: List[str] | None = None) -> DataFrame:
+        """Edges matching a filter query, joined to their node attributes
+
+        Columns are named like an edge table merged with the nodes table
+        on each end, with `_source` and `_target` suffixes.
+        """
+        mask = np.ones(len(self.edges), dtype=bool)
+        for clause in compile_query(filter_query):
+            mask &= self.clause_mask(clause)
+        rows = np.flatnonzero(mask)
+
+        joined = {}
+        for column in self.edges:
+            joined[column] = self.edges[column].iloc[rows].reset_index(drop=True)
+        for end, node_rows in self.ends.items():
+            found = self.nodes.reindex(node_rows[rows]).reset_index(drop=True)
+            for column in self.nodes:
+                joined[f"{column}_{end}"] = found[column]
+        if columns is not None:
+            joined = {column: joined[column] for column in columns}
+        return pd.DataFrame(joined)
+
+
+def edge_view(
+    nodes: DataFrame,
+    edges: DataFrame,
+    id_field: str = "voter_id",
+    source_field: str = "source",
+    target_field: str = "target",
+) -> EdgeView:
+    """Looks up the node row of every edge endpoint once"""
+    nodes = nodes.reset_index(drop=True)
+    lookup = first_rows(nodes[id_field])
+    ends = {}
+    for end, field in (("source", source_field), ("target", target_field)):
+        ends[end] = lookup.reindex(edges[field]).fillna(-1).to_numpy(np.int64)
+    return EdgeView(nodes, edges.reset_index(drop=True), ends)
+
+
+def extend_edge_view(
+    view: EdgeView,
+    nodes: DataFrame,
+    edges: DataFrame,
+    core: GraphCore,
+    source_field: str = "source",
+    target_field: str = "target",
+) -> EdgeView:
+    """An EdgeView of tables that only had rows appended since `view`
+
+    Only the new edges are looked up, along with old ones whose endpoint
+    was missing and may have been added since. Codes come from `core`,
+    which must be built on `nodes`.
+    """
+    n_old = len(view.edges)
+    ends = {}
+    for end, field in (("source", source_field), ("target", target_field)):
+        rows = view.ends[end].copy()
+        missing = np.flatnonzero(rows < 0)
+        rows[missing] = core.codes(view.edges[field].take(missing))
+        ends[end] = np.concatenate([rows, core.codes(edges[field].iloc[n_old:])])
+    return EdgeView(nodes.reset_index(drop=True), edges.reset_index(drop=True), ends)
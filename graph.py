@@ -0,0 +1,399 @@
+from dataclasses import dataclass
+from itertools import chain
+from typing import Iterable, Tuple
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from networkx.classes.graph import Graph
+from pandas.core.frame import DataFrame
+
+
+def first_rows(ids: Iterable) -> pd.Series:
+    """Maps each distinct id to the first row holding it"""
+    rows = pd.Series(np.arange(len(ids)), index=pd.Index(ids))
+    return rows[~rows.index.duplicated()]
+
+
+def network_edge_index(network: Graph, graph_index: pd.Index) -> np.ndarray:
+    """The (n_edges, 2) array of each edge's endpoints in `graph_index`"""
+    endpoints = np.fromiter(
+        chain.from_iterable(network.edges()),
+        dtype=object,
+        count=2 * network.number_of_edges(),
+    )
+    return graph_index.get_indexer(endpoints).reshape(-1, 2)
+
+
+def network_arrays(
+    network: Graph, ids: Iterable | None = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Pulls node positions and edge endpoints out of the network as arrays
+
+    Returns a float array of shape (n_nodes, dim) with one row per node
+    and an integer array of shape (n_edges, 2) holding the row of each
+    edge's endpoints in the position array.
+
+    Rows follow the network's node order unless `ids` is given, in which
+    case they follow `ids` instead. Ids missing from the network get NaN
+    positions and edges touching nodes missing from `ids` are dropped.
+    """
+    graph_index = pd.Index(list(network.nodes()))
+    coords = np.array(
+        [position for _, position in network.nodes(data="position")], dtype=float
+    )
+    edge_index = network_edge_index(network, graph_index)
+    if ids is None:
+        return coords, edge_index
+
+    ids = pd.Index(ids)
+    # Rows for ids the network doesn't know about stay NaN
+    graph_rows = graph_index.get_indexer(ids)
+    positions = np.full((len(ids), coords.shape[1]), np.nan)
+    found = graph_rows >= 0
+    positions[found] = coords[graph_rows[found]]
+
+    # Map network order onto the first row holding each id
+    rows = first_rows(ids).reindex(graph_index).to_numpy()[edge_index]
+    keep = ~np.isnan(rows).any(axis=1)
+    return positions, rows[keep].astype(np.int64)
+
+
+def compress(
+    from_rows: np.ndarray, to_rows: np.ndarray, n_rows: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Packs (from, to) row pairs into CSR offset and index arrays
+
+    The neighbors of row i are `indices[offsets[i]:offsets[i + 1]]`,
+    sorted and without repeats.
+    """
+    order = np.lexsort((to_rows, from_rows))
+    from_rows = from_rows[order]
+    to_rows = to_rows[order]
+    distinct = np.ones(len(order), dtype=bool)
+    distinct[1:] = (from_rows[1:] != from_rows[:-1]) | (to_rows[1:] != to_rows[:-1])
+
+    offsets = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(from_rows[distinct], minlength=n_rows), out=offsets[1:])
+    return offsets, to_rows[distinct].astype(np.int32)
+
+
+def pair_keys(offsets: np.ndarray, indices: np.ndarray, n_rows: int) -> np.ndarray:
+    """The sorted keys `from * n_rows + to` of the pairs in CSR arrays
+
+    `n_rows` may be more than the arrays were built for.
+    """
+    owners = np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+    return owners * n_rows + indices
+
+
+def has_pairs(
+    keys: np.ndarray, from_rows: np.ndarray, to_rows: np.ndarray, n_rows: int
+) -> np.ndarray:
+    """Which (from, to) row pairs are among the `pair_keys`"""
+    wanted = from_rows.astype(np.int64) * n_rows + to_rows
+    if not len(keys):
+        return np.zeros(len(wanted), dtype=bool)
+    at = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+    return keys[at] == wanted
+
+
+def insert_pairs(
+    offsets: np.ndarray,
+    indices: np.ndarray,
+    from_rows: np.ndarray,
+    to_rows: np.ndarray,
+    n_rows: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Adds (from, to) row pairs to CSR arrays from `compress`
+
+    Only the new pairs are sorted, and the existing ones are moved along
+    to make room, so adding a few pairs doesn't sort them all again. The
+    arrays grow to `n_rows` rows. Lists stay sorted and without repeats.
+    """
+    keys = pair_keys(offsets, indices, n_rows)
+    new = ~has_pairs(keys, from_rows, to_rows, n_rows)
+    new_keys = np.unique(from_rows[new].astype(np.int64) * n_rows + to_rows[new])
+    indices = np.insert(
+        indices, np.searchsorted(keys, new_keys), new_keys % n_rows
+    ).astype(np.int32)
+    offsets = np.append(offsets, np.full(n_rows + 1 - len(offsets), offsets[-1]))
+    offsets[1:] += np.cumsum(np.bincount(new_keys // n_rows, minlength=n_rows))
+    return offsets, indices
+
+
+@dataclass(frozen=True)
+class Adjacency:
+    """Neighbor lookups by voter_id, answered without scanning the edges
+
+    Neighbors are stored as row positions into the nodes table the index
+    was built from, so `nodes.iloc[rows]` turns a lookup into records.
+    """
+
+    ids: pd.Index
+    rows: np.ndarray
+    out_offsets: np.ndarray
+    out_indices: np.ndarray
+    in_offsets: np.ndarray
+    in_indices: np.ndarray
+
+    def row(self, voter_id) -> int | None:
+        """The node row for a voter_id, or None if it isn't in the table"""
+        position = self.ids.get_indexer([voter_id])[0]
+        return None if position < 0 else int(self.rows[position])
+
+    def successors(self, voter_id) -> np.ndarray:
+        """Rows of the people this person contacted"""
+        row = self.row(voter_id)
+        if row is None:
+            return np.empty(0, dtype=np.int32)
+        return self.out_indices[self.out_offsets[row] : self.out_offsets[row + 1]]
+
+    def predecessors(self, voter_id) -> np.ndarray:
+        """Rows of the people who contacted this person"""
+        row = self.row(voter_id)
+        if row is None:
+            return np.empty(0, dtype=np.int32)
+        return self.in_indices[self.in_offsets[row] : self.in_offsets[row + 1]]
+
+
+def contact_codes(
+    nodes: DataFrame,
+    edges: DataFrame,
+    id_field: str = "voter_id",
+    source_field: str = "source",
+    target_field: str = "target",
+) -> Tuple[pd.Series, np.ndarray]:
+    """Looks up the node row of both ends of every contact
+
+    Returns the `first_rows` lookup of the ids and an (n_contacts, 2)
+    array of rows, in edge table order. Contacts with an end that isn't
+    in `nodes` are left out.
+    """
+    lookup = first_rows(nodes[id_field])
+    rows = lookup.to_numpy()
+    sources = lookup.index.get_indexer(edges[source_field])
+    targets = lookup.index.get_indexer(edges[target_field])
+    known = (sources >= 0) & (targets >= 0)
+    contacts = np.column_stack([rows[sources[known]], rows[targets[known]]])
+    return lookup, contacts.astype(np.int64)
+
+
+def undirected_edges(contacts: np.ndarray, n_rows: int) -> np.ndarray:
+    """Each pair of contacted rows once, leaving out loops
+
+    The network is undirected, so a contact back doesn't add an edge.
+    Edges keep the direction and order of their first contact.
+    """
+    contacts = contacts[contacts[:, 0] != contacts[:, 1]]
+    low = contacts.min(axis=1)
+    high = contacts.max(axis=1)
+    _, first = np.unique(low * n_rows + high, return_index=True)
+    return contacts[np.sort(first)]
+
+
+def index_contacts(lookup: pd.Series, contacts: np.ndarray, n_rows: int) -> Adjacency:
+    """Packs the rows from `contact_codes` into an Adjacency"""
+    sources, targets = contacts[:, 0], contacts[:, 1]
+    out_offsets, out_indices = compress(sources, targets, n_rows)
+    in_offsets, in_indices = compress(targets, sources, n_rows)
+    return Adjacency(
+        ids=lookup.index,
+        rows=lookup.to_numpy(),
+        out_offsets=out_offsets,
+        out_indices=out_indices,
+        in_offsets=in_offsets,
+        in_indices=in_indices,
+    )
+
+
+def build_adjacency(
+    nodes: DataFrame,
+    edges: DataFrame,
+    id_field: str = "voter_id",
+    source_field: str = "source",
+    target_field: str = "target",
+) -> Adjacency:
+    """Indexes the edge table by endpoint once so lookups skip the scans
+
+    Edges whose endpoints aren't in `nodes` are left out.
+    """
+    lookup, contacts = contact_codes(nodes, edges, id_field, source_field, target_field)
+    return index_contacts(lookup, contacts, len(nodes))
+
+
+def extend_adjacency(
+    adjacency: Adjacency, new_ids: Iterable, contacts: np.ndarray
+) -> Adjacency:
+    """Adds people and contacts without indexing the old ones again
+
+    `new_ids` are the ids of the rows appended after the existing ones,
+    and `contacts` the (n_contacts, 2) rows of the contacts to add, which
+    may include ones already indexed.
+    """
+    n_old = len(adjacency.out_offsets) - 1
+    lookup = first_rows(new_ids) + n_old
+    lookup = lookup[~lookup.index.isin(adjacency.ids)]
+    n_rows = n_old + len(new_ids)
+    sources, targets = contacts[:, 0], contacts[:, 1]
+    out_offsets, out_indices = insert_pairs(
+        adjacency.out_offsets, adjacency.out_indices, sources, targets, n_rows
+    )
+    in_offsets, in_indices = insert_pairs(
+        adjacency.in_offsets, adjacency.in_indices, targets, sources, n_rows
+    )
+    return Adjacency(
+        ids=adjacency.ids.append(lookup.index),
+        rows=np.concatenate([adjacency.rows, lookup.to_numpy()]),
+        out_offsets=out_offsets,
+        out_indices=out_indices,
+        in_offsets=in_offsets,
+        in_indices=in_indices,
+    )
+
+
+def gather(
+    offsets: np.ndarray, indices: np.ndarray, rows: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Reads the CSR neighbor lists of several rows at once
+
+    Returns matching arrays of the row each neighbor was found from
+    and the neighbor itself.
+    """
+    starts = offsets[rows]
+    counts = offsets[rows + 1] - starts
+    owners = np.repeat(rows, counts)
+    # Position of each neighbor within its own list, shifted to its start
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owners, indices[np.repeat(starts, counts) + within]
+
+
+def ego_network(
+    adjacency: Adjacency, voter_id, radius: int = 1
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Collects everyone within `radius` hops of a voter
+
+    Returns the sorted node rows of the neighborhood, including the voter,
+    and an (n_edges, 2) array of node rows for each edge followed to reach
+    it. Edges are followed in both directions but each appears once, in
+    its original direction. Only the neighborhood is read, so the cost
+    does not depend on the size of the rest of the graph.
+    """
+    row = adjacency.row(voter_id)
+    if row is None:
+        return np.empty(0, dtype=np.int64), np.empty((0, 2), dtype=np.int64)
+
+    visited = np.array([row])
+    frontier = visited
+    found = []
+    for _ in range(radius):
+        sources, targets = gather(
+            adjacency.out_offsets, adjacency.out_indices, frontier
+        )
+        in_targets, in_sources = gather(
+            adjacency.in_offsets, adjacency.in_indices, frontier
+        )
+        found.append(np.column_stack([sources, targets]))
+        found.append(np.column_stack([in_sources, in_targets]))
+
+        neighbors = np.unique(np.concatenate([targets, in_sources]))
+        frontier = neighbors[~np.isin(neighbors, visited)]
+        if not len(frontier):
+            break
+        visited = np.union1d(visited, frontier)
+
+    edge_rows = np.concatenate(found).astype(np.int64)
+    # An edge between two frontier rows is reached from both ends
+    _, first = np.unique(np.sort(edge_rows, axis=1), axis=0, return_index=True)
+    return visited, edge_rows[np.sort(first)]
+
+
+@dataclass(frozen=True)
+class GraphCore:
+    """The laid out network as arrays, which is all the app serves from
+
+    Node codes are rows of the nodes table. `positions` holds a float32
+    row per code in 2D or 3D, NaN for people the layout doesn't place,
+    `edge_index` the int32 codes of each network edge once, and
+    `adjacency` the contacts by direction. Compared to a networkx graph
+    this is a few bytes per edge and is read without Python loops.
+    """
+
+    ids: pd.Index
+    positions: np.ndarray
+    edge_index: np.ndarray
+    adjacency: Adjacency
+
+    @property
+    def dim(self) -> int:
+        return self.positions.shape[1]
+
+    def codes(self, voter_ids: Iterable) -> np.ndarray:
+        """The code of each voter_id, or -1 for ids that aren't known"""
+        positions = self.adjacency.ids.get_indexer(voter_ids)
+        return np.where(positions >= 0, self.adjacency.rows[positions], -1)
+
+    def placed(self) -> np.ndarray:
+        """Codes of the people the layout gives a position"""
+        return np.flatnonzero(~np.isnan(self.positions).any(axis=1))
+
+    def to_networkx(self) -> Graph:
+        """A networkx graph of the placed people, for offline analysis
+
+        Nodes carry their `position`, as `from_networkx` expects.
+        """
+        network = nx.Graph()
+        placed = self.placed()
+        network.add_nodes_from(
+            (voter_id, {"position": position})
+            for voter_id, position in zip(self.ids[placed], self.positions[placed])
+        )
+        network.add_edges_from(self.ids.to_numpy()[self.edge_index])
+        return network
+
+
+def graph_core(
+    nodes: DataFrame,
+    edges: DataFrame,
+    positions: np.ndarray,
+    edge_index: np.ndarray,
+    id_field: str = "voter_id",
+    source_field: str = "source",
+    target_field: str = "target",
+    adjacency: Adjacency | None = None,
+) -> GraphCore:
+    """Packs a layout, given by node row, with the tables it belongs to
+
+    The adjacency is built from the tables unless it's passed in.
+    """
+    if adjacency is None:
+        adjacency = build_adjacency(nodes, edges, id_field, source_field, target_field)
+    return GraphCore(
+        ids=pd.Index(nodes[id_field]),
+        positions=np.asarray(positions, dtype=np.float32),
+        edge_index=np.asarray(edge_index, dtype=np.int32).reshape(-1, 2),
+        adjacency=adjacency,
+    )
+
+
+def from_networkx(
+    network: Graph,
+    nodes: DataFrame | None = None,
+    edges: DataFrame | None = None,
+    id_field: str = "voter_id",
+    source_field: str = "source",
+    target_field: str = "target",
+) -> GraphCore:
+    """Converts a networkx graph with node `position`s to a GraphCore
+
+    Codes follow the rows of `nodes` and contacts come from `edges`. Left
+    out, they are taken from the graph's own nodes and edges instead.
+    """
+    if nodes is None:
+        nodes = pd.DataFrame({id_field: list(network.nodes())})
+    if edges is None:
+        edges = nx.to_pandas_edgelist(network, source_field, target_field)
+    positions, edge_index = network_arrays(network, nodes[id_field])
+    return graph_core(
+        nodes, edges, positions, edge_index, id_field, source_field, target_field
+    )
@@ -0,0 +1,29 @@
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8050")
+# Load the data once in the master; forked workers share its pages
+preload_app = True
+workers = int(os.environ.get("WORKERS", multiprocessing.cpu_count()))
+# Threads let one worker answer other callbacks while one is slow
+worker_class = "gthread"
+threads = int(os.environ.get("THREADS", 4))
+timeout = 120
+
+
+def pre_fork(server, worker):
+    # Keep the collector from writing to, and so copying, the shared objects
+    gc.freeze()
+
+
+def when_ready(server):
+    # Runs once per start in the master, before any worker serves, whether
+    # or not the app is preloaded: /ingest batches from an earlier run
+    # belong to data that has been loaded again, and metrics start over
+    from metrics import metrics
+    from updates import UpdateLog
+
+    UpdateLog().clear()
+    metrics.share_in()
+    metrics.clear()
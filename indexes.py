@@ -0,0 +1,219 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.core.frame import DataFrame
+from pandas.core.series import Series
+
+from filters import Clause, as_text
+from graph import compress, gather
+
+# Substrings shorter than this are matched by scanning the distinct values
+GRAM_SIZE = 3
+# Strings are cut into n-grams this many at a time, to bound memory
+GRAM_CHUNK = 100_000
+# Candidates this few are checked directly rather than narrowed further
+CHECK_CANDIDATES = 1_000
+# Sorts after any character, so [prefix, prefix + LAST_CHAR) holds a prefix
+LAST_CHAR = chr(0x10FFFF)
+# Rows appended after an index was built get an index of their own,
+# until there are this many per indexed row and everything is reindexed
+REINDEX_SHARE = 0.1
+
+
+def distinct_codes(values: Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Splits text into its sorted distinct values and each row's code
+
+    Missing values get code -1.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        distinct = values.cat.categories.astype(str).to_numpy(dtype=str)
+        codes = values.cat.codes.to_numpy(np.int64)
+    else:
+        codes, uniques = pd.factorize(values)
+        distinct = np.asarray(uniques, dtype=str)
+    order = np.argsort(distinct, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    codes = np.where(codes >= 0, rank[np.maximum(codes, 0)], -1)
+    return distinct[order], codes
+
+
+def grams(strings: np.ndarray, size: int = GRAM_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """Cuts strings into overlapping n-grams, packed into one integer each
+
+    Returns which string each n-gram came from and the n-gram itself.
+    """
+    strings = np.asarray(strings, dtype=str)
+    width = strings.dtype.itemsize // 4
+    if width < size:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # Unicode code points fit in 21 bits, so three fit in an int64
+    points = strings.view(np.uint32).reshape(len(strings), width).astype(np.int64)
+    packed = np.zeros((len(strings), width - size + 1), dtype=np.int64)
+    for offset in range(size):
+        packed = packed << 21 | points[:, offset : width - size + 1 + offset]
+    # Shorter strings are padded with NUL, which no n-gram may end in
+    valid = points[:, size - 1 :] != 0
+    owners = np.broadcast_to(np.arange(len(strings))[:, None], valid.shape)
+    return owners[valid], packed[valid]
+
+
+@dataclass(frozen=True)
+class TextIndex:
+    """Rows holding text values, found without scanning the rows
+
+    Exact matches go through a hash of the distinct values, prefixes and
+    comparisons through their sorted order, and substrings through an
+    inverted index of their n-grams.
+    """
+
+    n_rows: int
+    values: np.ndarray
+    lookup: pd.Index
+    offsets: np.ndarray
+    rows: np.ndarray
+    gram_keys: np.ndarray
+    gram_offsets: np.ndarray
+    gram_values: np.ndarray
+
+    def value_rows(self, positions: np.ndarray) -> np.ndarray:
+        """Sorted rows holding any of the distinct values at `positions`"""
+        _, rows = gather(self.offsets, self.rows, np.asarray(positions, np.int64))
+        if len(rows) * 16 < self.n_rows:
+            return np.sort(rows)
+        # Sorting many rows is slower than marking them
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[rows] = True
+        return np.flatnonzero(mask)
+
+    def equal(self, text: str) -> np.ndarray:
+        position = self.lookup.get_indexer([text])
+        return self.value_rows(position[position >= 0])
+
+    def prefix(self, text: str) -> np.ndarray:
+        start, stop = np.searchsorted(self.values, [text, text + LAST_CHAR])
+        return self.value_rows(np.arange(start, stop))
+
+    def compare(self, operator: str, text: str) -> np.ndarray:
+        side = "left" if operator in ("lt", "ge") else "right"
+        split = np.searchsorted(self.values, text, side=side)
+        if operator in ("lt", "le"):
+            return self.value_rows(np.arange(split))
+        return self.value_rows(np.arange(split, len(self.values)))
+
+    def contains(self, text: str) -> np.ndarray | None:
+        if len(text) < GRAM_SIZE:
+            # Too short to have n-grams, and likely to match most rows
+            return None
+        postings = []
+        for key in np.unique(grams(np.array([text]))[1]):
+            position = np.searchsorted(self.gram_keys, key)
+            if position == len(self.gram_keys) or self.gram_keys[position] != key:
+                return np.empty(0, dtype=np.int64)
+            start, stop = self.gram_offsets[position : position + 2]
+            postings.append(self.gram_values[start:stop])
+        postings.sort(key=len)
+        candidates = postings[0]
+        for found in postings[1:]:
+            if len(candidates) <= CHECK_CANDIDATES:
+                break
+            # Postings are sorted, so look the few candidates up in the many
+            at = np.minimum(np.searchsorted(found, candidates), len(found) - 1)
+            candidates = candidates[found[at] == candidates]
+        # Sharing every n-gram doesn't put them in order, so check
+        found = self.values[candidates].tolist()
+        matches = np.fromiter((text in value for value in found), bool, len(found))
+        return self.value_rows(candidates[matches])
+
+    def search(self, clause: Clause) -> np.ndarray | None:
+        """Rows matching a filter clause, or None if the index can't tell"""
+        text = as_text(clause.value)
+        if clause.operator == "eq":
+            return self.equal(text)
+        if clause.operator == "contains":
+            return self.contains(text)
+        if clause.operator == "datestartswith":
+            return self.prefix(text)
+        if clause.operator in ("lt", "le", "gt", "ge"):
+            return self.compare(clause.operator, text)
+        return None
+
+
+def text_index(values: Series) -> TextIndex:
+    """Indexes one text column of a table by row position"""
+    distinct, codes = distinct_codes(values)
+    found = codes >= 0
+    offsets, rows = compress(codes[found], np.flatnonzero(found), len(distinct))
+
+    owners, keys = [], []
+    for start in range(0, len(distinct), GRAM_CHUNK):
+        chunk_owners, chunk_keys = grams(distinct[start : start + GRAM_CHUNK])
+        owners.append(chunk_owners + start)
+        keys.append(chunk_keys)
+    keys = np.concatenate(keys)
+    order = np.argsort(keys, kind="stable")
+    # Values stay in order within each n-gram, so repeats are adjacent
+    keys, owners = keys[order], np.concatenate(owners)[order]
+    distinct_pairs = np.ones(len(keys), dtype=bool)
+    distinct_pairs[1:] = (keys[1:] != keys[:-1]) | (owners[1:] != owners[:-1])
+    keys, owners = keys[distinct_pairs], owners[distinct_pairs]
+    starts = np.ones(len(keys), dtype=bool)
+    starts[1:] = keys[1:] != keys[:-1]
+    starts = np.flatnonzero(starts)
+
+    return TextIndex(
+        n_rows=len(values),
+        values=distinct,
+        lookup=pd.Index(distinct),
+        offsets=offsets,
+        rows=rows,
+        gram_keys=keys[starts],
+        gram_offsets=np.append(starts, len(keys)),
+        gram_values=owners.astype(np.int32),
+    )
+
+
+def build_indexes(df: DataFrame, columns: Iterable[str]) -> Dict[str, TextIndex]:
+    """Indexes the text columns people search most, once per load"""
+    return {column: text_index(df[column]) for column in columns}
+
+
+@dataclass(frozen=True)
+class AppendedIndex:
+    """A TextIndex plus a smaller one over the rows appended after it
+
+    Appending then only indexes the new rows, and searches ask both.
+    """
+
+    base: TextIndex
+    added: TextIndex
+
+    @property
+    def n_rows(self) -> int:
+        return self.base.n_rows + self.added.n_rows
+
+    def search(self, clause: Clause) -> np.ndarray | None:
+        found = self.base.search(clause)
+        if found is None:
+            return None
+        # Appended rows come after every base row, so the result stays sorted
+        return np.concatenate([found, self.added.search(clause) + self.base.n_rows])
+
+
+def extend_index(index: TextIndex | AppendedIndex, values: Series):
+    """Indexes a column that only had rows appended since `index`"""
+    base = index.base if isinstance(index, AppendedIndex) else index
+    if len(values) == index.n_rows:
+        return index
+    if len(values) - base.n_rows > REINDEX_SHARE * base.n_rows:
+        return text_index(values)
+    return AppendedIndex(base, text_index(values.iloc[base.n_rows :]))
+
+
+def extend_indexes(indexes: Dict[str, TextIndex | AppendedIndex], df: DataFrame):
+    """`build_indexes` for a table that only had rows appended since"""
+    return {
+        column: extend_index(index, df[column]) for column, index in indexes.items()
+    }
@@ -0,0 +1,128 @@
+import os
+import time
+import traceback
+from dataclasses import dataclass, replace
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from dash import DiskcacheManager
+from dash.exceptions import PreventUpdate
+
+from metrics import Record, attach, current
+
+# Where background callbacks keep their results, shared by every worker,
+# or an empty string to run them inside the request instead
+JOB_CACHE_DIR = os.environ.get(
+    "JOB_CACHE_DIR", str(Path(__file__).parent / ".job_cache")
+)
+# How long results, and progress, are kept after they're last stored or
+# read, in seconds
+JOB_RESULT_TTL = 3_600
+# Disk the stored results may take before the least recently used go
+JOB_CACHE_BYTES = int(os.environ.get("JOB_CACHE_MB", 1_024)) << 20
+
+
+@dataclass(frozen=True)
+class JobResult:
+    """A background callback's output with what its job measured"""
+
+    output: Any
+    record: Record
+
+
+def measured_job(func: Callable) -> Callable:
+    """Runs a callback in a job with a record of its own, returned with it"""
+
+    @wraps(func)
+    def job(*args, **kwargs):
+        record = Record(time.perf_counter())
+        current.set(record)
+        try:
+            output = func(*args, **kwargs)
+        except PreventUpdate:
+            raise
+        except Exception as err:
+            # Dash's own form for a failed job, raised again by the server
+            output = {
+                "long_callback_error": {"msg": str(err), "tb": traceback.format_exc()}
+            }
+        # A profile doesn't pickle
+        return JobResult(output, replace(record, profile=None))
+
+    return job
+
+
+class JobManager(DiskcacheManager):
+    """A DiskcacheManager whose jobs are measured like inline callbacks
+
+    The record a job builds comes back with its result and is counted as
+    part of the request that collects it, see `metrics.attach`. Stored
+    results are shared by every worker, and a request whose result is
+    already stored skips starting a job; `hits` and `misses` count both.
+    """
+
+    # Stands in for the pid of a job that was never started
+    NO_JOB = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hits = 0
+        self.misses = 0
+
+    def call_job_fn(self, key, job_fn, args, context):
+        if self.cache_by is not None and self.handle.get(key) is not None:
+            self.hits += 1
+            return self.NO_JOB
+        self.misses += 1
+        return super().call_job_fn(key, job_fn, args, context)
+
+    def terminate_job(self, job):
+        if job is not None and int(job) != self.NO_JOB:
+            super().terminate_job(job)
+
+    def make_job_fn(self, fn, progress, key=None):
+        return super().make_job_fn(measured_job(fn), progress, key)
+
+    def get_result(self, key, job):
+        result = super().get_result(key, job)
+        if isinstance(result, JobResult):
+            attach(result.record)
+            if self.cache_by is not None:
+                # Kept bare for repeat requests, so the job is counted once
+                self.handle.set(key, result.output, expire=self.expire)
+            result = result.output
+        return result
+
+
+def background_manager(cache_by: Iterable[Callable] = ()):
+    """A Dash background callback manager, or None to run callbacks inline
+
+    Jobs run in their own process and a newer request for the same
+    callback terminates the one it supersedes. Results are cached by the
+    callback inputs plus whatever the `cache_by` functions return, for
+    `JOB_RESULT_TTL` and within `JOB_CACHE_BYTES` of disk. Needs
+    diskcache, multiprocess and psutil; without them callbacks run inline.
+    """
+    if not JOB_CACHE_DIR:
+        return None
+    try:
+        import diskcache
+
+        class ExpiringCache(diskcache.Cache):
+            """Dash stores results without an expiry, so they get one here"""
+
+            def set(self, key, value, expire=JOB_RESULT_TTL, read=False, **kwargs):
+                return super().set(key, value, expire, read, **kwargs)
+
+        return JobManager(
+            ExpiringCache(
+                JOB_CACHE_DIR,
+                size_limit=JOB_CACHE_BYTES,
+                eviction_policy="least-recently-used",
+            ),
+            cache_by=list(cache_by),
+            expire=JOB_RESULT_TTL,
+        )
+    except ImportError:
+        return None
@@ -0,0 +1,550 @@
+import hashlib
+import os
+from itertools import product
+from pathlib import Path
+from typing import Callable, Iterable, List, NamedTuple, Tuple
+
+import networkx as nx
+import numpy as np
+
+# Point this at a volume to keep layouts across container rebuilds,
+# or set it to an empty string to always recompute
+LAYOUT_CACHE_DIR = os.environ.get(
+    "LAYOUT_CACHE_DIR", str(Path(__file__).parent / ".layout_cache")
+)
+
+
+def layout_key(
+    ids: Iterable, edge_index: np.ndarray, layout: Callable, **params
+) -> str:
+    """Hashes the people and contacts to lay out along with the layout settings
+
+    Row order is part of the key because the stored array has one row
+    per id, in order.
+    """
+    digest = hashlib.sha256()
+    digest.update("\n".join(map(str, ids)).encode())
+    digest.update(np.ascontiguousarray(edge_index, dtype=np.int64).data)
+    digest.update(f"{layout.__module__}.{layout.__name__}".encode())
+    digest.update(repr(sorted(params.items())).encode())
+    return digest.hexdigest()
+
+
+def cached_layout(
+    ids: Iterable,
+    edge_index: np.ndarray,
+    layout: Callable,
+    cache_dir: str | None = None,
+    **params,
+) -> np.ndarray:
+    """Runs `layout(len(ids), edge_index, **params)` unless already stored
+
+    `edge_index` holds rows of `ids`, and the result has one position per
+    id. Layouts are stored as one .npy array per network and settings,
+    and are memory mapped on load, so a restart with the same network
+    costs a file open instead of a full layout.
+    """
+    ids = list(ids)
+    cache_dir = LAYOUT_CACHE_DIR if cache_dir is None else cache_dir
+    if not cache_dir:
+        return layout(len(ids), edge_index, **params)
+
+    path = Path(cache_dir) / f"{layout_key(ids, edge_index, layout, **params)}.npy"
+    if path.exists():
+        return np.load(path, mmap_mode="r")
+
+    coords = np.asarray(layout(len(ids), edge_index, **params), dtype=float)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename so a crash never leaves a partial file behind
+    partial = path.with_suffix(f".{os.getpid()}.partial")
+    with open(partial, "wb") as f:
+        np.save(f, coords)
+    os.replace(partial, path)
+    return coords
+
+
+# Pairs below which repulsion is summed exactly instead of through the tree
+EXACT_PAIRS = 250_000
+
+
+def grid_index(cells: np.ndarray, side: int) -> np.ndarray:
+    """Flattens integer cell coordinates on a grid `side` cells wide"""
+    return cells @ side ** np.arange(cells.shape[1])
+
+
+class Octree(NamedTuple):
+    """Per-level grids of cell masses and mass-weighted position sums"""
+
+    low: np.ndarray
+    span: float
+    levels: List[Tuple[int, np.ndarray, np.ndarray]]
+
+
+def octree(coords: np.ndarray, mass: np.ndarray, leaf_size: int = 4) -> Octree:
+    """Builds an implicit octree (a quadtree in 2D), one dense grid per level
+
+    The deepest level is chosen to hold about `leaf_size` nodes per cell,
+    and is capped at a couple million cells.
+    """
+    n, dim = coords.shape
+    max_depth = 21 // dim
+    depth = int(np.clip(np.ceil(np.log2(max(n / leaf_size, 1)) / dim), 2, max_depth))
+    low = coords.min(axis=0)
+    span = (coords.max(axis=0) - low).max() or 1.0
+
+    levels = []
+    for level in range(2, depth + 1):
+        side = 2**level
+        flat = grid_index(cell_of(coords, low, span, side), side)
+        cell_mass = np.bincount(flat, weights=mass, minlength=side**dim)
+        cell_sum = np.column_stack(
+            [
+                np.bincount(flat, weights=mass * coords[:, axis], minlength=side**dim)
+                for axis in range(dim)
+            ]
+        )
+        levels.append((side, cell_mass, cell_sum))
+    return Octree(low, span, levels)
+
+
+def cell_of(points: np.ndarray, low: np.ndarray, span: float, side: int):
+    """Grid cell of each point, with points outside the grid kept at its edge"""
+    cells = np.floor((points - low) / span * side).astype(np.int64)
+    return np.clip(cells, 0, side - 1)
+
+
+def far_field(
+    centers: np.ndarray,
+    cells: np.ndarray,
+    side: int,
+    cell_mass: np.ndarray,
+    cell_sum: np.ndarray,
+) -> np.ndarray:
+    """Repulsion at each cell from the cells its parent neighbors but it doesn't
+
+    Cells are visited one shift of the parent's neighborhood at a time,
+    or all shifts at once when there are few enough of them.
+    """
+    dim = cells.shape[1]
+    shifts = np.array(list(product(range(-2, 4), repeat=dim)))
+    corners = cells // 2 * 2
+    if len(cells) * len(shifts) <= EXACT_PAIRS:
+        batches = [(corners[:, None, :] + shifts, cells[:, None, :])]
+    else:
+        batches = [(corners + shift, cells) for shift in shifts]
+
+    field = np.zeros((len(cells), dim))
+    for other, own in batches:
+        far = ((other >= 0) & (other < side)).all(axis=-1) & (
+            np.abs(other - own) > 1
+        ).any(axis=-1)
+        index = np.nonzero(far)
+        other_flat = grid_index(other[index], side)
+        other_mass = cell_mass[other_flat]
+        present = other_mass > 0
+        rows = index[0][present]
+        other_flat = other_flat[present]
+        other_mass = other_mass[present]
+        delta = centers[rows] - cell_sum[other_flat] / other_mass[:, None]
+        distance2 = np.maximum((delta**2).sum(axis=1), 1e-8)
+        push = delta * (other_mass / distance2)[:, None]
+        if len(batches) == 1:
+            # Rows repeat across shifts, so they have to be summed up
+            push = np.column_stack(
+                [
+                    np.bincount(rows, weights=push[:, axis], minlength=len(cells))
+                    for axis in range(dim)
+                ]
+            )
+            rows = slice(None)
+        field[rows] += push
+    return field
+
+
+def octree_repulsion(
+    tree: Octree, points: np.ndarray, own_mass: np.ndarray
+) -> np.ndarray:
+    """Barnes-Hut repulsion felt at `points` from the bodies in a tree
+
+    At each level, the points in a cell feel the cells that their parent
+    neighbors but that it doesn't, as single bodies at their centers of
+    mass. Points also feel the neighboring leaves directly. Each level
+    costs O(N), and there are O(log N) of them.
+
+    Points that are themselves in the tree pass their mass as `own_mass`
+    so they don't push themselves, others pass zero.
+    """
+    dim = points.shape[1]
+    force = np.zeros(points.shape)
+    for side, cell_mass, cell_sum in tree.levels:
+        cells = cell_of(points, tree.low, tree.span, side)
+        occupied, first, inverse = np.unique(
+            grid_index(cells, side), return_index=True, return_inverse=True
+        )
+        occupied_cells = cells[first]
+        centers = (
+            np.column_stack(
+                [np.bincount(inverse, weights=points[:, axis]) for axis in range(dim)]
+            )
+            / np.bincount(inverse)[:, None]
+        )
+
+        field = far_field(centers, occupied_cells, side, cell_mass, cell_sum)
+        force += field[inverse]
+
+    # Near field against the leaves around each point, less the point itself
+    for shift in product(range(-1, 2), repeat=dim):
+        other = cells + shift
+        index = np.flatnonzero(((other >= 0) & (other < side)).all(axis=1))
+        other_flat = grid_index(other[index], side)
+        other_mass = cell_mass[other_flat]
+        other_sum = cell_sum[other_flat]
+        if not any(shift):
+            other_mass = other_mass - own_mass[index]
+            other_sum = other_sum - own_mass[index, None] * points[index]
+        present = other_mass > 1e-9
+        index = index[present]
+        other_mass = other_mass[present]
+        center = other_sum[present] / other_mass[:, None]
+        delta = points[index] - center
+        distance2 = np.maximum((delta**2).sum(axis=1), 1e-8)
+        force[index] += delta * (other_mass / distance2)[:, None]
+    return force
+
+
+def exact_repulsion(
+    points: np.ndarray, coords: np.ndarray, mass: np.ndarray
+) -> np.ndarray:
+    """Repulsion at `points` summed over every body, for small inputs"""
+    delta = points[:, None, :] - coords[None, :, :]
+    distance2 = np.maximum((delta**2).sum(axis=2), 1e-8)
+    # A point on top of a body, itself included, has no direction to go
+    return np.einsum("ijk,ij->ik", delta, mass / distance2)
+
+
+def repulsion(
+    coords: np.ndarray,
+    mass: np.ndarray,
+    k: float,
+    rows: np.ndarray | None = None,
+) -> np.ndarray:
+    """Fruchterman-Reingold repulsion, through an octree for large inputs
+
+    Only `rows` are evaluated when given, against every node.
+    """
+    rows = np.arange(len(coords)) if rows is None else rows
+    if len(coords) * len(rows) <= EXACT_PAIRS:
+        return exact_repulsion(coords[rows], coords, mass) * k**2
+    tree = octree(coords, mass)
+    return octree_repulsion(tree, coords[rows], mass[rows]) * k**2
+
+
+def attraction(
+    coords: np.ndarray,
+    edge_index: np.ndarray,
+    weight: np.ndarray,
+    k: float,
+) -> np.ndarray:
+    """Fruchterman-Reingold spring pull along every edge"""
+    n, dim = coords.shape
+    sources = edge_index[:, 0]
+    targets = edge_index[:, 1]
+    delta = coords[sources] - coords[targets]
+    pull = delta * (np.linalg.norm(delta, axis=1) * weight / k)[:, None]
+    return np.column_stack(
+        [
+            np.bincount(targets, weights=pull[:, axis], minlength=n)
+            - np.bincount(sources, weights=pull[:, axis], minlength=n)
+            for axis in range(dim)
+        ]
+    )
+
+
+def relax(
+    coords: np.ndarray,
+    edge_index: np.ndarray,
+    iterations: int,
+    temperature: float,
+    k: float,
+    mass: np.ndarray | None = None,
+    weight: np.ndarray | None = None,
+) -> np.ndarray:
+    """Runs force-directed iterations with linear cooling
+
+    Like `nx.spring_layout`, every node steps `temperature` along its net
+    force, and the temperature falls to zero over the iterations.
+    """
+    coords = coords.copy()
+    mass = np.ones(len(coords)) if mass is None else mass
+    weight = np.ones(len(edge_index)) if weight is None else weight
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        displacement = repulsion(coords, mass, k) + attraction(
+            coords, edge_index, weight, k
+        )
+        length = np.linalg.norm(displacement, axis=1)
+        length = np.where(length < 0.01, 0.1, length)
+        coords += displacement * (temperature / length)[:, None]
+        temperature -= cooling
+    return coords
+
+
+def coarsen(
+    n: int, edge_index: np.ndarray, rng: np.random.Generator, rounds: int = 3
+) -> Tuple[np.ndarray, int]:
+    """Merges nodes pairwise along a random matching of the edges
+
+    Every node proposes its heaviest edge under random weights and edges
+    proposed from both ends are matched. Nodes left unmatched join the
+    group of a matched neighbor, which collapses the leaves around hubs.
+    Returns each node's group and the number of groups.
+    """
+    sources = edge_index[:, 0]
+    targets = edge_index[:, 1]
+    priority = rng.random(len(edge_index))
+    groups = np.arange(n)
+    matched = np.zeros(n, dtype=bool)
+    for _ in range(rounds):
+        live = np.flatnonzero(~matched[sources] & ~matched[targets])
+        if not len(live):
+            break
+        ends = np.concatenate([sources[live], targets[live]])
+        proposals = np.tile(np.arange(len(live)), 2)
+        order = np.lexsort((priority[live][proposals], ends))
+        last = np.append(ends[order][1:] != ends[order][:-1], True)
+        choice = np.full(n, -1)
+        choice[ends[order][last]] = proposals[order][last]
+
+        mutual = live[
+            (choice[sources[live]] == np.arange(len(live)))
+            & (choice[targets[live]] == np.arange(len(live)))
+        ]
+        groups[targets[mutual]] = sources[mutual]
+        matched[sources[mutual]] = True
+        matched[targets[mutual]] = True
+
+    bridges = np.flatnonzero(matched[sources] != matched[targets])
+    loners = np.where(matched[sources[bridges]], targets[bridges], sources[bridges])
+    hosts = np.where(matched[sources[bridges]], sources[bridges], targets[bridges])
+    loners, first = np.unique(loners, return_index=True)
+    groups[loners] = groups[hosts[first]]
+
+    _, groups = np.unique(groups, return_inverse=True)
+    return groups, int(groups.max(initial=-1)) + 1
+
+
+def merge_edges(
+    edge_index: np.ndarray, weight: np.ndarray, groups: np.ndarray, n_groups: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Maps edges onto groups, dropping loops and summing parallel edges"""
+    merged = np.sort(groups[edge_index], axis=1)
+    between = merged[:, 0] != merged[:, 1]
+    keys = merged[between, 0] * n_groups + merged[between, 1]
+    keys, inverse = np.unique(keys, return_inverse=True)
+    merged_weight = np.bincount(inverse, weights=weight[between])
+    return np.column_stack([keys // n_groups, keys % n_groups]), merged_weight
+
+
+def spring_coords(
+    n_nodes: int, edge_index: np.ndarray, dim: int = 2, seed: int | None = None
+) -> np.ndarray:
+    """`nx.spring_layout` on an edge index
+
+    Its iterations cost O(N^2) and it needs scipy past 500 nodes.
+    """
+    network = nx.Graph()
+    network.add_nodes_from(range(n_nodes))
+    network.add_edges_from(edge_index.tolist())
+    positions = nx.spring_layout(network, dim=dim, seed=seed)
+    return np.array([positions[node] for node in range(n_nodes)]).reshape(-1, dim)
+
+
+def barnes_hut_coords(
+    n_nodes: int,
+    edge_index: np.ndarray,
+    dim: int = 2,
+    seed: int | None = None,
+    iterations: int = 50,
+    coords: np.ndarray | None = None,
+) -> np.ndarray:
+    """Fruchterman-Reingold layout with Barnes-Hut repulsion
+
+    Iterations cost O(N log N) instead of the O(N^2) of
+    `nx.spring_layout`. `edge_index` holds the (n_edges, 2) node rows of
+    each edge, without loops. Starts from `coords` if given, otherwise
+    from random positions.
+    """
+    rng = np.random.default_rng(seed)
+    if coords is None:
+        coords = rng.random((n_nodes, dim))
+    if not n_nodes:
+        return np.empty((0, dim))
+    k = np.sqrt(1 / n_nodes)
+    span = (coords.max(axis=0) - coords.min(axis=0)).max() or 1.0
+    coords = relax(coords, edge_index, iterations, 0.1 * span, k)
+    return nx.rescale_layout(coords)
+
+
+def multilevel_coords(
+    n_nodes: int,
+    edge_index: np.ndarray,
+    dim: int = 2,
+    seed: int | None = None,
+    iterations: int = 50,
+    coarsest: int = 100,
+    coords: np.ndarray | None = None,
+) -> np.ndarray:
+    """Barnes-Hut layout run on successively finer coarsenings of the graph
+
+    The graph is coarsened by edge matching until about `coarsest` nodes
+    remain, laid out there, and the positions are carried back down one
+    level at a time with a shorter, cooler relaxation at each. Coarse
+    nodes repel with the weight of the nodes they stand for, so the
+    layout keeps its scale from level to level. `edge_index` is as for
+    `barnes_hut_coords`.
+
+    Passing `coords` skips the coarsening and relaxes from them.
+    """
+    rng = np.random.default_rng(seed)
+    n = n_nodes
+    if not n:
+        return np.empty((0, dim))
+    k = np.sqrt(1 / n)
+    if coords is not None:
+        return nx.rescale_layout(relax(coords, edge_index, iterations, 0.1, k))
+
+    levels = []
+    mass = np.ones(n)
+    weight = np.ones(len(edge_index))
+    size = n
+    while size > coarsest:
+        groups, n_groups = coarsen(size, edge_index, rng)
+        if n_groups > 0.9 * size:
+            # Nothing left to match, e.g. the rest is isolated nodes
+            break
+        levels.append((groups, edge_index, weight, mass))
+        edge_index, weight = merge_edges(edge_index, weight, groups, n_groups)
+        mass = np.bincount(groups, weights=mass, minlength=n_groups)
+        size = n_groups
+
+    # Start from a box about as wide as the finished layout
+    coords = (rng.random((size, dim)) - 0.5) * np.sqrt(n) * k
+    coords = relax(coords, edge_index, iterations, 0.1, k, mass, weight)
+    for groups, edge_index, weight, mass in reversed(levels):
+        spread = (coords.max(axis=0) - coords.min(axis=0)).max() / len(coords)
+        coords = coords[groups] + rng.normal(scale=spread, size=(len(groups), dim))
+        coords = relax(
+            coords, edge_index, max(iterations // 4, 10), 0.02, k, mass, weight
+        )
+    return nx.rescale_layout(coords)
+
+
+def equilibrium_k(coords: np.ndarray, edge_index: np.ndarray, sample: int = 1_000):
+    """Estimates the optimal distance `k` an existing layout settled at
+
+    Layouts get rescaled after they finish, so `k` is recovered from the
+    positions instead: it is the value that best balances repulsion
+    against attraction over a sample of nodes.
+    """
+    n = len(coords)
+    rows = np.random.default_rng(0).choice(n, min(sample, n), replace=False)
+    mass = np.ones(n)
+    push = repulsion(coords, mass, 1.0, rows)
+    # Only the edges at the sampled nodes pull on them
+    sampled = np.zeros(n, dtype=bool)
+    sampled[rows] = True
+    edge_index = edge_index[sampled[edge_index].any(axis=1)]
+    pull = attraction(coords, edge_index, np.ones(len(edge_index)), 1.0)[rows]
+    # The net force k^2 * push + pull / k is smallest when k^3 = -pull / push
+    cube = -(push * pull).sum() / (push**2).sum()
+    if cube > 0:
+        return cube ** (1 / 3)
+    return np.sqrt(1 / n) * (coords.max(axis=0) - coords.min(axis=0)).max()
+
+
+def extend_layout(
+    coords: np.ndarray,
+    edge_index: np.ndarray,
+    new_edge_index: np.ndarray,
+    n_nodes: int,
+    iterations: int = 10,
+    seed: int | None = None,
+) -> np.ndarray:
+    """Adds nodes to an existing layout without laying out the whole graph
+
+    `coords` holds the current positions of the first rows, `edge_index`
+    every edge after the update and `new_edge_index` the edges just added.
+    New nodes start at the average position of their placed neighbors, and
+    then only they and the endpoints of new edges move, for a few short
+    iterations against a tree of everything that stays put.
+    """
+    rng = np.random.default_rng(seed)
+    n_old, dim = coords.shape
+    old_edges = edge_index[(edge_index < n_old).all(axis=1)]
+    k = equilibrium_k(coords, old_edges) if len(old_edges) else 0.1
+
+    positions = np.empty((n_nodes, dim))
+    positions[:n_old] = coords
+    placed = np.arange(n_nodes) < n_old
+    sources = edge_index[:, 0]
+    targets = edge_index[:, 1]
+    while not placed.all():
+        # Fill in from placed neighbors, one hop further each pass
+        outward = placed[sources] & ~placed[targets]
+        inward = ~placed[sources] & placed[targets]
+        reached = np.concatenate([targets[outward], sources[inward]])
+        if not len(reached):
+            break
+        anchors = np.concatenate([sources[outward], targets[inward]])
+        counts = np.bincount(reached, minlength=n_nodes)
+        rows = np.flatnonzero(counts)
+        sums = np.column_stack(
+            [
+                np.bincount(
+                    reached, weights=positions[anchors, axis], minlength=n_nodes
+                )
+                for axis in range(dim)
+            ]
+        )
+        positions[rows] = sums[rows] / counts[rows, None]
+        positions[rows] += rng.normal(scale=k / 2, size=(len(rows), dim))
+        placed[rows] = True
+    # Nodes with no way back to the old layout land anywhere inside it
+    loose = np.flatnonzero(~placed)
+    positions[loose] = rng.uniform(
+        coords.min(axis=0), coords.max(axis=0), size=(len(loose), dim)
+    )
+
+    moving = np.union1d(np.arange(n_old, n_nodes), new_edge_index.ravel())
+    still = np.setdiff1d(np.arange(n_nodes), moving)
+    # The nodes that stay put only need to go into a tree once
+    tree = octree(positions[still], np.ones(len(still))) if len(still) else None
+    few = len(moving) ** 2 <= EXACT_PAIRS
+    local_edges = edge_index[np.isin(edge_index, moving).any(axis=1)]
+    weight = np.ones(len(local_edges))
+    temperature = k
+    for _ in range(iterations):
+        points = positions[moving]
+        if few:
+            push = exact_repulsion(points, points, np.ones(len(moving)))
+            if tree is not None:
+                push += octree_repulsion(tree, points, np.zeros(len(moving)))
+        else:
+            everything = octree(positions, np.ones(n_nodes))
+            push = octree_repulsion(everything, points, np.ones(len(moving)))
+        pull = attraction(positions, local_edges, weight, k)[moving]
+        displacement = push * k**2 + pull
+        length = np.linalg.norm(displacement, axis=1)
+        length = np.where(length < 0.01, 0.1, length)
+        positions[moving] += displacement * (temperature / length)[:, None]
+        temperature -= k / (iterations + 1)
+    return positions
+
+
+# Engines by name, each taking (n_nodes, edge_index, dim, seed) and
+# returning one position per node
+LAYOUTS = {
+    "spring": spring_coords,
+    "barnes_hut": barnes_hut_coords,
+    "multilevel": multilevel_coords,
+}
@@ -0,0 +1,101 @@
+from pathlib import Path
+from typing import Iterable
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pandas.core.frame import DataFrame
+from pyarrow import csv
+
+from datasets import CATEGORY_COLUMNS, compact_nodes, layout_network
+
+# Read in blocks so parsing a large file never holds it all as text
+BLOCK_SIZE = 64 << 20
+
+
+def csv_to_arrow(csv_path: Path, arrow_path: Path, strings: Iterable[str] = ()) -> Path:
+    """Converts a CSV to an uncompressed Arrow IPC (Feather v2) file
+
+    Each block is written as soon as it is parsed, so only one block is in
+    memory at a time. `strings` are kept as text even if they look like
+    numbers, which matters for ids.
+    """
+    reader = csv.open_csv(
+        csv_path,
+        read_options=csv.ReadOptions(block_size=BLOCK_SIZE),
+        convert_options=csv.ConvertOptions(
+            column_types={column: pa.string() for column in strings}
+        ),
+    )
+
+    # Write then rename so a crash never leaves a partial file behind
+    partial = arrow_path.with_suffix(".partial")
+    with pa.OSFile(str(partial), "wb") as sink:
+        with pa.ipc.new_file(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+    partial.replace(arrow_path)
+    return arrow_path
+
+
+def read_arrow(arrow_path: Path, categories: Iterable[str] = ()) -> DataFrame:
+    """Memory maps an Arrow file into a DataFrame
+
+    Text stays in Arrow memory as `string[pyarrow]` instead of becoming
+    Python objects. Dictionary columns become Categoricals, and so do the
+    text `categories`, which are encoded here rather than in the file
+    because every CSV block would otherwise bring its own dictionary.
+    """
+    with pa.memory_map(str(arrow_path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    for column in categories:
+        index = table.schema.get_field_index(column)
+        if index >= 0 and pa.types.is_string(table.schema.field(index).type):
+            table = table.set_column(
+                index, column, pc.dictionary_encode(table.column(index))
+            )
+    return table.to_pandas(
+        types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get,
+    )
+
+
+def load_table(
+    csv_path: Path | str,
+    categories: Iterable[str] = (),
+    strings: Iterable[str] = (),
+) -> DataFrame:
+    """Reads a CSV through an Arrow copy kept next to it
+
+    The copy is made on first use and again whenever the CSV changes, so
+    later starts skip parsing entirely. Arrow files, like the ones
+    `synthetic` writes, are read as they are.
+    """
+    csv_path, categories = Path(csv_path), list(categories)
+    if csv_path.suffix == ".arrow":
+        return read_arrow(csv_path, categories)
+    arrow_path = csv_path.with_suffix(".arrow")
+    if not arrow_path.exists() or arrow_path.stat().st_mtime < csv_path.stat().st_mtime:
+        csv_to_arrow(csv_path, arrow_path, [*categories, *strings])
+    return read_arrow(arrow_path, categories)
+
+
+def voter_files(
+    nodes_path: Path | str,
+    edges_path: Path | str,
+    dim: int = 3,
+    layout: str = "multilevel",
+    id_field: str = "voter_id",
+    source_field: str = "source",
+    target_field: str = "target",
+):
+    """Loads a real voter file and contact list
+
+    Returns the same `(nodes, edges, core)` as `datasets.mock_data`.
+    """
+    nodes = load_table(nodes_path, categories=CATEGORY_COLUMNS, strings=[id_field])
+    nodes = compact_nodes(nodes)
+    edges = load_table(edges_path, strings=[source_field, target_field])
+    core = layout_network(
+        nodes, edges, dim, layout, id_field, source_field, target_field
+    )
+    return nodes, edges, core
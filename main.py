@@ -1,18 +1,46 @@
-import networkx as nx
+import hmac
+import logging
+import os
+import uuid
+from dataclasses import dataclass, replace
+from functools import partial
+from threading import Lock, Thread
+from typing import Dict, Tuple
+
+import numpy as np
 import pandas as pd
-from dash import html
-from dash.dependencies import Input, Output
+from dash import ClientsideFunction, Patch, ctx, dcc, html, no_update
+from dash.dependencies import Input, Output, State
+from flask import request
 
 from app import app
-from datasets import mock_data
+from datasets import add_contacts, mock_data
+from figures import FigureCache
+from filters import EdgeView, compile_query, edge_view, extend_edge_view, query_rows
+from graph import GraphCore, ego_network
+from indexes import AppendedIndex, TextIndex, build_indexes, extend_indexes
+from jobs import background_manager
+from loaders import voter_files
+from metrics import count, instrument, metrics, serve_metrics, stage
+from overview import (
+    DETAIL_ZOOM,
+    bounds,
+    camera_vectors,
+    camera_zoom,
+    detail_figure,
+    overview_figure,
+)
+from spatial import PointGrid, point_grid, viewport_box
+from updates import UpdateLog
 from viz import (
-    display_network,
+    OVERVIEW_EYE,
     display_table,
-    graph_edges,
-    graph_nodes,
-    split_filter_part,
-    unpack_edges,
-    unpack_nodes,
+    figure_patch,
+    figure_skeleton,
+    figure_update,
+    network_graph,
+    page_records,
+    subgraph_figure,
 )
 
 COLUMNS = [
@@ -24,47 +52,535 @@ COLUMNS = [
     "support",
     "gender",
 ]
+PAGE_SIZE = 25
+# Searches matching at most this many people are sent whole, so narrowing
+# them down happens in the browser
+CLIENT_FILTER_ROWS = 1_000
+# Searches on these columns are answered from an index built at load time
+SEARCH_INDEXED = ["voter_id", "first_name", "last_name"]
+# How often browsers check for contacts added through /ingest
+DATA_POLL_MS = 5_000
+# /ingest is only served when this is set, to requests sending it as
+# "Authorization: Bearer <token>"
+INGEST_TOKEN = os.environ.get("INGEST_TOKEN", "")
+# Layout engine from layouts.LAYOUTS; spring is O(N^2) and needs scipy
+# past 500 people, so the multilevel engine is the default
+LAYOUT = os.environ.get("LAYOUT", "multilevel")
+# "binary" sends figure arrays as base64 typed arrays, "json" as plain lists
+BINARY_FIGURES = os.environ.get("FIGURE_TRANSPORT", "binary") == "binary"
+ingest_lock = Lock()
+# The /ingest batches every worker applies, set up by create_app
+update_log: UpdateLog | None = None
+figure_cache = FigureCache()
+metrics.cache("figures", lambda: (figure_cache.hits, figure_cache.misses))
+metrics.cache("queries", lambda: tuple(compile_query.cache_info())[:2])
+logger = logging.getLogger(__name__)
 
-if __name__ == "__main__":
-    nodes, edges, network = mock_data()
-    tall = edges.merge(nodes, left_on="source", right_on="voter_id", how="left")
-    tall = tall.merge(
-        nodes,
-        left_on="target",
-        right_on="voter_id",
-        suffixes=("_source", "_target"),
-        how="left",
+
+@dataclass(frozen=True)
+class Dataset:
+    """The tables and indexes the callbacks read from, as one version
+
+    Callbacks read `dataset` once and use that copy throughout, so an
+    ingest swapping in a new one never hands them a mix of versions.
+    """
+
+    nodes: pd.DataFrame
+    edges: pd.DataFrame
+    core: GraphCore
+    edge_table: EdgeView
+    search_index: Dict[str, TextIndex | AppendedIndex]
+    position_grid: PointGrid
+    position_ranges: np.ndarray
+    # The search table lists people by id, sorted once here
+    id_order: np.ndarray
+    id_rank: np.ndarray
+    # 1 for the data loaded at startup, plus one per /ingest batch applied
+    version: int
+    # Versions restart with the process, but job results outlive it
+    token: str
+
+
+def load_data(new_nodes, new_edges, new_core, appended: bool = False):
+    """Builds the tables and indexes the callbacks read from
+
+    With `appended`, the tables only had rows appended since the current
+    dataset, as `datasets.add_contacts` does, and only the new rows are
+    looked up and indexed. Everything is built before the new `dataset`
+    is published in one assignment, so callbacks see all of it or none.
+    """
+    global dataset
+
+    previous = globals().get("dataset")
+    ids = new_nodes["voter_id"]
+    if appended:
+        edge_table = extend_edge_view(
+            previous.edge_table, new_nodes, new_edges, new_core
+        )
+        search_index = extend_indexes(previous.search_index, new_nodes)
+        # Merge the new ids into the sorted order rather than sort again
+        n_old = len(previous.nodes)
+        added = ids.iloc[n_old:].to_numpy(dtype=object)
+        added_order = np.argsort(added, kind="stable")
+        sorted_ids = ids.iloc[previous.id_order].to_numpy(dtype=object)
+        at = np.searchsorted(sorted_ids, added[added_order], side="right")
+        id_order = np.insert(previous.id_order, at, n_old + added_order)
+    else:
+        edge_table = edge_view(new_nodes, new_edges)
+        search_index = build_indexes(new_nodes, SEARCH_INDEXED)
+        id_order = ids.argsort(kind="stable").to_numpy()
+    id_rank = np.empty_like(id_order)
+    id_rank[id_order] = np.arange(len(id_order))
+    dataset = Dataset(
+        nodes=new_nodes,
+        edges=new_edges,
+        core=new_core,
+        edge_table=edge_table,
+        search_index=search_index,
+        position_grid=point_grid(new_core.positions),
+        position_ranges=bounds(new_core.positions),
+        id_order=id_order,
+        id_rank=id_rank,
+        version=1 if previous is None else previous.version + 1,
+        token=uuid.uuid4().hex,
     )
+    # Cached figures are keyed by version, clearing just frees them sooner
+    figure_cache.clear()
+
+
+def full_figure(current: Dataset):
+    """The figure of the whole network, built once per data version
 
-    nodes["color"] = nodes["support"].map(
-        {
-            "5 - Oppose": "#db231d",
-            "4 - Lean Oppose": "#e97b77",
-            "3 - Undecided": "#b094b0",
-            "2 - Lean Support": "#77ace9",
-            "1 - Support": "#1d76db",
-        }
+    Large networks are summarized so the page stays responsive.
+    """
+    core = current.core
+    return figure_cache.get_or_build(
+        (None, None, current.version),
+        lambda: overview_figure(current.nodes, core.positions, core.edge_index),
     )
-    full_edge_trace = graph_edges(*unpack_edges(network), ids=nodes["voter_id"])
-    text = nodes["first_name"] + " " + nodes["last_name"]
-    node_positions = unpack_nodes(network)
-    full_node_trace = graph_nodes(
-        x=node_positions["x"],
-        y=node_positions["y"],
-        z=node_positions["z"],
-        node_colors=nodes["color"],
-        node_text=text,
-        ids=nodes["voter_id"],
+
+
+def zoom_figure(current: Dataset, camera):
+    """The people a zoomed in camera is looking at, in full detail"""
+    # Round the camera so small moves reuse the figure
+    key = tuple(np.round(np.concatenate(camera_vectors(camera)), 2))
+    core = current.core
+    return figure_cache.get_or_build(
+        (key, None, current.version),
+        lambda: detail_figure(current.nodes, core.positions, core.edge_index, camera),
     )
 
+
+def ego_figure(current: Dataset, person_id, radius, set_progress=None):
+    """The figure of everyone within `radius` hops of a person
+
+    Organizers tend to click back and forth between the same few people,
+    so recent figures are cached. `set_progress` is told each step done,
+    as (step, steps).
+    """
+
+    core = current.core
+
+    def build():
+        if set_progress:
+            set_progress((0, 2))
+        with stage("ego_network"):
+            rows, edge_rows = ego_network(core.adjacency, person_id, radius)
+        count("nodes", len(rows))
+        count("edges", len(edge_rows))
+        if set_progress:
+            set_progress((1, 2))
+        return subgraph_figure(
+            current.nodes, core.positions, rows, edge_rows, filtered=True
+        )
+
+    return figure_cache.get_or_build((person_id, radius, current.version), build)
+
+
+def picklable(update):
+    """A figure update that survives the pickling of background job results
+
+    A Patch doesn't, but its JSON form is applied by the browser the same.
+    """
+    if isinstance(update, Patch):
+        return update.to_plotly_json()
+    return update
+
+
+def send_figure(figure, camera: bool = True):
+    """A figure in the form the network graph takes updates in
+
+    Binary figures go through a store and are unpacked by
+    assets/network.js, JSON figures patch the graph directly.
+    """
+    if BINARY_FIGURES:
+        return figure_update(figure, camera)
+    return figure_patch(figure, camera)
+
+
+def apply_log():
+    """Applies the /ingest batches this process doesn't have yet, in order
+
+    Every process applies the same batches with the same seeds, so they
+    all end up with the same data under the same version. A batch that
+    can't be applied fails the same way everywhere, so it is logged and
+    skipped, and its version holds the same data as the one before it.
+    Call with `ingest_lock` held.
+    """
+    global dataset
+
+    for number in range(dataset.version, len(update_log) + 1):
+        new_nodes, new_edges = update_log.get(number)
+        current = dataset
+        try:
+            with stage("add_contacts"):
+                updated = add_contacts(
+                    current.nodes,
+                    current.edges,
+                    current.core,
+                    new_nodes,
+                    new_edges,
+                    seed=number,
+                )
+            with stage("load_data"):
+                load_data(*updated, appended=True)
+        except Exception:
+            logger.exception("skipping /ingest batch %d", number)
+            dataset = replace(current, version=number + 1)
+
+
+def sync_data(wait: bool = True):
+    """Applies the /ingest batches this process doesn't have yet
+
+    Without `wait`, returns at once if another thread is already applying
+    them. See `apply_log`.
+    """
+    if update_log is None or not ingest_lock.acquire(blocking=wait):
+        return
+    try:
+        apply_log()
+    finally:
+        ingest_lock.release()
+
+
+def read_batch(payload) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """The voters and contacts in an /ingest body, as tables
+
+    Raises ValueError, with a message for the sender, unless the body is
+    an object whose nodes and edges are lists of objects holding only
+    text, numbers and booleans, with every column filled in. Ids are read
+    as text.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("send a JSON object with nodes and edges")
+    tables = []
+    for key, columns, ids in (
+        ("nodes", COLUMNS, ["voter_id"]),
+        ("edges", ["source", "target"], ["source", "target"]),
+    ):
+        rows = payload.get(key, [])
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise ValueError(f"{key} must be a list of objects")
+        if any(isinstance(v, (dict, list)) for row in rows for v in row.values()):
+            raise ValueError(f"{key} may only hold text, numbers and booleans")
+        table = pd.DataFrame(rows, columns=columns)
+        if table.isna().any().any():
+            raise ValueError(f"{key} need {columns}")
+        tables.append(table.astype({column: str for column in ids}))
+    return tables[0], tables[1]
+
+
+@instrument
+def ingest():
+    """Adds voters and contacts to the running app
+
+    Expects JSON like {"nodes": [{"voter_id": ...}], "edges":
+    [{"source": ..., "target": ...}]}. New people are placed into the
+    existing layout and browsers pick the update up on their next poll.
+    The batch is applied here before it goes into the shared update log,
+    so a batch that can't be applied is turned away rather than logged,
+    and other server processes apply it when a browser next polls them.
+    """
+    sent = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(sent.encode(), f"Bearer {INGEST_TOKEN}".encode()):
+        return {"error": "send the ingest token as a bearer token"}, 401
+    try:
+        new_nodes, new_edges = read_batch(request.get_json(silent=True))
+    except ValueError as err:
+        return {"error": str(err)}, 400
+    if new_nodes.empty and new_edges.empty:
+        return {"error": "no nodes or edges to add"}, 400
+
+    with ingest_lock:
+        apply_log()
+        current = dataset
+        try:
+            with stage("add_contacts"):
+                # The seed it gets as the next batch in the log
+                updated = add_contacts(
+                    current.nodes,
+                    current.edges,
+                    current.core,
+                    new_nodes,
+                    new_edges,
+                    seed=current.version,
+                )
+        except Exception as err:
+            return {"error": f"the batch can't be applied: {err}"}, 400
+        number = update_log.append((new_nodes, new_edges))
+        if number == current.version:
+            with stage("load_data"):
+                load_data(*updated, appended=True)
+        else:
+            # Another process logged a batch first, so apply them in order
+            apply_log()
+        current = dataset
+    return {
+        "version": number + 1,
+        "nodes": len(current.nodes),
+        "edges": len(current.edges),
+    }
+
+
+# The callbacks below are registered by create_app, and can be called
+# directly once data is loaded, see benchmarks/load.py
+
+
+@instrument
+def poll_data_version(_, version):
+    if update_log is not None and dataset.version <= len(update_log):
+        # Applying batches lays the network out again, which polls needn't wait
+        # for; they see the new version once it's published
+        Thread(target=sync_data, kwargs={"wait": False}, daemon=True).start()
+    current = dataset
+    if version == current.version:
+        return no_update
+    return current.version
+
+
+@instrument
+def update_table(filter):
+    with stage("filter"):
+        dff = dataset.edge_table.select(filter)
+    count("rows", len(dff))
+    return dff.to_dict("records")
+
+
+@instrument
+def update_names(search_request, page_size, version, viewport, in_view):
+    query = search_request["query"]
+    current = dataset
+    nodes = current.nodes
+    with stage("filter"):
+        rows = query_rows(nodes, query, current.search_index)
+        if viewport and "in-view" in in_view:
+            visible = current.position_grid.box(viewport["low"], viewport["high"])
+            rows = np.intersect1d(rows, visible, assume_unique=True)
+    count("rows", len(rows))
+    with stage("sort"):
+        if len(rows) * 8 < len(nodes):
+            # Few matches are quicker to sort than to pick out of every id
+            rows = rows[np.argsort(current.id_rank[rows])]
+        else:
+            mask = np.zeros(len(nodes), dtype=bool)
+            mask[rows] = True
+            rows = current.id_order[mask[current.id_order]]
+        found = nodes.iloc[rows]
+    if len(found) <= CLIENT_FILTER_ROWS:
+        # Every match fits in the browser, which filters narrower
+        # queries itself until one needs rows it doesn't have
+        with stage("records"):
+            records = found[COLUMNS].to_dict("records")
+        return records, 0, no_update, "native", "native", query
+    records, page_current, page_count = page_records(
+        found, COLUMNS, search_request["page"], page_size
+    )
+    return records, page_current, page_count, "custom", "custom", None
+
+
+# Update the source data table
+@instrument
+def update_source_table(filter):
+    with stage("filter"):
+        dff = dataset.edge_table.select(filter, columns=["voter_id_target"])
+    count("rows", len(dff))
+    return dff["voter_id_target"].tolist()
+
+
+@instrument
+def update_selection(
+    selection,
+    data,
+    source_page,
+    source_page_size,
+    target_page,
+    target_page_size,
+    shown,
+):
+    """Resolves the selected person once for everything that shows them
+
+    One click is one request here, plus one for the graph. Paging a
+    table only updates that table, and the rest is left as it is, as is
+    everything when the person resolves to the one already `shown`.
+    """
+    # The cell can outlive its row when the table is filtered
+    if selection and selection["row"] < len(data or []):
+        person = data[selection["row"]]
+    else:
+        person = None
+    triggered = set(ctx.triggered_prop_ids)
+    # The initial call has no trigger and fills in everything
+    selected = not triggered or bool(
+        triggered & {"search.active_cell", "search.derived_viewport_data"}
+    )
+    if triggered and person == shown:
+        # Sorting or filtering the search table often leaves the same
+        # person under the cell, and redrawing them changes nothing
+        selected = False
+
+    current = dataset
+    unchanged = (no_update,) * 3
+    sources = targets = unchanged
+    if selected or triggered & {"source.page_current", "source.page_size"}:
+        if "source.page_current" not in triggered:
+            # A new selection starts back on the first page
+            source_page = 0
+        sources = update_sources(current, person, source_page, source_page_size)
+    if selected or triggered & {"target.page_current", "target.page_size"}:
+        if "target.page_current" not in triggered:
+            target_page = 0
+        targets = update_targets(current, person, target_page, target_page_size)
+
+    if not selected:
+        return (*sources, *targets, no_update, no_update, no_update)
+    return (*sources, *targets, *update_headers(person), person)
+
+
+def update_sources(current: Dataset, person, page_current, page_size):
+    nodes = current.nodes
+    if person is None:
+        return page_records(nodes, COLUMNS, page_current, page_size)
+    # The people this person sourced
+    sources = nodes.iloc[current.core.adjacency.successors(person["voter_id"])]
+    count("rows", len(sources))
+    return page_records(sources, COLUMNS, page_current, page_size)
+
+
+def update_targets(current: Dataset, person, page_current, page_size):
+    nodes = current.nodes
+    if person is None:
+        return page_records(nodes, COLUMNS, page_current, page_size)
+    # The people who sourced this person
+    targets = nodes.iloc[current.core.adjacency.predecessors(person["voter_id"])]
+    count("rows", len(targets))
+    return page_records(targets, COLUMNS, page_current, page_size)
+
+
+def update_headers(person, print_fields=["first_name", "last_name"]):
+    if person is None:
+        return "Source", "Target"
+    name = " ".join(person[x] for x in print_fields)
+    return f"These people contacted {name}...", f"{name} contacted these people..."
+
+
+@instrument
+def update_network(set_progress, person, radius):
+    current = dataset
+    if person is None:
+        return picklable(send_figure(full_figure(current))), "overview"
+    figure = ego_figure(current, person["voter_id"], radius, set_progress)
+    return picklable(send_figure(figure)), "ego"
+
+
+@instrument
+def update_camera(relayout, person, view):
+    # The camera moved, which only matters to the whole network
+    camera = (relayout or {}).get("scene.camera")
+    if person is not None or camera is None:
+        return no_update, no_update
+    if camera_zoom(camera, OVERVIEW_EYE) < DETAIL_ZOOM:
+        return send_figure(zoom_figure(dataset, camera), camera=False), "detail"
+    if view == "overview":
+        return no_update, no_update
+    return send_figure(full_figure(dataset), camera=False), "overview"
+
+
+@instrument
+def update_viewport(relayout, view):
+    if view == "ego":
+        # Neighborhoods are drawn on their own axes, not the layout's
+        return None
+    if ctx.triggered_id == "network-view":
+        return None if view == "overview" else no_update
+    relayout = relayout or {}
+    position_ranges = dataset.position_ranges
+    box = viewport_box(relayout, position_ranges)
+    if box is None:
+        # Autoscaling zooms all the way back out
+        autoscaled = any(key.endswith("autorange") for key in relayout)
+        return None if autoscaled else no_update
+    # Clamped to the layout, so the corners are finite for JSON
+    low = np.maximum(box[0], position_ranges[:, 0])
+    high = np.minimum(box[1], position_ranges[:, 1])
+    return {"low": low.tolist(), "high": high.tolist()}
+
+
+def create_app():
+    """Loads the data and wires up the layout and callbacks of the app
+
+    Everything is loaded before the app is returned, so a server that
+    forks workers after calling this shares the data between them.
+    """
+    global update_log
+
+    if os.environ.get("NODES_CSV"):
+        load_data(
+            *voter_files(
+                os.environ["NODES_CSV"], os.environ["EDGES_CSV"], layout=LAYOUT
+            )
+        )
+    else:
+        load_data(*mock_data(layout=LAYOUT))
+    # Batches left from an earlier run are cleared once per start, by the
+    # gunicorn master or below, since they belong to data that's reloaded
+    update_log = UpdateLog()
+
     app.layout = html.Div(
         [
             html.H1("Network Visualizer", className="header"),
             html.Div(
-                [display_network(full_edge_trace, full_node_trace)],
+                # The traces are filled in by the first call to update_network
+                [network_graph(figure_skeleton(full_figure(dataset)))],
                 className="graph-container",
                 id="graph-viz",
             ),
+            html.Div(
+                [
+                    html.Label("Hops from the selected person"),
+                    dcc.Slider(id="radius", min=1, max=3, step=1, value=1),
+                    html.Progress(
+                        id="network-progress", style={"visibility": "hidden"}
+                    ),
+                ],
+                className="controls",
+            ),
+            dcc.Store(id="data-version", data=dataset.version),
+            # Which view of the network is drawn: overview, detail or ego
+            dcc.Store(id="network-view", data="overview"),
+            dcc.Store(id="network-update"),
+            # The person picked in the search table, shared by the graph
+            dcc.Store(id="selection"),
+            # Without /ingest the data never changes, so there's no need to poll
+            dcc.Interval(
+                id="data-poll", interval=DATA_POLL_MS, disabled=not INGEST_TOKEN
+            ),
+            # What the search table asks the server for, once typing pauses
+            dcc.Store(id="search-request", data={"query": "", "page": 0}),
+            dcc.Interval(id="search-debounce", interval=100, disabled=True),
+            # The filter the search table holds every match of, if any
+            dcc.Store(id="search-local"),
+            # The corners of the part of the network in view, if zoomed
+            dcc.Store(id="viewport"),
             html.Div(
                 [
                     html.H3("Search", id="search-title"),
@@ -74,11 +590,17 @@ if __name__ == "__main__":
                         search "1 - Support" and not 1 - Support
                         """
                     ),
+                    dcc.Checklist(
+                        id="in-view",
+                        options=[{"label": " Only people in view", "value": "in-view"}],
+                        value=[],
+                    ),
                     display_table(
-                        df=nodes[COLUMNS],
+                        df=dataset.nodes[COLUMNS],
                         columns=COLUMNS,
                         html_id="search",
                         search=True,
+                        page_size=PAGE_SIZE,
                     ),
                 ],
                 className="table-wide",
@@ -86,207 +608,182 @@ if __name__ == "__main__":
             html.Div(
                 [
                     html.H3("Source", id="source-title"),
-                    display_table(df=nodes[COLUMNS], columns=COLUMNS, html_id="source"),
+                    display_table(
+                        df=dataset.nodes[COLUMNS],
+                        columns=COLUMNS,
+                        html_id="source",
+                        page_size=PAGE_SIZE,
+                    ),
                 ],
                 className="table-wide",
             ),
             html.Div(
                 [
                     html.H3("Target", id="target-title"),
-                    display_table(df=nodes[COLUMNS], columns=COLUMNS, html_id="target"),
+                    display_table(
+                        df=dataset.nodes[COLUMNS],
+                        columns=COLUMNS,
+                        html_id="target",
+                        page_size=PAGE_SIZE,
+                    ),
                 ],
                 className="table-wide",
             ),
         ]
     )
 
-    @app.callback(
+    if INGEST_TOKEN:
+        app.server.add_url_rule("/ingest", view_func=ingest, methods=["POST"])
+    serve_metrics(app.server)
+
+    app.callback(
+        Output("data-version", "data"),
+        [Input("data-poll", "n_intervals")],
+        [State("data-version", "data")],
+    )(poll_data_version)
+
+    app.callback(
         Output("description", "data"),
         [Input("description", "filter_query")],
         supress_callback_exceptions=True,
+    )(update_table)
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="search", function_name="request"),
+        [Output("search-request", "data"), Output("search-debounce", "disabled")],
+        [
+            Input("search", "filter_query"),
+            Input("search", "page_current"),
+            Input("search-debounce", "n_intervals"),
+        ],
+        [State("search-local", "data"), State("search-request", "data")],
     )
-    def update_table(filter):
-        filtering_expressions = filter.split(" && ")
-        dff = tall
-        for filter_part in filtering_expressions:
-            col_name, operator, filter_value = split_filter_part(filter_part)
-            if operator in ("eq", "ne", "lt", "le", "gt", "ge"):
-                # these operators match pandas series operator method names
-                dff = dff.loc[getattr(dff[col_name], operator)(filter_value)]
-            elif operator == "contains":
-                dff = dff.loc[dff[col_name].str.contains(filter_value)]
-            elif operator == "datestartswith":
-                # this is a simplification of the front-end filtering logic,
-                # only works with complete fields in standard format
-                dff = dff.loc[dff[col_name].str.startswith(filter_value)]
-        return dff.to_dict("records")
-
-    @app.callback(Output("search", "data"), [Input("search", "filter_query")])
-    def update_names(filter):
-        id_field = "voter_id"
-        filtering_expressions = filter.split(" && ")
-        dff = nodes.sort_values(id_field)
-        for filter_part in filtering_expressions:
-            col_name, operator, filter_value = split_filter_part(filter_part)
-            if operator in ("eq", "ne", "lt", "le", "gt", "ge"):
-                # these operators match pandas series operator method names
-                dff = dff.loc[getattr(dff[col_name], operator)(filter_value)]
-            elif operator == "contains":
-                dff = dff.loc[dff[col_name].str.contains(filter_value)]
-            elif operator == "datestartswith":
-                # this is a simplification of the front-end filtering logic,
-                # only works with complete fields in standard format
-                dff = dff.loc[dff[col_name].str.startswith(filter_value)]
-        return dff.to_dict("records")
-
-    # Update the source data table
-    @app.callback(
+
+    app.callback(
+        [
+            Output("search", "data"),
+            Output("search", "page_current"),
+            Output("search", "page_count"),
+            Output("search", "filter_action"),
+            Output("search", "page_action"),
+            Output("search-local", "data"),
+        ],
+        [
+            # Edits to the filter arrive here debounced, see assets/search.js
+            Input("search-request", "data"),
+            Input("search", "page_size"),
+            # New data reaches the other tables and the graph via search
+            Input("data-version", "data"),
+            Input("viewport", "data"),
+            Input("in-view", "value"),
+        ],
+    )(update_names)
+
+    app.callback(
         Output("network", "selectedData"),
         [Input("description", "filter_query")],
-    )
-    def update_source_table(filter):
-        filtering_expressions = filter.split(" && ")
-        dff = tall
-        for filter_part in filtering_expressions:
-            col_name, operator, filter_value = split_filter_part(filter_part)
-            if operator in ("eq", "ne", "lt", "le", "gt", "ge"):
-                # these operators match pandas series operator method names
-                dff = dff.loc[getattr(dff[col_name], operator)(filter_value)]
-            elif operator == "contains":
-                dff = dff.loc[dff[col_name].str.contains(filter_value)]
-            elif operator == "datestartswith":
-                # this is a simplification of the front-end filtering logic,
-                # only works with complete fields in standard format
-                dff = dff.loc[dff[col_name].str.startswith(filter_value)]
-        return dff["voter_id_target"].tolist()
-
-    @app.callback(
-        Output("source", "data"),
-        [Input("search", "active_cell"), Input("search", "data")],
-    )
-    def update_sources(
-        selection,
-        data,
-        id_field="voter_id",
-        target_field="target",
-        source_field="source",
-    ):
-        if selection:
-            # Get occurrences of name in the source file
-            row_index = selection["row"]
-            person_id = data[row_index][id_field]
-
-            # The people this person sourced
-            source_names = edges[edges[source_field] == person_id][
-                target_field
-            ].tolist()
-            sources = nodes[nodes[id_field].isin(source_names)]
-            return sources[COLUMNS].to_dict("records")
-        else:
-            return nodes[COLUMNS].to_dict("records")
+    )(update_source_table)
 
-    # Update the target data table
-    @app.callback(
-        Output("target", "data"),
-        [Input("search", "active_cell"), Input("search", "data")],
-    )
-    def update_targets(
-        selection,
-        data,
-        id_field="voter_id",
-        target_field="target",
-        source_field="source",
-    ):
-        if selection:
-            # Get occurrences of name in the source file
-            row_index = selection["row"]
-            person_id = data[row_index][id_field]
-
-            # The people who sourced this person
-            target_names = edges[edges[target_field] == person_id][
-                source_field
-            ].tolist()
-            targets = nodes[nodes[id_field].isin(target_names)]
-            return targets[COLUMNS].to_dict("records")
-        else:
-            return nodes[COLUMNS].to_dict("records")
+    if BINARY_FIGURES:
+        network_output = ("network-update", "data")
+        app.clientside_callback(
+            ClientsideFunction(namespace="network", function_name="apply_update"),
+            Output("network", "figure"),
+            Input("network-update", "data"),
+            State("network", "figure"),
+        )
+    else:
+        network_output = ("network", "figure")
+
+    app.callback(
+        [
+            Output("source", "data"),
+            Output("source", "page_current"),
+            Output("source", "page_count"),
+            Output("target", "data"),
+            Output("target", "page_current"),
+            Output("target", "page_count"),
+            Output("source-title", "children"),
+            Output("target-title", "children"),
+            Output("selection", "data"),
+        ],
+        [
+            Input("search", "active_cell"),
+            Input("search", "derived_viewport_data"),
+            Input("source", "page_current"),
+            Input("source", "page_size"),
+            Input("target", "page_current"),
+            Input("target", "page_size"),
+        ],
+        [State("selection", "data")],
+    )(update_selection)
 
-    @app.callback(
-        Output("graph-viz", "children"),
-        [Input("search", "active_cell"), Input("search", "data")],
+    # Neighborhoods are drawn in background jobs when a job manager is
+    # available, where a new selection terminates the job it replaces
+    manager = background_manager(
+        cache_by=[lambda: dataset.token, lambda: BINARY_FIGURES]
     )
-    def update_network(selection, data, id_field="voter_id"):
-        if selection:
-            row_index = selection["row"]
-            person_id = data[row_index][id_field]
-            subgraph = nx.subgraph_view(
-                network,
-                filter_edge=lambda source, target: source == person_id
-                or target == person_id,
-            )
-            filtered_edges = pd.DataFrame(subgraph.edges, columns=["source", "target"])
-            selected_ids = set(
-                filtered_edges.source.tolist() + filtered_edges.target.tolist()
-            )
+    if manager is not None:
+        # Jobs build their figures in a process of their own, so their
+        # figure cache is the manager's store of results
+        metrics.cache("jobs", lambda: (manager.hits, manager.misses))
+        network_callback = update_network
+        background = dict(
+            background=True,
+            manager=manager,
+            # How often the browser checks on the job, in milliseconds
+            interval=250,
+            progress=[
+                Output("network-progress", "value"),
+                Output("network-progress", "max"),
+            ],
+            running=[
+                (
+                    Output("network-progress", "style"),
+                    {"visibility": "visible"},
+                    {"visibility": "hidden"},
+                ),
+            ],
+        )
+    else:
+        # Inline there is nobody to report progress to
+        network_callback = partial(update_network, lambda progress: None)
+        background = {}
+    app.callback(
+        [Output(*network_output), Output("network-view", "data")],
+        [Input("selection", "data"), Input("radius", "value")],
+        **background,
+    )(network_callback)
 
-            filtered_nodes = nodes[nodes.voter_id.isin(selected_ids)].reset_index(
-                drop=True
-            )
-            edge_trace = graph_edges(
-                *unpack_edges(subgraph), ids=filtered_nodes["voter_id"]
-            )
-            positions = unpack_nodes(subgraph, filtered_nodes.voter_id.unique())
-            node_trace = graph_nodes(
-                x=positions["x"],
-                y=positions["y"],
-                z=positions["z"],
-                node_colors=filtered_nodes["color"],
-                node_text=filtered_nodes["first_name"]
-                + " "
-                + filtered_nodes["last_name"],
-                ids=filtered_nodes["voter_id"],
-            )
+    app.callback(
+        [
+            Output(*network_output, allow_duplicate=True),
+            Output("network-view", "data", allow_duplicate=True),
+        ],
+        [Input("network", "relayoutData")],
+        [State("selection", "data"), State("network-view", "data")],
+        prevent_initial_call=True,
+    )(update_camera)
 
-            return display_network(edge_trace, node_trace, filtered=True)
-        else:
-            return display_network(full_edge_trace, full_node_trace, filtered=False)
+    app.callback(
+        Output("viewport", "data"),
+        [Input("network", "relayoutData"), Input("network-view", "data")],
+        prevent_initial_call=True,
+    )(update_viewport)
 
-    # Update the target header
-    @app.callback(
-        Output("target-title", "children"),
-        [Input("search", "active_cell"), Input("search", "data")],
-    )
-    def update_target_header(
-        selection,
-        data,
-        id_field="voter_id",
-        print_fields=["first_name", "last_name"],
-    ):
-        if selection:
-            # Get occurrences of name in the source file
-            row_index = selection["row"]
-            name = " ".join(data[row_index][x] for x in print_fields)
-            return f"{name} contacted these people..."
-        else:
-            return "Target"
+    return app
 
-    # Update the source header
-    @app.callback(
-        Output("source-title", "children"),
-        [Input("search", "active_cell"), Input("search", "data")],
-    )
-    def update_source_header(
-        selection,
-        data,
-        id_field="voter_id",
-        print_fields=["first_name", "last_name"],
-    ):
-        if selection:
-            # Get occurrences of name in the source file
-            row_index = selection["row"]
-            name = " ".join(data[row_index][x] for x in print_fields)
-            return f"These people contacted {name}..."
-        else:
-            return "Source"
 
-    app.run_server(host="0.0.0.0", debug=True)
+def create_server():
+    """The WSGI app for production servers, e.g.
+
+    gunicorn -c gunicorn.conf.py "main:create_server()"
+    """
+    return create_app().server
+
+
+if __name__ == "__main__":
+    UpdateLog().clear()
+    metrics.share_in()
+    metrics.clear()
+    create_app().run_server(host="0.0.0.0", debug=True)
@@ -0,0 +1,429 @@
+import atexit
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Callable, Dict, Iterable, Tuple
+
+from flask import Flask, Response
+
+# Requests slower than this are logged with where their time went, in ms
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 1_000))
+# Share of callbacks run under cProfile, whose profile is logged if slow
+PROFILE_SAMPLE = float(os.environ.get("PROFILE_SAMPLE", 0))
+# Where each server process leaves its totals for /metrics to add up, or an
+# empty string to report every process separately
+METRICS_DIR = os.environ.get("METRICS_DIR", str(Path(__file__).parent / ".metrics"))
+# How often each process leaves its totals there, in seconds
+FLUSH_SECONDS = 1.0
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+# Time spent in Dash and Flask around the callback, which is mostly
+# decoding the inputs and serializing the response to JSON
+FRAMEWORK_STAGE = "dash"
+# Time in a callback outside any of its named stages
+OTHER_STAGE = "other"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Record:
+    """Where the time of one request went, built up as it runs
+
+    Stages don't overlap: entering a stage pauses the one around it, so
+    the stages of a request add up to its wall time.
+    """
+
+    stage_start: float
+    callback: str | None = None
+    stage: str = FRAMEWORK_STAGE
+    stages: Dict[str, float] = field(default_factory=dict)
+    counts: Dict[str, int] = field(default_factory=dict)
+    failed: bool = False
+    profile: cProfile.Profile | None = None
+
+    def switch(self, stage: str) -> str:
+        """Charges the time since the last switch and moves on to `stage`"""
+        now = time.perf_counter()
+        elapsed = now - self.stage_start
+        self.stages[self.stage] = self.stages.get(self.stage, 0.0) + elapsed
+        previous, self.stage, self.stage_start = self.stage, stage, now
+        return previous
+
+
+# The request running in this thread, if it is being measured
+current: ContextVar[Record | None] = ContextVar("metrics_record", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Charges the time inside the block to a named stage of the request"""
+    record = current.get()
+    if record is None:
+        yield
+        return
+    previous = record.switch(name)
+    try:
+        yield
+    finally:
+        record.switch(previous)
+
+
+def timed(func: Callable) -> Callable:
+    """Charges the time in a function to a stage named after it"""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with stage(func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def count(kind: str, n: int):
+    """Adds to a count of what the request handled, e.g. rows or edges"""
+    record = current.get()
+    if record is not None:
+        record.counts[kind] = record.counts.get(kind, 0) + int(n)
+
+
+class Histogram:
+    """Counts of observations by upper bound, like a Prometheus histogram"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def add(self, other: "Histogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+
+    def lines(self, name: str, labels: str) -> list:
+        lines = []
+        total = 0
+        for bound, n in zip((*self.buckets, "+Inf"), self.counts):
+            total += n
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {total}")
+        return lines
+
+
+class Metrics:
+    """Totals over every measured request, in the Prometheus text format
+
+    Requests only add to totals kept in this process. Once `share_in` is
+    called, and if diskcache is installed, a thread leaves the totals in a
+    diskcache under the process's pid every `FLUSH_SECONDS` they change,
+    and /metrics adds up those of every process, like prometheus_client's
+    multiprocess mode, so other processes' totals lag by up to a flush.
+    Totals of workers that have exited are kept, so the counters never go
+    down. Otherwise each process reports its own totals, labelled with its
+    pid.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.seconds = defaultdict(lambda: Histogram(SECONDS_BUCKETS))
+        self.bytes = defaultdict(lambda: Histogram(BYTES_BUCKETS))
+        self.stage_seconds = defaultdict(float)
+        self.items = defaultdict(int)
+        self.caches: Dict[str, Callable[[], Tuple[int, int]]] = {}
+        self.store = None
+        self.changed = False
+        # The process the flushing thread runs in, which a fork leaves behind
+        self.flusher_pid = None
+        # Held while flushing, so an older snapshot never replaces a newer one
+        self.flushing = Lock()
+
+    def share_in(self, directory: str = METRICS_DIR):
+        """Adds up totals across the processes sharing `directory`"""
+        if self.store is not None or not directory:
+            return
+        try:
+            import diskcache
+
+            self.store = diskcache.Cache(directory)
+        except ImportError:
+            pass
+
+    def cache(self, name: str, hits_and_misses: Callable[[], Tuple[int, int]]):
+        """Reports a cache's hits and misses, read when metrics are scraped"""
+        self.caches[name] = hits_and_misses
+
+    def finish(self, record: Record, size: int | None = None):
+        record.switch(FRAMEWORK_STAGE)
+        seconds = sum(record.stages.values())
+        name = record.callback
+        with self.lock:
+            self.requests[name] += 1
+            self.errors[name] += record.failed
+            self.seconds[name].observe(seconds)
+            if size is not None:
+                self.bytes[name].observe(size)
+            for stage_name, elapsed in record.stages.items():
+                self.stage_seconds[name, stage_name] += elapsed
+            for kind, n in record.counts.items():
+                self.items[name, kind] += n
+            self.changed = True
+        if self.store is not None and self.flusher_pid != os.getpid():
+            self.start_flusher()
+        if 1_000 * seconds >= SLOW_REQUEST_MS:
+            log_slow(record, seconds, size)
+
+    def totals(self) -> dict:
+        """A copy of this process's totals, as plain data that pickles"""
+        with self.lock:
+            totals = {
+                "requests": dict(self.requests),
+                "errors": dict(self.errors),
+                "seconds": {k: copy_histogram(h) for k, h in self.seconds.items()},
+                "bytes": {k: copy_histogram(h) for k, h in self.bytes.items()},
+                "stage_seconds": dict(self.stage_seconds),
+                "items": dict(self.items),
+            }
+        totals["caches"] = {}
+        for name, hits_and_misses in self.caches.items():
+            for result, n in zip(("hit", "miss"), hits_and_misses()):
+                totals["caches"][name, result] = n
+        return totals
+
+    def flush(self):
+        """Leaves this process's totals for the other processes to read"""
+        with self.flushing:
+            self.changed = False
+            self.store.set(os.getpid(), self.totals())
+
+    def start_flusher(self):
+        with self.flushing:
+            if self.flusher_pid == os.getpid():
+                return
+            self.flusher_pid = os.getpid()
+
+        def flush_changes():
+            while True:
+                time.sleep(FLUSH_SECONDS)
+                if self.changed:
+                    self.flush()
+
+        Thread(target=flush_changes, name="metrics-flush", daemon=True).start()
+        atexit.register(self.flush)
+
+    def clear(self):
+        """Drops the totals processes have shared so far, e.g. on a start"""
+        if self.store is not None:
+            self.store.clear()
+
+    def render(self) -> str:
+        if self.store is None:
+            return format_totals(self.totals(), f'worker="{os.getpid()}",')
+        # This process's totals are flushed first, so they're up to date
+        self.flush()
+        shared = (self.store.get(pid) for pid in list(self.store))
+        return format_totals(add_totals(totals for totals in shared if totals), "")
+
+
+def copy_histogram(histogram: Histogram) -> Histogram:
+    copied = Histogram(histogram.buckets)
+    copied.add(histogram)
+    return copied
+
+
+def add_totals(all_totals: Iterable[dict]) -> dict:
+    """Adds up the totals of several processes, see `Metrics.totals`"""
+    summed = {
+        "requests": defaultdict(int),
+        "errors": defaultdict(int),
+        "seconds": {},
+        "bytes": {},
+        "stage_seconds": defaultdict(float),
+        "items": defaultdict(int),
+        "caches": defaultdict(int),
+    }
+    for totals in all_totals:
+        for kind, values in totals.items():
+            for key, value in values.items():
+                if isinstance(value, Histogram):
+                    summed[kind].setdefault(key, Histogram(value.buckets)).add(value)
+                else:
+                    summed[kind][key] += value
+    return summed
+
+
+def format_totals(totals: dict, worker: str) -> str:
+    """Totals in the Prometheus text format, with `worker` before each label"""
+    lines = []
+
+    def family(name, kind, help):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    family("netviz_callback_requests_total", "counter", "Callback requests")
+    for name, n in totals["requests"].items():
+        labels = f'{worker}callback="{name}"'
+        lines.append(f"netviz_callback_requests_total{{{labels}}} {n}")
+    family("netviz_callback_errors_total", "counter", "Callbacks that raised")
+    for name, n in totals["errors"].items():
+        labels = f'{worker}callback="{name}"'
+        lines.append(f"netviz_callback_errors_total{{{labels}}} {n}")
+    family("netviz_callback_seconds", "histogram", "Request wall time")
+    for name, histogram in totals["seconds"].items():
+        labels = f'{worker}callback="{name}"'
+        lines += histogram.lines("netviz_callback_seconds", labels)
+    family("netviz_callback_response_bytes", "histogram", "Response size")
+    for name, histogram in totals["bytes"].items():
+        labels = f'{worker}callback="{name}"'
+        lines += histogram.lines("netviz_callback_response_bytes", labels)
+    family(
+        "netviz_callback_stage_seconds_total",
+        "counter",
+        "Request wall time by stage",
+    )
+    for (name, stage_name), elapsed in totals["stage_seconds"].items():
+        labels = f'{worker}callback="{name}",stage="{stage_name}"'
+        lines.append(f"netviz_callback_stage_seconds_total{{{labels}}} {elapsed}")
+    family(
+        "netviz_callback_items_total",
+        "counter",
+        "Rows, nodes and edges handled",
+    )
+    for (name, kind), n in totals["items"].items():
+        labels = f'{worker}callback="{name}",kind="{kind}"'
+        lines.append(f"netviz_callback_items_total{{{labels}}} {n}")
+    family("netviz_cache_requests_total", "counter", "Cache lookups by result")
+    for (name, result), n in totals["caches"].items():
+        labels = f'{worker}cache="{name}",result="{result}"'
+        lines.append(f"netviz_cache_requests_total{{{labels}}} {n}")
+    return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def log_slow(record: Record, seconds: float, size: int | None):
+    stages = ", ".join(
+        f"{name} {1_000 * elapsed:.0f}ms"
+        for name, elapsed in sorted(record.stages.items(), key=lambda x: -x[1])
+    )
+    counts = ", ".join(f"{kind} {n:,}" for kind, n in record.counts.items())
+    message = f"slow {record.callback}: {1_000 * seconds:.0f}ms ({stages})"
+    if size is not None:
+        message += f", {size:,} bytes"
+    if counts:
+        message += f", {counts}"
+    if record.profile is not None:
+        out = io.StringIO()
+        pstats.Stats(record.profile, stream=out).sort_stats("cumulative").print_stats(
+            20
+        )
+        message += "\n" + out.getvalue()
+    logger.warning(message)
+
+
+def attach(job: Record):
+    """Counts what a background job measured as part of the current request
+
+    The request that collects a job's result is charged the job's stages
+    on top of its own. Outside a measured request the job is finished as a
+    request of its own.
+    """
+    # The job's clock readings mean nothing here
+    job.stage_start = time.perf_counter()
+    record = current.get()
+    if record is None:
+        metrics.finish(job)
+        return
+    record.callback = job.callback
+    record.failed |= job.failed
+    for stage_name, elapsed in job.stages.items():
+        record.stages[stage_name] = record.stages.get(stage_name, 0.0) + elapsed
+    for kind, n in job.counts.items():
+        record.counts[kind] = record.counts.get(kind, 0) + n
+
+
+def instrument(func: Callable) -> Callable:
+    """Measures a callback, or a route, as a request of its own
+
+    Inside a request the measurement is finished once the response is
+    serialized, see `serve_metrics`, and in a background job it is sent
+    back with the result, see `jobs.JobManager`. Called directly, e.g.
+    from benchmarks, it only covers the call itself.
+    """
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        record = current.get()
+        token = None
+        if record is None:
+            record = Record(time.perf_counter())
+            token = current.set(record)
+        record.callback = name
+        record.switch(OTHER_STAGE)
+        if PROFILE_SAMPLE and random.random() < PROFILE_SAMPLE:
+            record.profile = cProfile.Profile()
+        try:
+            if record.profile is not None:
+                record.profile.enable()
+            return func(*args, **kwargs)
+        except Exception:
+            record.failed = True
+            raise
+        finally:
+            if record.profile is not None:
+                record.profile.disable()
+            record.switch(FRAMEWORK_STAGE)
+            if token is not None:
+                current.reset(token)
+                metrics.finish(record)
+
+    return wrapper
+
+
+def serve_metrics(server: Flask, path: str = "/metrics"):
+    """Measures the server's instrumented requests and serves the totals
+
+    Totals are added up across the processes sharing `METRICS_DIR`, which
+    whoever starts the server clears once, see `Metrics.clear`.
+    """
+    metrics.share_in()
+
+    @server.before_request
+    def start_record():
+        current.set(Record(time.perf_counter()))
+
+    @server.after_request
+    def finish_record(response: Response) -> Response:
+        record = current.get()
+        if record is not None and record.callback is not None:
+            metrics.finish(record, response.calculate_content_length())
+        current.set(None)
+        return response
+
+    @server.teardown_request
+    def drop_record(_):
+        current.set(None)
+
+    def scrape():
+        return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+    server.add_url_rule(path, "metrics", scrape)
@@ -0,0 +1,225 @@
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.core.frame import DataFrame
+
+from layouts import grid_index
+from metrics import timed
+from viz import (
+    color_codes,
+    edge_lines,
+    graph_edges,
+    graph_nodes,
+    network_figure,
+    scene_axes,
+    subgraph_figure,
+)
+
+# Most markers plus line segments the whole-network view draws before it
+# starts summarizing the network
+OVERVIEW_PRIMITIVES = int(os.environ.get("OVERVIEW_PRIMITIVES", 50_000))
+# Zooming the camera in past this fraction of its overview distance shows
+# everyone in view in full detail
+DETAIL_ZOOM = 0.5
+AXES = ("x", "y", "z")
+
+
+def sample_edges(
+    edge_index: np.ndarray, n_nodes: int, limit: int, seed: int = 0
+) -> np.ndarray:
+    """Picks up to `limit` edges, favoring those between well connected people
+
+    Edges are weighted by the degree of both ends and sampled without
+    replacement. The seed is fixed so redraws show the same edges.
+    """
+    if len(edge_index) <= limit:
+        return edge_index
+    if limit <= 0:
+        return edge_index[:0]
+    degree = np.bincount(edge_index.ravel(), minlength=n_nodes)
+    weight = np.log1p(degree[edge_index]).sum(axis=1)
+    # Keeping the largest u ** (1 / weight) is a weighted sample
+    keys = np.log(np.random.default_rng(seed).random(len(edge_index))) / weight
+    keep = np.argpartition(-keys, limit - 1)[:limit]
+    return edge_index[np.sort(keep)]
+
+
+def bounds(positions: np.ndarray) -> np.ndarray:
+    """The (dim, 2) low and high corner of the layout, ignoring missing nodes"""
+    return np.column_stack([np.nanmin(positions, axis=0), np.nanmax(positions, axis=0)])
+
+
+def cluster_nodes(positions: np.ndarray, limit: int) -> np.ndarray:
+    """Labels each node with one of at most `limit` clusters
+
+    Clusters are the occupied cells of a grid over the layout, so a
+    cluster holds people drawn close together whatever their precinct.
+    The grid gets coarser until the clusters fit, and a single cell is as
+    coarse as it gets.
+    """
+    n, dim = positions.shape
+    low, high = bounds(positions).T
+    span = max((high - low).max(), np.finfo(float).eps)
+
+    side = max(int(limit ** (1 / dim)), 1)
+    while True:
+        scaled = np.nan_to_num((positions - low) / span * side)
+        cells = np.clip(scaled.astype(np.int64), 0, side - 1)
+        _, clusters = np.unique(grid_index(cells, side), return_inverse=True)
+        if clusters.max(initial=-1) < limit or side == 1:
+            return clusters
+        side = min(int(side * 0.8), side - 1)
+
+
+def cluster_edges(
+    edge_index: np.ndarray, clusters: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Merges edges between the same two clusters, counting how many merged"""
+    pairs = np.sort(clusters[edge_index], axis=1)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    if not len(pairs):
+        return pairs, np.empty(0, dtype=np.int64)
+    return np.unique(pairs, axis=0, return_counts=True)
+
+
+def summarize_clusters(
+    nodes: DataFrame, positions: np.ndarray, clusters: np.ndarray, group_by: str
+) -> DataFrame:
+    """One row per cluster with its centroid, size, group and usual support"""
+    n_clusters = clusters.max(initial=-1) + 1
+    summary = pd.DataFrame(positions).groupby(clusters).mean()
+    summary["count"] = np.bincount(clusters, minlength=n_clusters)
+    for column in (group_by, "support"):
+        # Most common value per cluster, counted by category code
+        values = nodes[column].astype("category")
+        n_categories = len(values.cat.categories) + 1
+        codes = values.cat.codes.to_numpy(np.int64) % n_categories
+        tally = np.bincount(
+            clusters * n_categories + codes, minlength=n_clusters * n_categories
+        )
+        common = tally.reshape(n_clusters, n_categories).argmax(axis=1)
+        labels = np.append(values.cat.categories.astype(object), None)
+        summary[column] = labels[common]
+    return summary
+
+
+@timed
+def overview_figure(
+    nodes: DataFrame,
+    positions: np.ndarray,
+    edge_index: np.ndarray,
+    limit: int = OVERVIEW_PRIMITIVES,
+    group_by: str = "precinct",
+) -> Dict:
+    """The whole network, summarized to at most about `limit` primitives
+
+    Only people the layout places are drawn or counted, since everyone
+    else has no contacts to show. Networks that fit are drawn in full.
+    Past that, edges are sampled down to the budget left after the
+    nodes, and if the nodes alone take more than half of it they are
+    merged into clusters of nearby people, drawn with their size, most
+    common `group_by` and support, and connected by their busiest links.
+    """
+    ranges = bounds(positions)
+    placed = np.flatnonzero(~np.isnan(positions).any(axis=1))
+    if len(placed) + len(edge_index) <= limit:
+        return subgraph_figure(nodes, positions, placed, edge_index, ranges=ranges)
+    if len(placed) <= limit // 2:
+        edge_rows = sample_edges(edge_index, len(nodes), limit - len(placed))
+        return subgraph_figure(nodes, positions, placed, edge_rows, ranges=ranges)
+
+    placed_nodes = nodes.iloc[placed]
+    placed_clusters = cluster_nodes(positions[placed], limit // 2)
+    summary = summarize_clusters(
+        placed_nodes, positions[placed], placed_clusters, group_by
+    )
+    # Edges should only join placed people, any others are left out
+    clusters = np.full(len(nodes), -1, dtype=np.int64)
+    clusters[placed] = placed_clusters
+    edge_index = edge_index[(clusters[edge_index] >= 0).all(axis=1)]
+    pairs, counts = cluster_edges(edge_index, clusters)
+    busiest = np.sort(np.argsort(-counts, kind="stable")[: limit - len(summary)])
+
+    centroids = summary[list(range(positions.shape[1]))].to_numpy()
+    lines = scene_axes(edge_lines(centroids, pairs[busiest]))
+    edge_trace = graph_edges(*lines, ids=None)
+    text = [
+        f"{count:,} {'voter' if count == 1 else 'voters'}, "
+        f"mostly {group_by} {group} and {support}"
+        for count, group, support in summary[["count", group_by, "support"]].to_numpy()
+    ]
+    x, y, z = scene_axes(centroids.T)
+    node_trace = graph_nodes(
+        x=x,
+        y=y,
+        z=z,
+        node_colors=color_codes(summary["support"]),
+        node_text=text,
+        ids=None,
+        node_sizes=np.clip(np.sqrt(summary["count"].to_numpy()), 5, 30),
+    )
+    return network_figure(edge_trace, node_trace, ranges=ranges)
+
+
+def camera_vectors(camera: Dict) -> Tuple[np.ndarray, np.ndarray]:
+    """The center and eye of a plotly scene camera as arrays"""
+    center = camera.get("center") or {}
+    return (
+        np.array([center.get(axis, 0) for axis in AXES], dtype=float),
+        np.array([camera["eye"][axis] for axis in AXES], dtype=float),
+    )
+
+
+def camera_zoom(camera: Dict, eye: Dict) -> float:
+    """How far the camera sits from its center, relative to `eye`"""
+    center, camera_eye = camera_vectors(camera)
+    return float(
+        np.linalg.norm(camera_eye - center) / np.linalg.norm(list(eye.values()))
+    )
+
+
+def camera_sphere(ranges: np.ndarray, camera: Dict) -> Tuple[np.ndarray, float]:
+    """Where in the layout a camera looks, and how far around that it sees
+
+    Plotly scales each axis of the layout to one unit around the middle of
+    the scene, which maps the camera center and distance back onto the
+    layout spanning `ranges`.
+    """
+    low, high = ranges.T
+    center, eye = camera_vectors(camera)
+    target = (low + high) / 2 + (high - low) * center[: len(ranges)]
+    return target, float(np.linalg.norm(eye - center) * (high - low).max())
+
+
+def view_rows(
+    positions: np.ndarray, camera: Dict, limit: int = OVERVIEW_PRIMITIVES
+) -> np.ndarray:
+    """Rows of the people a zoomed in camera is looking at
+
+    The nearest `limit` people within the camera's view are returned.
+    """
+    target, radius = camera_sphere(bounds(positions), camera)
+    distance = np.linalg.norm(positions - target, axis=1)
+    rows = np.flatnonzero(distance <= radius)
+    if len(rows) > limit:
+        rows = rows[np.argpartition(distance[rows], limit - 1)[:limit]]
+    return np.sort(rows)
+
+
+@timed
+def detail_figure(
+    nodes: DataFrame,
+    positions: np.ndarray,
+    edge_index: np.ndarray,
+    camera: Dict,
+    limit: int = OVERVIEW_PRIMITIVES,
+) -> Dict:
+    """Everyone a zoomed in camera is looking at, in full detail"""
+    rows = view_rows(positions, camera, limit // 2)
+    inside = np.zeros(len(nodes), dtype=bool)
+    inside[rows] = True
+    edge_rows = edge_index[inside[edge_index].all(axis=1)]
+    edge_rows = sample_edges(edge_rows, len(nodes), limit - len(rows))
+    return subgraph_figure(nodes, positions, rows, edge_rows, ranges=bounds(positions))
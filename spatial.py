@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import numpy as np
+
+from graph import compress, gather
+from layouts import cell_of, grid_index
+from overview import AXES, camera_sphere
+
+# About this many people share a cell of the grid
+CELL_SIZE = 32
+
+Box = Tuple[np.ndarray, np.ndarray]
+
+
+@dataclass(frozen=True)
+class PointGrid:
+    """Positions bucketed into a uniform grid, to find those inside a box
+
+    Only the cells a box overlaps are read, so a query costs about the
+    number of people near the box rather than everyone in the layout.
+    """
+
+    positions: np.ndarray
+    low: np.ndarray
+    span: float
+    side: int
+    offsets: np.ndarray
+    rows: np.ndarray
+
+    def box(self, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        """Sorted rows of the positions inside a box, edges included
+
+        Bounds may be infinite, to leave an axis unbounded.
+        """
+        low = np.asarray(low, dtype=float)
+        high = np.asarray(high, dtype=float)
+        if (low > high).any():
+            return np.empty(0, dtype=np.int64)
+        # Clamp to the grid first, since infinite bounds have no cell
+        corners = np.clip([low, high], self.low, self.low + self.span)
+        first, last = cell_of(corners, self.low, self.span, self.side)
+        if np.prod(last - first + 1) * 2 > self.side ** len(first):
+            # Most of the grid is in the box, so test everyone at once
+            with np.errstate(invalid="ignore"):
+                inside = (self.positions >= low) & (self.positions <= high)
+            return np.flatnonzero(inside.all(axis=1))
+        axes = np.meshgrid(
+            *(np.arange(a, b + 1) for a, b in zip(first, last)), indexing="ij"
+        )
+        cells = np.column_stack([axis.ravel() for axis in axes])
+        _, rows = gather(self.offsets, self.rows, grid_index(cells, self.side))
+        # Cells on the edge of the box hold people just outside it too
+        found = self.positions[rows]
+        inside = ((found >= low) & (found <= high)).all(axis=1)
+        return np.sort(rows[inside])
+
+
+def point_grid(positions: np.ndarray, cell_size: int = CELL_SIZE) -> PointGrid:
+    """Buckets 2D or 3D positions by grid cell, skipping missing ones"""
+    n, dim = positions.shape
+    found = np.flatnonzero(~np.isnan(positions).any(axis=1))
+    coords = positions[found]
+    if len(coords):
+        low, high = coords.min(axis=0), coords.max(axis=0)
+    else:
+        low = high = np.zeros(dim)
+    span = max((high - low).max(), np.finfo(float).eps)
+    side = max(int((len(coords) / cell_size) ** (1 / dim)), 1)
+    flat = grid_index(cell_of(coords, low, span, side), side)
+    offsets, rows = compress(flat, found, side**dim)
+    return PointGrid(positions, low, span, side, offsets, rows)
+
+
+def relayout_box(relayout: Dict, dim: int) -> Box | None:
+    """The axis ranges a zoom or pan set, unbounded along axes it left alone
+
+    Reads both plotly's `xaxis.range[0]` and `xaxis.range` forms, for 2D
+    axes and 3D scene axes. Returns None if no range was set, e.g. when
+    the axes were autoscaled.
+    """
+    low = np.full(dim, -np.inf)
+    high = np.full(dim, np.inf)
+    found = False
+    for i, axis in enumerate(AXES[:dim]):
+        for key in (f"{axis}axis.range", f"scene.{axis}axis.range"):
+            if f"{key}[0]" in relayout and f"{key}[1]" in relayout:
+                ends = relayout[f"{key}[0]"], relayout[f"{key}[1]"]
+            elif isinstance(relayout.get(key), list):
+                ends = relayout[key]
+            else:
+                continue
+            # Reversed axes list their range high to low
+            low[i], high[i] = sorted(float(end) for end in ends)
+            found = True
+    return (low, high) if found else None
+
+
+def viewport_box(relayout: Dict, ranges: np.ndarray) -> Box | None:
+    """The box of the layout in view after a relayout event
+
+    Axis ranges are used as they are. A 3D camera is turned into the cube
+    around what it looks at, for a layout spanning `ranges`. Returns None
+    if the event doesn't change what is in view.
+    """
+    box = relayout_box(relayout, len(ranges))
+    if box is None and "scene.camera" in relayout:
+        target, radius = camera_sphere(ranges, relayout["scene.camera"])
+        box = target - radius, target + radius
+    return box
@@ -0,0 +1,361 @@
+"""Generates a voter file and contact list of any size, for load testing
+
+Every voter gets a unique id. Contacts form a heavy-tailed graph: a few
+people make and receive most of them, and most stay inside a precinct.
+Both are written chunk by chunk to Arrow files, which the app reads
+through `NODES_CSV` and `EDGES_CSV` without parsing. The same seed,
+sizes and `--chunk-rows` give the same files; random draws are made a
+chunk at a time, so another chunk size gives a different dataset.
+
+Run from the repository root:
+
+    python -m synthetic --out data
+    python -m synthetic --out data --nodes 2000000 --edges 10000000 --seed 7
+"""
+
+import argparse
+from pathlib import Path
+from typing import Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pandas.core.frame import DataFrame
+
+# Popular names for American babies born in 2000, whatever their gender,
+# see https://www.ssa.gov/cgi-bin/popularnames.cgi
+FIRST_NAMES = [
+    "Jacob",
+    "Michael",
+    "Matthew",
+    "Joshua",
+    "Christopher",
+    "Nicholas",
+    "Andrew",
+    "Joseph",
+    "Daniel",
+    "Tyler",
+    "Emily",
+    "Hannah",
+    "Madison",
+    "Ashley",
+    "Sarah",
+    "Alexis",
+    "Samantha",
+    "Jessica",
+    "Elizabeth",
+    "Taylor",
+]
+
+# Common surnames in the 2010 census, see
+# https://www.census.gov/topics/population/genealogy/data/2010_surnames.html
+LAST_NAMES = [
+    "Smith",
+    "Johnson",
+    "Williams",
+    "Brown",
+    "Jones",
+    "Garcia",
+    "Miller",
+    "Davis",
+    "Rodriguez",
+    "Martinez",
+    "Hernandez",
+    "Lopez",
+    "Gonzalez",
+    "Wilson",
+    "Anderson",
+    "Thomas",
+    "Taylor",
+    "Moore",
+    "Jackson",
+    "Martin",
+    "Lee",
+    "Perez",
+]
+
+SUPPORT_LEVELS = [
+    "1 - Support",
+    "2 - Lean Support",
+    "3 - Undecided",
+    "4 - Lean Oppose",
+    "5 - Oppose",
+]
+
+GENDERS = ["M", "F", "O"]
+
+# Rows generated, and held in memory, at a time
+CHUNK_ROWS = 1_000_000
+# Average number of voters in a precinct
+PRECINCT_SIZE = 1_000
+# Share of contacts made inside the canvasser's own precinct
+IN_PRECINCT = 0.8
+# Pareto shape of how active people are, lower gives heavier tails
+ACTIVITY_SHAPE = 1.5
+# The most active people are this many times as active as the least, so
+# nobody in a large file reaches a real share of everyone
+MAX_ACTIVITY = 1_000
+# Rounds of redrawing contacts that repeat or reach the canvasser
+REDRAWS = 10
+
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+NODE_SCHEMA = pa.schema(
+    [
+        ("voter_id", pa.string()),
+        ("first_name", CATEGORY),
+        ("last_name", CATEGORY),
+        ("phone", pa.string()),
+        ("precinct", pa.dictionary(pa.int32(), pa.int64())),
+        ("support", CATEGORY),
+        ("gender", CATEGORY),
+    ]
+)
+EDGE_SCHEMA = pa.schema([("source", pa.string()), ("target", pa.string())])
+
+
+def padded(codes: np.ndarray, prefix: str, width: int) -> pa.Array:
+    """Text like `prefix` + 000042 for integer codes, built in Arrow"""
+    digits = pc.utf8_lpad(pa.array(codes).cast(pa.string()), width, "0")
+    return pc.binary_join_element_wise(prefix, digits, "")
+
+
+def dictionary(codes: np.ndarray, values) -> pa.DictionaryArray:
+    """Values by code, stored once like the loaders' category columns"""
+    return pa.DictionaryArray.from_arrays(pa.array(codes, pa.int32()), values)
+
+
+def precinct_starts(n_nodes: int, n_precincts: int, rng) -> np.ndarray:
+    """The first code of each precinct followed by `n_nodes`
+
+    Precincts hold consecutive codes and vary in size.
+    """
+    shares = rng.dirichlet(np.full(n_precincts, 5.0))
+    sizes = rng.multinomial(n_nodes, shares)
+    return np.concatenate([[0], np.cumsum(sizes)])
+
+
+def node_batches(
+    n_nodes: int, starts: np.ndarray, rng, chunk_rows: int = CHUNK_ROWS
+) -> Iterator[pa.RecordBatch]:
+    """Voter file rows, one record batch per chunk"""
+    width = len(str(max(n_nodes - 1, 0)))
+    first_names = pa.array(FIRST_NAMES)
+    last_names = pa.array(LAST_NAMES)
+    precincts = pa.array(np.arange(len(starts) - 1))
+    supports = pa.array(SUPPORT_LEVELS)
+    genders = pa.array(GENDERS)
+    for first in range(0, n_nodes, chunk_rows):
+        codes = np.arange(first, min(first + chunk_rows, n_nodes))
+        n = len(codes)
+        yield pa.RecordBatch.from_arrays(
+            [
+                padded(codes, "IA-", width),
+                dictionary(rng.integers(0, len(first_names), n), first_names),
+                dictionary(rng.integers(0, len(last_names), n), last_names),
+                padded(codes % 10_000, "(515)-555-", 4),
+                dictionary(np.searchsorted(starts, codes, side="right") - 1, precincts),
+                dictionary(rng.integers(0, len(supports), n), supports),
+                dictionary(rng.integers(0, len(genders), n), genders),
+            ],
+            schema=NODE_SCHEMA,
+        )
+
+
+def draw_targets(
+    sources: np.ndarray,
+    cumulative: np.ndarray,
+    starts: np.ndarray,
+    in_precinct: float,
+    rng,
+) -> np.ndarray:
+    """Whom each contact reaches, more often the more active they are
+
+    Most contacts stay inside the canvasser's precinct and the rest can
+    reach anyone. Draws invert the cumulative activity over the codes
+    they may land on.
+    """
+    precinct = np.searchsorted(starts, sources, side="right") - 1
+    local = rng.random(len(sources)) < in_precinct
+    low = np.where(local, starts[precinct], 0)
+    high = np.where(local, starts[precinct + 1], len(cumulative))
+    below = np.where(low > 0, cumulative[low - 1], 0.0)
+    draws = below + rng.random(len(sources)) * (cumulative[high - 1] - below)
+    return np.clip(np.searchsorted(cumulative, draws, side="right"), low, high - 1)
+
+
+def contact_batches(
+    n_nodes: int,
+    n_edges: int,
+    starts: np.ndarray,
+    rng,
+    chunk_rows: int = CHUNK_ROWS,
+    in_precinct: float = IN_PRECINCT,
+) -> Iterator[pa.RecordBatch]:
+    """Contact rows, one record batch per chunk of canvassers
+
+    Each person's number of contacts is fixed up front, so a chunk holds
+    every contact its canvassers make and repeats can be removed within
+    it. Contacts that still repeat or loop after `REDRAWS` are dropped,
+    which only happens for people with about as many contacts as their
+    precinct has voters. Memory grows with the number of voters and the
+    chunk size, not the number of contacts.
+    """
+    width = len(str(max(n_nodes - 1, 0)))
+    activity = np.minimum(rng.pareto(ACTIVITY_SHAPE, n_nodes) + 1, MAX_ACTIVITY)
+    out_degree = rng.multinomial(n_edges, activity / activity.sum())
+    cumulative = np.cumsum(activity)
+    ends = np.cumsum(out_degree)
+
+    first = 0
+    while first < n_nodes:
+        done = ends[first - 1] if first else 0
+        # At least one canvasser per chunk, however many contacts they made
+        last = max(
+            int(np.searchsorted(ends, done + chunk_rows, side="right")), first + 1
+        )
+        sources = np.repeat(np.arange(first, last), out_degree[first:last])
+        targets = draw_targets(sources, cumulative, starts, in_precinct, rng)
+        for _ in range(REDRAWS):
+            _, distinct = np.unique(sources * n_nodes + targets, return_index=True)
+            bad = np.ones(len(sources), dtype=bool)
+            bad[distinct] = False
+            bad |= sources == targets
+            if not bad.any():
+                break
+            targets[bad] = draw_targets(
+                sources[bad], cumulative, starts, in_precinct, rng
+            )
+        else:
+            sources, targets = sources[~bad], targets[~bad]
+        first = last
+        if len(sources):
+            yield pa.RecordBatch.from_arrays(
+                [padded(sources, "IA-", width), padded(targets, "IA-", width)],
+                schema=EDGE_SCHEMA,
+            )
+
+
+def write_arrow(
+    path: Path, schema: pa.Schema, batches: Iterator[pa.RecordBatch]
+) -> int:
+    """Streams record batches into an Arrow IPC file, returning the rows
+
+    The file appears under its name only once it is complete.
+    """
+    rows = 0
+    partial = path.with_suffix(".partial")
+    with pa.OSFile(str(partial), "wb") as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+                rows += batch.num_rows
+    partial.replace(path)
+    return rows
+
+
+def batches(
+    n_nodes: int,
+    n_edges: int,
+    seed: int = 538,
+    chunk_rows: int = CHUNK_ROWS,
+    in_precinct: float = IN_PRECINCT,
+    precinct_size: int = PRECINCT_SIZE,
+):
+    """Record batches of voters and of contacts, drawn from `seed`
+
+    Precincts hold `precinct_size` voters on average.
+    """
+    node_rng, edge_rng, precinct_rng = (
+        np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(3)
+    )
+    n_precincts = max(n_nodes // precinct_size, 1)
+    starts = precinct_starts(n_nodes, n_precincts, precinct_rng)
+    return (
+        node_batches(n_nodes, starts, node_rng, chunk_rows),
+        contact_batches(n_nodes, n_edges, starts, edge_rng, chunk_rows, in_precinct),
+    )
+
+
+def generate(
+    out_dir: Path | str,
+    n_nodes: int,
+    n_edges: int,
+    seed: int = 538,
+    chunk_rows: int = CHUNK_ROWS,
+    in_precinct: float = IN_PRECINCT,
+    precinct_size: int = PRECINCT_SIZE,
+):
+    """Writes `nodes.arrow` and `edges.arrow` into `out_dir`
+
+    Returns both paths and the number of contacts written, which can fall
+    a little short of `n_edges`, see `contact_batches`.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    node_rows, contact_rows = batches(
+        n_nodes, n_edges, seed, chunk_rows, in_precinct, precinct_size
+    )
+
+    nodes_path = out_dir / "nodes.arrow"
+    edges_path = out_dir / "edges.arrow"
+    write_arrow(nodes_path, NODE_SCHEMA, node_rows)
+    written = write_arrow(edges_path, EDGE_SCHEMA, contact_rows)
+    return nodes_path, edges_path, written
+
+
+def tables(
+    n_nodes: int,
+    n_edges: int,
+    seed: int = 538,
+    in_precinct: float = IN_PRECINCT,
+    precinct_size: int = PRECINCT_SIZE,
+) -> Tuple[DataFrame, DataFrame]:
+    """The voters and contacts `generate` writes, as DataFrames in memory
+
+    Columns have the dtypes `loaders.read_arrow` gives the written files.
+    """
+    node_rows, contact_rows = batches(
+        n_nodes, n_edges, seed, in_precinct=in_precinct, precinct_size=precinct_size
+    )
+    strings = {pa.string(): pd.StringDtype("pyarrow")}.get
+    nodes = pa.Table.from_batches(node_rows, NODE_SCHEMA)
+    edges = pa.Table.from_batches(contact_rows, EDGE_SCHEMA)
+    return (
+        nodes.to_pandas(types_mapper=strings),
+        edges.to_pandas(types_mapper=strings),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--nodes", type=int, default=100_000)
+    parser.add_argument("--edges", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=538)
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=CHUNK_ROWS,
+        help="rows drawn at a time; part of what the seed reproduces",
+    )
+    parser.add_argument("--in-precinct", type=float, default=IN_PRECINCT)
+    parser.add_argument("--precinct-size", type=int, default=PRECINCT_SIZE)
+    args = parser.parse_args()
+
+    nodes_path, edges_path, written = generate(
+        args.out,
+        args.nodes,
+        args.edges,
+        args.seed,
+        args.chunk_rows,
+        args.in_precinct,
+        args.precinct_size,
+    )
+    print(f"{args.nodes:,} voters in {nodes_path}")
+    print(f"{written:,} contacts in {edges_path}")
+    print(f"NODES_CSV={nodes_path} EDGES_CSV={edges_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from datasets import add_contacts, append_nodes, layout_network, mock_data
+from graph import build_adjacency, contact_codes, undirected_edges
+
+NEW_VOTER = {
+    "first_name": "Emily",
+    "last_name": "Lee",
+    "phone": "(515)-555-0000",
+    "precinct": 0,
+    "support": "1 - Support",
+    "gender": "F",
+}
+
+
+@pytest.fixture
+def network():
+    nodes, edges, _ = mock_data(300, 600)
+    ids = nodes["voter_id"].astype(object).to_numpy()
+    # A logged contact with someone who isn't in the voter file yet
+    ghost = pd.DataFrame({"source": [ids[0]], "target": ["IA-ghost"]})
+    edges = pd.concat([edges, ghost], ignore_index=True)
+    return nodes, edges, layout_network(nodes, edges)
+
+
+def batches(nodes, edges, rng):
+    ids = nodes["voter_id"].astype(object).to_numpy()
+    for step in range(3):
+        new_ids = [f"N{step}-{i}" for i in range(5)]
+        # The ghost joins, and someone already there is sent again
+        known = (["IA-ghost"] if step == 0 else []) + [ids[1]]
+        new_nodes = pd.DataFrame(
+            [{"voter_id": i, **NEW_VOTER} for i in new_ids + known]
+        )
+        sources = new_ids + list(rng.choice(ids, 8)) + [ids[2], "nobody"]
+        targets = list(rng.choice(ids, 5)) + list(rng.choice(ids, 8)) + [ids[2], ids[3]]
+        # A contact already logged, and one back the other way
+        sources += [edges["source"].iloc[0], edges["target"].iloc[1]]
+        targets += [edges["target"].iloc[0], edges["source"].iloc[1]]
+        yield new_nodes, pd.DataFrame({"source": sources, "target": targets})
+
+
+def test_add_contacts_matches_full_rebuild(network):
+    nodes, edges, core = network
+    for new_nodes, new_edges in batches(nodes, edges, np.random.default_rng(0)):
+        nodes, edges, core = add_contacts(
+            nodes, edges, core, new_nodes, new_edges, seed=1
+        )
+        assert nodes["voter_id"].is_unique
+        assert list(core.ids) == nodes["voter_id"].tolist()
+        assert not edges.duplicated().any()
+
+        full = build_adjacency(nodes, edges)
+        for field in ("rows", "out_offsets", "out_indices", "in_offsets", "in_indices"):
+            np.testing.assert_array_equal(
+                getattr(core.adjacency, field), getattr(full, field)
+            )
+        assert core.adjacency.ids.tolist() == full.ids.tolist()
+
+        _, contacts = contact_codes(nodes, edges)
+        expected = undirected_edges(contacts, len(nodes))
+        assert len(core.edge_index) == len(expected)
+        assert set(map(tuple, np.sort(core.edge_index, axis=1).tolist())) == set(
+            map(tuple, np.sort(expected, axis=1).tolist())
+        )
+        # Everyone with a contact is placed
+        placed = ~np.isnan(core.positions).any(axis=1)
+        assert placed[np.unique(core.edge_index)].all()
+
+
+def test_add_contacts_is_seeded(network):
+    nodes, edges, core = network
+    new_nodes, new_edges = next(batches(nodes, edges, np.random.default_rng(1)))
+    first = add_contacts(nodes, edges, core, new_nodes, new_edges, seed=4)[2]
+    second = add_contacts(nodes, edges, core, new_nodes, new_edges, seed=4)[2]
+    np.testing.assert_array_equal(first.positions, second.positions)
+
+
+def test_append_nodes_keeps_dtypes(network):
+    nodes, _, _ = network
+    new_nodes = pd.DataFrame([{**NEW_VOTER, "voter_id": "IA-new", "gender": "X"}])
+
+    appended = append_nodes(nodes, new_nodes)
+
+    assert list(appended.columns) == list(nodes.columns)
+    unchanged = nodes.columns.drop("gender")
+    assert appended[unchanged].dtypes.equals(nodes[unchanged].dtypes)
+    assert list(appended["gender"].cat.categories) == [
+        *nodes["gender"].cat.categories,
+        "X",
+    ]
+    # Existing rows keep their category codes
+    np.testing.assert_array_equal(
+        appended["gender"].cat.codes[: len(nodes)], nodes["gender"].cat.codes
+    )
+    assert appended.iloc[-1]["voter_id"] == "IA-new"
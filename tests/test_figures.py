@@ -0,0 +1,65 @@
+import numpy as np
+
+from figures import FigureCache, figure_nbytes
+
+
+def figure(n_points: int) -> dict:
+    return {"data": [{"x": np.zeros(n_points), "text": np.array(["ab"] * 2, object)}]}
+
+
+def test_figure_nbytes_counts_arrays():
+    assert figure_nbytes(np.zeros(100)) == 800
+    assert figure_nbytes({"a": [np.zeros(10, np.int32), "abc"]}) == 43
+    assert figure_nbytes(np.array(["ab", "c"], dtype=object)) == 3 + 16
+
+
+def test_evicts_least_recently_used():
+    size = figure_nbytes(figure(100))
+    cache = FigureCache(max_bytes=3 * size)
+    for key in "abc":
+        cache.put(key, figure(100))
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("a") is not None
+
+    cache.put("d", figure(100))
+
+    assert list(cache.entries) == ["c", "a", "d"]
+    assert cache.get("b") is None
+    assert cache.nbytes == 3 * size
+
+
+def test_replacing_a_key_keeps_the_total():
+    cache = FigureCache(max_bytes=10_000)
+    cache.put("a", figure(100))
+    cache.put("a", figure(200))
+
+    assert len(cache.entries) == 1
+    assert cache.nbytes == figure_nbytes(figure(200))
+
+
+def test_skips_figures_over_budget():
+    cache = FigureCache(max_bytes=figure_nbytes(figure(100)))
+    cache.put("a", figure(100))
+
+    built = cache.put("b", figure(1_000))
+
+    assert "x" in built["data"][0]
+    assert list(cache.entries) == ["a"]
+
+
+def test_get_or_build_counts_hits():
+    cache = FigureCache()
+    calls = []
+
+    def build():
+        calls.append(1)
+        return figure(10)
+
+    first = cache.get_or_build("a", build)
+    assert cache.get_or_build("a", build) is first
+    cache.clear()
+    cache.get_or_build("a", build)
+
+    assert len(calls) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.nbytes == figure_nbytes(figure(10))
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from datasets import compact_nodes
+from filters import clause_mask, compile_query, edge_view
+
+
+@pytest.fixture
+def tables():
+    rng = np.random.default_rng(11)
+    nodes = compact_nodes(
+        pd.DataFrame(
+            {
+                "voter_id": [f"IA-{i}" for i in range(40)],
+                "first_name": rng.choice(["Emily", "Jacob", "Hannah"], 40),
+                "last_name": rng.choice(["Smith", "Lee", "Garcia"], 40),
+                "precinct": rng.integers(0, 5, 40),
+                "phone": "(123)-555-0123",
+            }
+        )
+    )
+    ids = [f"IA-{i}" for i in range(45)]
+    edges = pd.DataFrame(
+        {
+            "source": rng.choice(ids, 120),
+            "target": rng.choice(ids, 120),
+            "weight": rng.integers(1, 4, 120),
+        }
+    )
+    return nodes, edges
+
+
+def tall(nodes, edges):
+    """The edge table merged with the nodes at both ends, as it used to be"""
+    merged = edges.merge(nodes, left_on="source", right_on="voter_id", how="left")
+    return merged.merge(
+        nodes,
+        left_on="target",
+        right_on="voter_id",
+        suffixes=("_source", "_target"),
+        how="left",
+    )
+
+
+def scan(df, filter_query):
+    mask = np.ones(len(df), dtype=bool)
+    for clause in compile_query(filter_query):
+        mask &= clause_mask(df[clause.column], clause)
+    return df[mask].reset_index(drop=True)
+
+
+@pytest.mark.parametrize(
+    "filter_query",
+    [
+        "",
+        "{voter_id_source} eq IA-3",
+        "{voter_id_target} contains IA-1",
+        "{last_name_source} eq Smith && {first_name_target} eq Hannah",
+        "{precinct_target} ge 2 && {weight} lt 3",
+        "{voter_id_target} eq IA-42",
+        "{phone_source} datestartswith (123)",
+    ],
+)
+def test_select_matches_merge(tables, filter_query):
+    nodes, edges = tables
+    expected = scan(tall(nodes, edges), filter_query)
+    selected = edge_view(nodes, edges).select(filter_query)
+    pd.testing.assert_frame_equal(
+        selected, expected[selected.columns], check_dtype=False
+    )
+
+
+def test_select_columns(tables):
+    nodes, edges = tables
+    filter_query = "{last_name_source} eq Lee"
+    selected = edge_view(nodes, edges).select(filter_query, columns=["voter_id_target"])
+    expected = scan(tall(nodes, edges), filter_query)
+    assert list(selected.columns) == ["voter_id_target"]
+    assert selected["voter_id_target"].tolist() == (
+        expected["voter_id_target"].tolist()
+    )
@@ -0,0 +1,104 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+from graph import (
+    build_adjacency,
+    compress,
+    contact_codes,
+    ego_network,
+    extend_adjacency,
+    index_contacts,
+    insert_pairs,
+)
+
+
+@pytest.fixture
+def tables():
+    rng = np.random.default_rng(3)
+    nodes = pd.DataFrame({"voter_id": [f"IA-{i}" for i in range(60)]})
+    pairs = rng.integers(0, 64, (150, 2))
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    edges = pd.DataFrame(
+        {
+            "source": [f"IA-{i}" for i in pairs[:, 0]],
+            "target": [f"IA-{i}" for i in pairs[:, 1]],
+        }
+    )
+    return nodes, edges.drop_duplicates(ignore_index=True)
+
+
+def contact_graph(nodes, edges) -> nx.DiGraph:
+    graph = nx.DiGraph()
+    graph.add_nodes_from(nodes["voter_id"])
+    known = edges["source"].isin(nodes["voter_id"]) & edges["target"].isin(
+        nodes["voter_id"]
+    )
+    graph.add_edges_from(edges[known].itertuples(index=False))
+    return graph
+
+
+@pytest.mark.parametrize("radius", [1, 2, 3])
+@pytest.mark.parametrize("voter_id", ["IA-0", "IA-7", "IA-33", "IA-59"])
+def test_ego_network_matches_networkx(tables, voter_id, radius):
+    nodes, edges = tables
+    graph = contact_graph(nodes, edges)
+    distance = nx.single_source_shortest_path_length(
+        graph.to_undirected(as_view=True), voter_id, cutoff=radius
+    )
+    ids = nodes["voter_id"].to_numpy()
+
+    rows, edge_rows = ego_network(build_adjacency(nodes, edges), voter_id, radius)
+
+    assert sorted(ids[rows]) == sorted(distance)
+    assert list(rows) == sorted(rows)
+    # Every edge with an end short of the radius was followed, once
+    followed = [tuple(pair) for pair in ids[edge_rows]]
+    expected = {
+        frozenset(edge)
+        for edge in graph.edges
+        if edge[0] in distance
+        and edge[1] in distance
+        and min(distance[edge[0]], distance[edge[1]]) < radius
+    }
+    assert len(followed) == len(expected)
+    assert {frozenset(edge) for edge in followed} == expected
+    assert all(graph.has_edge(*edge) for edge in followed)
+
+
+def test_ego_network_unknown_voter(tables):
+    nodes, edges = tables
+    rows, edge_rows = ego_network(build_adjacency(nodes, edges), "IA-63")
+    assert len(rows) == 0 and edge_rows.shape == (0, 2)
+
+
+def test_insert_pairs_matches_compress():
+    rng = np.random.default_rng(5)
+    old = rng.integers(0, 30, (80, 2))
+    new = rng.integers(0, 40, (30, 2))
+    offsets, indices = compress(old[:, 0], old[:, 1], 30)
+    offsets, indices = insert_pairs(offsets, indices, new[:, 0], new[:, 1], 40)
+    both = np.unique(np.concatenate([old, new]), axis=0)
+    expected_offsets, expected_indices = compress(both[:, 0], both[:, 1], 40)
+    np.testing.assert_array_equal(offsets, expected_offsets)
+    np.testing.assert_array_equal(indices, expected_indices)
+
+
+def test_extend_adjacency_matches_full_rebuild(tables):
+    nodes, edges = tables
+    more_nodes = pd.DataFrame({"voter_id": ["IA-60", "IA-61", "IA-0", "IA-70"]})
+    more_edges = pd.DataFrame(
+        {"source": ["IA-61", "IA-3", "IA-5"], "target": ["IA-62", "IA-70", "IA-61"]}
+    )
+    lookup, contacts = contact_codes(
+        pd.concat([nodes, more_nodes], ignore_index=True),
+        pd.concat([edges, more_edges], ignore_index=True),
+    )
+    extended = extend_adjacency(
+        build_adjacency(nodes, edges), more_nodes["voter_id"], contacts
+    )
+    full = index_contacts(lookup, contacts, len(nodes) + len(more_nodes))
+    for field in ("rows", "out_offsets", "out_indices", "in_offsets", "in_indices"):
+        np.testing.assert_array_equal(getattr(extended, field), getattr(full, field))
+    assert extended.ids.tolist() == full.ids.tolist()
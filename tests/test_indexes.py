@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from filters import Clause, clause_mask
+from indexes import extend_index, text_index
+
+VALUES = [
+    "IA-1",
+    "IA-12",
+    "IA-120",
+    "IA-2",
+    "ia-3",
+    "Madison",
+    "Mad",
+    "Émile",
+    "",
+    None,
+    "Madison",
+    "Smith-Jones",
+    "Jones",
+    "Jonestown",
+]
+QUERIES = ["IA-1", "IA-12", "Mad", "adi", "Jones", "nes", "Émi", "", "zzz", "IA-"]
+OPERATORS = ["contains", "datestartswith", "lt", "le", "gt", "ge", "eq"]
+
+
+def scan(values: pd.Series, clause: Clause) -> np.ndarray:
+    return np.flatnonzero(clause_mask(values, clause))
+
+
+@pytest.fixture(params=["string[pyarrow]", "category", "object"])
+def values(request):
+    rng = np.random.default_rng(7)
+    return pd.Series(rng.choice(np.array(VALUES, dtype=object), 500)).astype(
+        request.param
+    )
+
+
+@pytest.mark.parametrize("operator", OPERATORS)
+@pytest.mark.parametrize("text", QUERIES)
+def test_search_matches_scan(values, operator, text):
+    clause = Clause("name", operator, text)
+    found = text_index(values).search(clause)
+    if found is None:
+        # Only substrings too short for n-grams are left to the scan
+        assert operator == "contains" and len(text) < 3
+        return
+    np.testing.assert_array_equal(found, scan(values, clause))
+
+
+def test_search_numeric_looking_value():
+    # The table parses `12` as a float, but the column holds text
+    values = pd.Series(["12", "120", "IA-12", None, "12"], dtype="string[pyarrow]")
+    for operator in ("contains", "eq", "lt", "ge"):
+        clause = Clause("name", operator, 12.0)
+        found = text_index(values).search(clause)
+        if found is not None:
+            np.testing.assert_array_equal(found, scan(values, clause))
+
+
+@pytest.mark.parametrize("operator", OPERATORS)
+@pytest.mark.parametrize("text", QUERIES)
+def test_appended_search_matches_scan(values, operator, text):
+    clause = Clause("name", operator, text)
+    index = extend_index(text_index(values.iloc[:480]), values)
+    found = index.search(clause)
+    if found is not None:
+        np.testing.assert_array_equal(found, scan(values, clause))
+
+
+def test_extend_index_without_new_rows(values):
+    index = text_index(values)
+    assert extend_index(index, values) is index
+    appended = extend_index(text_index(values.iloc[:495]), values)
+    assert appended.n_rows == len(values)
+    assert extend_index(appended, values) is appended
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from layouts import LAYOUTS, cached_layout
+
+
+def ring_with_chords(n_nodes: int) -> np.ndarray:
+    ring = np.column_stack([np.arange(n_nodes), (np.arange(n_nodes) + 1) % n_nodes])
+    chords = np.column_stack([np.arange(0, n_nodes, 5), np.arange(0, n_nodes, 5) // 2])
+    edges = np.concatenate([ring, chords])
+    return edges[edges[:, 0] != edges[:, 1]]
+
+
+@pytest.mark.parametrize("dim", [2, 3])
+@pytest.mark.parametrize("name", list(LAYOUTS))
+def test_layout_places_every_node(name, dim):
+    edge_index = ring_with_chords(300)
+
+    coords = LAYOUTS[name](300, edge_index, dim=dim, seed=538)
+
+    assert coords.shape == (300, dim)
+    assert np.isfinite(coords).all()
+    # Spread out rather than collapsed onto a point
+    assert (coords.std(axis=0) > 0.05).all()
+    assert np.abs(coords).max() <= 1 + 1e-9
+
+
+@pytest.mark.parametrize("name", list(LAYOUTS))
+def test_layout_is_seeded(name):
+    edge_index = ring_with_chords(200)
+
+    first = LAYOUTS[name](200, edge_index, dim=3, seed=7)
+    again = LAYOUTS[name](200, edge_index, dim=3, seed=7)
+    other = LAYOUTS[name](200, edge_index, dim=3, seed=8)
+
+    np.testing.assert_array_equal(first, again)
+    assert not np.allclose(first, other)
+
+
+@pytest.mark.parametrize("name", ["barnes_hut", "multilevel"])
+def test_layout_without_nodes(name):
+    assert LAYOUTS[name](0, np.empty((0, 2), dtype=int), dim=3).shape == (0, 3)
+
+
+def test_multilevel_keeps_neighbours_close():
+    edge_index = ring_with_chords(1_000)
+
+    coords = LAYOUTS["multilevel"](1_000, edge_index, dim=2, seed=538)
+
+    linked = np.linalg.norm(coords[edge_index[:, 0]] - coords[edge_index[:, 1]], axis=1)
+    pairs = np.random.default_rng(0).integers(0, 1_000, (5_000, 2))
+    random = np.linalg.norm(coords[pairs[:, 0]] - coords[pairs[:, 1]], axis=1)
+    assert np.median(linked) < np.median(random) / 3
+
+
+class CountingLayout:
+    __module__ = "tests"
+    __name__ = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, n_nodes, edge_index, dim=2, seed=None):
+        self.calls += 1
+        return np.random.default_rng(seed).random((n_nodes, dim))
+
+
+def test_cached_layout_reuses_stored_positions(tmp_path):
+    layout = CountingLayout()
+    ids, edge_index = ["a", "b", "c"], np.array([[0, 1], [1, 2]])
+
+    first = cached_layout(ids, edge_index, layout, tmp_path, dim=3, seed=1)
+    again = cached_layout(ids, edge_index, layout, tmp_path, dim=3, seed=1)
+
+    assert layout.calls == 1
+    np.testing.assert_array_equal(first, again)
+    assert isinstance(again, np.memmap)
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+    assert not list(tmp_path.glob("*.partial"))
+
+
+@pytest.mark.parametrize(
+    "ids, edge_index, params",
+    [
+        (["a", "b", "d"], [[0, 1], [1, 2]], {"dim": 3, "seed": 1}),
+        (["b", "a", "c"], [[0, 1], [1, 2]], {"dim": 3, "seed": 1}),
+        (["a", "b", "c"], [[0, 1], [0, 2]], {"dim": 3, "seed": 1}),
+        (["a", "b", "c"], [[0, 1], [1, 2]], {"dim": 2, "seed": 1}),
+        (["a", "b", "c"], [[0, 1], [1, 2]], {"dim": 3, "seed": 2}),
+    ],
+)
+def test_cached_layout_key_changes(tmp_path, ids, edge_index, params):
+    layout = CountingLayout()
+    cached_layout(
+        ["a", "b", "c"], np.array([[0, 1], [1, 2]]), layout, tmp_path, dim=3, seed=1
+    )
+
+    coords = cached_layout(ids, np.array(edge_index), layout, tmp_path, **params)
+
+    assert layout.calls == 2
+    assert coords.shape == (3, params["dim"])
+
+
+def test_cached_layout_keys_on_the_engine(tmp_path):
+    ids, edge_index = ["a", "b", "c"], np.array([[0, 1], [1, 2]])
+    cached_layout(ids, edge_index, LAYOUTS["barnes_hut"], tmp_path, seed=1)
+    cached_layout(ids, edge_index, LAYOUTS["multilevel"], tmp_path, seed=1)
+
+    assert len(list(tmp_path.glob("*.npy"))) == 2
+
+
+def test_cached_layout_without_cache_dir(tmp_path):
+    layout = CountingLayout()
+    ids, edge_index = ["a", "b"], np.array([[0, 1]])
+
+    cached_layout(ids, edge_index, layout, "", seed=1)
+    cached_layout(ids, edge_index, layout, "", seed=1)
+
+    assert layout.calls == 2
@@ -0,0 +1,43 @@
+import pandas as pd
+
+import loaders
+from loaders import csv_to_arrow, load_table, read_arrow
+
+ROWS = [(f"{i:05d}", f"P-{i % 7}", str(i % 3), i * 0.5) for i in range(2_000)]
+
+
+def write_csv(path):
+    lines = ["voter_id,precinct,support,score"]
+    lines += [",".join(str(value) for value in row) for row in ROWS]
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def test_csv_to_arrow_streams_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(loaders, "BLOCK_SIZE", 4_096)
+    arrow_path = csv_to_arrow(
+        write_csv(tmp_path / "nodes.csv"), tmp_path / "nodes.arrow", ["voter_id"]
+    )
+    table = read_arrow(arrow_path)
+    assert not (tmp_path / "nodes.partial").exists()
+    assert table["voter_id"].tolist() == [row[0] for row in ROWS]
+    assert table["score"].tolist() == [row[3] for row in ROWS]
+
+
+def test_load_table_encodes_categories(tmp_path, monkeypatch):
+    monkeypatch.setattr(loaders, "BLOCK_SIZE", 4_096)
+    csv_path = write_csv(tmp_path / "nodes.csv")
+    table = load_table(
+        csv_path, categories=["precinct", "support"], strings=["voter_id"]
+    )
+    assert (tmp_path / "nodes.arrow").exists()
+    assert isinstance(table["precinct"].dtype, pd.CategoricalDtype)
+    assert sorted(table["precinct"].cat.categories) == [f"P-{i}" for i in range(7)]
+    # Numeric looking categories and ids stay text
+    assert sorted(table["support"].cat.categories) == ["0", "1", "2"]
+    assert table["voter_id"].iloc[:2].tolist() == ["00000", "00001"]
+    assert table["support"].astype(str).tolist() == [row[2] for row in ROWS]
+
+    # The Arrow copy is reused
+    again = load_table(csv_path, categories=["precinct", "support"])
+    pd.testing.assert_frame_equal(table, again)
@@ -0,0 +1,110 @@
+from functools import partial
+
+import pytest
+
+import jobs
+import main
+from main import COLUMNS, read_batch
+from updates import UpdateLog
+
+NODE = {
+    "voter_id": 12,
+    "first_name": "Emily",
+    "last_name": "Lee",
+    "phone": "(515)-555-0012",
+    "precinct": 3,
+    "support": "1 - Support",
+    "gender": "F",
+}
+
+
+def test_read_batch_reads_ids_as_text():
+    nodes, edges = read_batch(
+        {"nodes": [NODE], "edges": [{"source": 12, "target": "IA-3"}]}
+    )
+    assert list(nodes.columns) == COLUMNS
+    assert nodes["voter_id"].tolist() == ["12"]
+    assert edges.to_dict("records") == [{"source": "12", "target": "IA-3"}]
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        [NODE],
+        None,
+        {"nodes": NODE},
+        {"nodes": [NODE, "IA-1"]},
+        {"nodes": [{**NODE, "voter_id": {"a": 1}}]},
+        {"edges": [{"source": "IA-1", "target": ["IA-2"]}]},
+        {"nodes": [{"voter_id": "IA-1"}]},
+        {"edges": [{"source": "IA-1"}]},
+    ],
+)
+def test_read_batch_turns_away_malformed_bodies(payload):
+    with pytest.raises(ValueError):
+        read_batch(payload)
+
+
+SELECTION_OUTPUTS = [
+    ("source", "data"),
+    ("source", "page_current"),
+    ("source", "page_count"),
+    ("target", "data"),
+    ("target", "page_current"),
+    ("target", "page_count"),
+    ("source-title", "children"),
+    ("target-title", "children"),
+    ("selection", "data"),
+]
+
+
+@pytest.fixture(scope="module")
+def client():
+    # Callbacks run inline and batches stay in memory
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(jobs, "JOB_CACHE_DIR", "")
+        patch.setattr(main, "UpdateLog", partial(UpdateLog, ""))
+        main.create_app()
+    return main.app.server.test_client()
+
+
+def select(client, rows, row, shown, changed):
+    """Posts the selection callback the way the browser does"""
+    values = {
+        "search.active_cell": {"row": row, "column": 0},
+        "search.derived_viewport_data": rows,
+        "source.page_current": 0,
+        "source.page_size": 25,
+        "target.page_current": 0,
+        "target.page_size": 25,
+    }
+    outputs = [f"{id}.{prop}" for id, prop in SELECTION_OUTPUTS]
+    return client.post(
+        "/_dash-update-component",
+        json={
+            "output": f"..{'...'.join(outputs)}..",
+            "outputs": [{"id": id, "property": prop} for id, prop in SELECTION_OUTPUTS],
+            "inputs": [
+                {"id": key.split(".")[0], "property": key.split(".")[1], "value": value}
+                for key, value in values.items()
+            ],
+            "state": [{"id": "selection", "property": "data", "value": shown}],
+            "changedPropIds": changed,
+        },
+    )
+
+
+def test_update_selection_skips_the_person_shown(client):
+    rows = main.dataset.nodes[COLUMNS].iloc[:5].astype(object).to_dict("records")
+
+    response = select(client, rows, 1, None, ["search.active_cell"])
+    assert response.status_code == 200
+    person = response.get_json()["response"]["selection"]["data"]
+    assert person["voter_id"] == rows[1]["voter_id"]
+
+    # Sorting or filtering left the same person under the cell
+    response = select(client, rows, 1, person, ["search.derived_viewport_data"])
+    assert response.status_code == 204
+
+    response = select(client, rows, 2, person, ["search.derived_viewport_data"])
+    assert response.get_json()["response"]["selection"]["data"] == rows[2]
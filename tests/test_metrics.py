@@ -0,0 +1,124 @@
+import time
+
+import pytest
+
+from metrics import (
+    FRAMEWORK_STAGE,
+    Histogram,
+    Metrics,
+    Record,
+    add_totals,
+    count,
+    current,
+    format_totals,
+    stage,
+)
+
+
+def record(callback="update_names", stages=None, counts=None, failed=False):
+    finished = Record(time.perf_counter(), callback=callback, failed=failed)
+    finished.stages.update(stages or {"filter": 0.02, "other": 0.01})
+    finished.counts.update(counts or {"rows": 10})
+    return finished
+
+
+def test_stages_add_up_to_wall_time():
+    measured = Record(0.0)
+    token = current.set(measured)
+    try:
+        with stage("filter"):
+            with stage("figure"):
+                count("rows", 3)
+            count("rows", 2)
+    finally:
+        current.reset(token)
+    measured.switch(FRAMEWORK_STAGE)
+    assert set(measured.stages) == {FRAMEWORK_STAGE, "filter", "figure"}
+    assert measured.counts == {"rows": 5}
+
+
+def test_histogram_buckets_are_upper_bounds():
+    histogram = Histogram((1, 10))
+    for value in (0.5, 1, 5, 50):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.lines("h", 'a="b"') == [
+        'h_bucket{a="b",le="1"} 2',
+        'h_bucket{a="b",le="10"} 3',
+        'h_bucket{a="b",le="+Inf"} 4',
+        'h_sum{a="b"} 56.5',
+        'h_count{a="b"} 4',
+    ]
+
+
+def test_finish_adds_to_totals():
+    metrics = Metrics()
+    metrics.finish(record(), 2_000)
+    metrics.finish(record(failed=True, counts={"rows": 5}))
+    totals = metrics.totals()
+    assert totals["requests"] == {"update_names": 2}
+    assert totals["errors"] == {"update_names": 1}
+    assert totals["items"] == {("update_names", "rows"): 15}
+    assert totals["stage_seconds"][("update_names", "filter")] == pytest.approx(0.04)
+    assert totals["seconds"]["update_names"].counts[3] == 2
+    assert sum(totals["bytes"]["update_names"].counts) == 1
+
+
+def test_add_totals_sums_processes():
+    first, second = Metrics(), Metrics()
+    first.cache("figures", lambda: (3, 1))
+    second.cache("figures", lambda: (1, 1))
+    first.finish(record())
+    second.finish(record())
+    second.finish(record(callback="update_network"))
+    summed = add_totals([first.totals(), second.totals()])
+    assert dict(summed["requests"]) == {"update_names": 2, "update_network": 1}
+    assert summed["seconds"]["update_names"].counts[3] == 2
+    assert dict(summed["caches"]) == {("figures", "hit"): 4, ("figures", "miss"): 2}
+
+
+def test_format_totals():
+    metrics = Metrics()
+    metrics.cache("queries", lambda: (7, 2))
+    metrics.finish(record(stages={"filter": 0.5}, counts={"rows": 1}))
+    text = format_totals(metrics.totals(), 'worker="1",')
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    assert "# TYPE netviz_callback_requests_total counter" in lines
+    assert 'netviz_callback_requests_total{worker="1",callback="update_names"} 1' in (
+        lines
+    )
+    assert (
+        'netviz_callback_stage_seconds_total{worker="1",callback="update_names",'
+        'stage="filter"} 0.5'
+    ) in lines
+    assert (
+        'netviz_callback_items_total{worker="1",callback="update_names",kind="rows"} 1'
+    ) in lines
+    assert 'netviz_cache_requests_total{worker="1",cache="queries",result="hit"} 7' in (
+        lines
+    )
+    assert 'netviz_callback_seconds_count{worker="1",callback="update_names"} 1' in (
+        lines
+    )
+
+
+def test_render_adds_up_shared_totals(tmp_path):
+    pytest.importorskip("diskcache")
+    first, second = Metrics(), Metrics()
+    first.share_in(str(tmp_path))
+    second.share_in(str(tmp_path))
+    first.finish(record())
+    # Both are in this process, so the first keeps its totals under a key of
+    # its own
+    first.flush()
+    first.store.set("other", first.totals())
+    second.finish(record())
+    lines = second.render().splitlines()
+    assert 'netviz_callback_requests_total{callback="update_names"} 2' in lines
+
+
+def test_render_labels_unshared_totals_by_worker():
+    metrics = Metrics()
+    metrics.finish(record())
+    assert 'worker="' in metrics.render()
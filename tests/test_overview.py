@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from overview import cluster_nodes, overview_figure
+
+
+def test_cluster_nodes_ignores_precincts():
+    rng = np.random.default_rng(0)
+    # Four tight blobs, each mixing every precinct
+    centers = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]])
+    positions = np.repeat(centers, 250, axis=0) + rng.normal(0, 0.01, (1_000, 3))
+
+    clusters = cluster_nodes(positions, 50)
+
+    assert clusters.max() < 50
+    assert len(np.unique(clusters)) == 4
+    for blob in range(4):
+        assert len(np.unique(clusters[blob * 250 : (blob + 1) * 250])) == 1
+
+
+def test_overview_summarizes_past_the_limit():
+    rng = np.random.default_rng(1)
+    n = 2_000
+    nodes = pd.DataFrame(
+        {
+            "voter_id": [f"IA-{i}" for i in range(n)],
+            "precinct": rng.integers(0, 20, n),
+            "support": rng.choice(["1 - Support", "5 - Oppose"], n),
+        }
+    )
+    positions = rng.random((n, 3))
+    edge_index = rng.integers(0, n, (3_000, 2))
+
+    figure = overview_figure(nodes, positions, edge_index, limit=400)
+
+    edges, markers = figure["data"]
+    assert len(markers["x"]) <= 200
+    assert sum(int(text.split()[0].replace(",", "")) for text in markers["text"]) == n
+    assert len(edges["x"]) // 3 <= 400 - len(markers["x"])
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from spatial import point_grid, relayout_box
+
+
+def brute_force(positions, low, high):
+    with np.errstate(invalid="ignore"):
+        inside = (positions >= low) & (positions <= high)
+    return np.flatnonzero(inside.all(axis=1))
+
+
+@pytest.fixture(params=[2, 3])
+def positions(request):
+    rng = np.random.default_rng(request.param)
+    positions = rng.normal(size=(5_000, request.param))
+    # People without contacts have no position
+    positions[rng.choice(5_000, 200, replace=False)] = np.nan
+    return positions
+
+
+def test_box_matches_brute_force(positions):
+    grid = point_grid(positions)
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        corners = rng.normal(scale=1.5, size=(2, positions.shape[1]))
+        low, high = np.sort(corners, axis=0)
+        np.testing.assert_array_equal(
+            grid.box(low, high), brute_force(positions, low, high)
+        )
+
+
+def test_box_edges_and_unbounded_axes(positions):
+    grid = point_grid(positions)
+    dim = positions.shape[1]
+    # A box exactly around one person includes them
+    row = int(np.flatnonzero(~np.isnan(positions).any(axis=1))[0])
+    assert row in grid.box(positions[row], positions[row])
+
+    everyone = grid.box(np.full(dim, -np.inf), np.full(dim, np.inf))
+    np.testing.assert_array_equal(
+        everyone, np.flatnonzero(~np.isnan(positions).any(axis=1))
+    )
+    half = np.full(dim, np.inf)
+    half[0] = 0
+    np.testing.assert_array_equal(
+        grid.box(np.full(dim, -np.inf), half),
+        brute_force(positions, np.full(dim, -np.inf), half),
+    )
+    assert not len(grid.box(np.ones(dim), np.zeros(dim)))
+
+
+def test_box_without_positions():
+    grid = point_grid(np.full((10, 3), np.nan))
+    assert not len(grid.box(np.full(3, -np.inf), np.full(3, np.inf)))
+
+
+def test_relayout_box_reads_both_forms():
+    low, high = relayout_box({"xaxis.range[0]": 2, "xaxis.range[1]": -1}, 2)
+    np.testing.assert_array_equal(low, [-1, -np.inf])
+    np.testing.assert_array_equal(high, [2, np.inf])
+
+    low, high = relayout_box({"scene.yaxis.range": [0, 1]}, 3)
+    np.testing.assert_array_equal(low, [-np.inf, 0, -np.inf])
+    assert relayout_box({"xaxis.autorange": True}, 2) is None
@@ -0,0 +1,42 @@
+import pandas as pd
+
+from loaders import read_arrow
+from synthetic import generate, tables
+
+
+def test_tables_are_seeded():
+    nodes, edges = tables(2_000, 5_000, seed=7)
+    same_nodes, same_edges = tables(2_000, 5_000, seed=7)
+    other_nodes, other_edges = tables(2_000, 5_000, seed=8)
+
+    pd.testing.assert_frame_equal(nodes, same_nodes)
+    pd.testing.assert_frame_equal(edges, same_edges)
+    assert not nodes.equals(other_nodes)
+    assert not edges.equals(other_edges)
+
+
+def test_tables_are_consistent():
+    nodes, edges = tables(2_000, 5_000, seed=7)
+
+    assert nodes["voter_id"].is_unique
+    assert edges["source"].isin(nodes["voter_id"]).all()
+    assert edges["target"].isin(nodes["voter_id"]).all()
+    assert (edges["source"] != edges["target"]).all()
+    assert not edges.duplicated().any()
+    assert nodes["precinct"].nunique() == 2
+
+
+def test_precinct_size():
+    nodes, _ = tables(100, 150, precinct_size=20)
+
+    assert nodes["precinct"].nunique() == 5
+
+
+def test_generate_writes_the_tables(tmp_path):
+    nodes, edges = tables(2_000, 5_000, seed=7)
+
+    nodes_path, edges_path, written = generate(tmp_path, 2_000, 5_000, seed=7)
+
+    assert written == len(edges)
+    pd.testing.assert_frame_equal(read_arrow(nodes_path), nodes)
+    pd.testing.assert_frame_equal(read_arrow(edges_path), edges)
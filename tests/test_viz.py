@@ -0,0 +1,71 @@
+from base64 import b64decode
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from viz import SUPPORT_COLORS, color_codes, encode_array, palette_scale
+
+
+def decode(encoded):
+    """What assets/network.js does with an encoded array"""
+    values = np.frombuffer(b64decode(encoded["bdata"]), dtype="<" + encoded["dtype"])
+    if "categories" in encoded:
+        return np.array(encoded["categories"], dtype=object)[values]
+    return values
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        np.array([0.5, -1.25, np.nan, 3e6]),
+        np.array([0.5, np.nan], dtype=np.float32),
+        pd.Series([1.0, 2.0, None]),
+        [0.1, 0.2, 0.3],
+        np.empty(0),
+    ],
+)
+def test_floats_round_trip(values):
+    expected = np.asarray(values, dtype=np.float32)
+    np.testing.assert_array_equal(decode(encode_array(values)), expected)
+
+
+@pytest.mark.parametrize(
+    "values",
+    [np.array([0, -1, 2**31 - 1]), np.array([True, False]), [1, 2, 3]],
+)
+def test_integers_round_trip(values):
+    np.testing.assert_array_equal(decode(encode_array(values)), np.asarray(values))
+
+
+def test_repeated_text_round_trips():
+    values = ["#ff0000", "#00ff00", "#ff0000", "#ff0000", "#00ff00"]
+    encoded = encode_array(values)
+    assert "categories" in encoded
+    assert decode(encoded).tolist() == values
+
+
+@pytest.mark.parametrize("values", [["a", "b", "c"], "#ff0000", None, 3.5])
+def test_other_values_left_alone(values):
+    encoded = encode_array(values)
+    if isinstance(values, list):
+        assert list(encoded) == values
+    else:
+        assert encoded == values
+
+
+def test_color_codes_follow_the_palette():
+    support = pd.Series(["1 - Support", None, "5 - Oppose", "Other", "1 - Support"])
+
+    codes = color_codes(support)
+    scale = dict(
+        (round(stop * len(SUPPORT_COLORS)), color) for stop, color in palette_scale()
+    )
+
+    assert [scale[code] for code in codes] == [
+        SUPPORT_COLORS["1 - Support"],
+        "#888",
+        SUPPORT_COLORS["5 - Oppose"],
+        "#888",
+        SUPPORT_COLORS["1 - Support"],
+    ]
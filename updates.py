@@ -0,0 +1,56 @@
+import os
+from pathlib import Path
+from typing import Any, List
+
+# Where /ingest keeps the batches it is sent, shared by every worker so
+# each can apply them, or an empty string to keep them in this process
+UPDATE_LOG_DIR = os.environ.get(
+    "UPDATE_LOG_DIR", str(Path(__file__).parent / ".update_log")
+)
+
+
+class UpdateLog:
+    """Batches of new voters and contacts, numbered from 1 as received
+
+    Batches go into a diskcache in `directory` when diskcache is
+    installed, so every server process sees the same batches under the
+    same numbers. Otherwise they are only kept in this process.
+    """
+
+    def __init__(self, directory: str = UPDATE_LOG_DIR):
+        self.cache = None
+        self.batches: List[Any] = []
+        if directory:
+            try:
+                import diskcache
+
+                self.cache = diskcache.Cache(directory)
+            except ImportError:
+                pass
+
+    def __len__(self) -> int:
+        if self.cache is None:
+            return len(self.batches)
+        return self.cache.get("count", 0)
+
+    def append(self, batch) -> int:
+        """Stores a batch and returns its number"""
+        if self.cache is None:
+            self.batches.append(batch)
+            return len(self.batches)
+        # Numbering and storing in one transaction, so a reader that sees
+        # the count always finds the batch
+        with self.cache.transact():
+            number = self.cache.incr("count")
+            self.cache.set(number, batch)
+        return number
+
+    def get(self, number: int):
+        if self.cache is None:
+            return self.batches[number - 1]
+        return self.cache[number]
+
+    def clear(self):
+        self.batches.clear()
+        if self.cache is not None:
+            self.cache.clear()
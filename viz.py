@@ -1,15 +1,46 @@
-from typing import List, Tuple, Iterable
+import math
+from base64 import b64encode
+from typing import Any, Dict, Iterable, List, Tuple
 
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-from dash import dash_table, dcc
-from networkx.classes.graph import Graph
+from dash import Patch, dash_table, dcc
 from pandas.core.frame import DataFrame
+from pandas.core.series import Series
 from plotly.graph_objs import Scatter3d
 
+from graph import GraphCore
+from metrics import timed
 
-def unpack_edges(network: Graph) -> Tuple[List[float]]:
+
+@timed
+def edge_lines(positions: np.ndarray, edge_index: np.ndarray) -> np.ndarray:
+    """Builds plotly line buffers from position and edge index arrays
+
+    Returns an array with one row per network dimension laid out as
+    [edge 1 x0, edge 1 x1, nan, edge 2 x0, edge 2 x1, nan, ...]
+
+    The NaN after each edge tells plotly to lift the pen, so every
+    edge is drawn as its own segment within a single trace.
+    """
+    n_edges = len(edge_index)
+    lines = np.full((positions.shape[1], n_edges, 3), np.nan)
+    lines[:, :, 0] = positions[edge_index[:, 0]].T
+    lines[:, :, 1] = positions[edge_index[:, 1]].T
+    return lines.reshape(positions.shape[1], 3 * n_edges)
+
+
+def scene_axes(values: np.ndarray) -> np.ndarray:
+    """Pads (dim, n) coordinates of a 2D layout with a flat z axis"""
+    missing = 3 - len(values)
+    if not missing:
+        return values
+    return np.vstack([values, np.zeros((missing, values.shape[1]))])
+
+
+@timed
+def unpack_edges(core: GraphCore) -> np.ndarray:
     """Manipulates the wonky network data into wonky lists
 
     Lists will be as follows:
@@ -18,43 +49,86 @@ def unpack_edges(network: Graph) -> Tuple[List[float]]:
     The lists are one-dimensionsal; each dimension will have its
     own list
     """
-    positions = []
-    for edge in network.edges():
-        # `edge` is a container with two values
-        source = edge[0]
-        target = edge[1]
+    return edge_lines(core.positions, core.edge_index)
 
-        # "position" is an array with one element per network dimension
-        source_coords = network.nodes[source]["position"]
-        target_coords = network.nodes[target]["position"]
-        padding = [None for _ in source_coords]
 
-        positions.append(source_coords)
-        positions.append(target_coords)
-        positions.append(padding)
+@timed
+def unpack_nodes(core: GraphCore, matches: Iterable | None = None) -> DataFrame:
+    """The voter_id and position of each placed person, or only `matches`
 
-    # Transpose the list to get ndim lists of len(network.edges())
-    transposed = pd.DataFrame(positions).T.values
-    return transposed
+    There is one position column per layout dimension: x, y and maybe z.
+    """
+    rows = core.placed()
+    if matches is not None:
+        rows = rows[core.ids[rows].isin(list(matches))]
+    df = pd.DataFrame(core.positions[rows], columns=["x", "y", "z"][: core.dim])
+    df.insert(0, "voter_id", core.ids[rows])
+    return df
 
 
-def unpack_nodes(network: Graph, matches: Iterable | None = None) -> DataFrame:
-    id_to_position_lookup = network._node.items()
-    if matches is not None:
-        matches = set(matches)
-        filtered = {k: v["position"] for k, v in id_to_position_lookup if k in matches}
-    else:
-        filtered = {k: v["position"] for k, v in id_to_position_lookup}
-    positions = []
-    for _id, pos in filtered.items():
-        positions.append([_id, *pos])
+SUPPORT_COLORS = {
+    "5 - Oppose": "#db231d",
+    "4 - Lean Oppose": "#e97b77",
+    "3 - Undecided": "#b094b0",
+    "2 - Lean Support": "#77ace9",
+    "1 - Support": "#1d76db",
+}
 
-    # TODO: Generalize for 2d?
-    df = pd.DataFrame(positions, columns=["voter_id", "x", "y", "z"])
-    return df
+# Where the camera starts when the whole network is shown
+OVERVIEW_EYE = {"x": 0.7, "y": 0.7, "z": 0.7}
+
+
+# Drawn for anyone whose support isn't one of SUPPORT_COLORS
+MISSING_COLOR = "#888"
+
+
+def color_codes(values: Series, palette: Dict = SUPPORT_COLORS) -> np.ndarray:
+    """Numbers each value by its place in `palette`, see `palette_scale`
+
+    Plotly checks every color string it is given, which took most of the
+    time spent drawing a large network, while a number array is checked
+    at once. Each category is looked up once and gathered by code, and
+    anything outside the palette gets the number after its last color.
+    """
+    values = values.astype("category")
+    order = {category: i for i, category in enumerate(palette)}
+    # Code -1, a missing value, lands on the trailing entry
+    lookup = [order.get(category, len(palette)) for category in values.cat.categories]
+    return np.array(lookup + [len(palette)], dtype=np.int32)[values.cat.codes]
+
+
+def palette_scale(palette: Dict = SUPPORT_COLORS) -> List:
+    """A colorscale putting `color_codes` back on their palette colors"""
+    colors = [*palette.values(), MISSING_COLOR]
+    return [[i / (len(colors) - 1), color] for i, color in enumerate(colors)]
+
+
+@timed
+def hover_text(nodes: DataFrame) -> np.ndarray:
+    """Builds "first last" labels for just the rows being drawn
 
+    Each distinct pair of names is joined once, rather than every row.
+    """
+    first = nodes["first_name"].astype("category").cat
+    last = nodes["last_name"].astype("category").cat
+    # Missing names get the trailing empty string
+    first_names = np.append(first.categories.astype(str), "")
+    last_names = np.append(last.categories.astype(str), "")
+    first_codes = first.codes.to_numpy(np.int64) % len(first_names)
+    last_codes = last.codes.to_numpy(np.int64) % len(last_names)
+
+    pairs, inverse = np.unique(
+        first_codes * len(last_names) + last_codes, return_inverse=True
+    )
+    labels = [
+        f"{first_names[pair // len(last_names)]} {last_names[pair % len(last_names)]}"
+        for pair in pairs
+    ]
+    return np.array(labels, dtype=object)[inverse]
 
-def graph_edges(x: List, y: List, z: List, ids: List) -> Scatter3d:
+
+@timed
+def graph_edges(x: np.ndarray, y: np.ndarray, z: np.ndarray, ids: List) -> Scatter3d:
     # TODO: Generalize
     edge_trace = go.Scatter3d(
         x=x,
@@ -70,8 +144,15 @@ def graph_edges(x: List, y: List, z: List, ids: List) -> Scatter3d:
     return edge_trace
 
 
+@timed
 def graph_nodes(
-    x: np.array, y: List, z: List, node_colors: List, node_text: List, ids: List
+    x: np.array,
+    y: List,
+    z: List,
+    node_colors: np.ndarray,
+    node_text: List,
+    ids: List,
+    node_sizes: float | np.ndarray = 5,
 ) -> Scatter3d:
     node_trace = go.Scatter3d(
         x=x,
@@ -80,29 +161,65 @@ def graph_nodes(
         mode="markers",
         hoverinfo="text",
         showlegend=True,
-        marker=dict(color=node_colors, size=5, line_width=2),
-        hoverlabel=dict(bgcolor=node_colors),
+        # Hover labels take the color each code maps to
+        marker=dict(
+            color=node_colors,
+            colorscale=palette_scale(),
+            cmin=0,
+            cmax=len(SUPPORT_COLORS),
+            size=node_sizes,
+            line_width=2,
+        ),
     )
     node_trace.customdata = ids
     node_trace.text = node_text
     return node_trace
 
 
+@timed
+def page_records(
+    df: DataFrame, columns: List, page_current: int, page_size: int
+) -> Tuple[List[Dict], int, int]:
+    """Serializes a single page of a frame for a custom-paged table
+
+    Returns the page's records, the page actually shown (pages past
+    the end fall back to the last one) and the total number of pages.
+    """
+    page_count = max(math.ceil(len(df) / page_size), 1)
+    page_current = min(page_current or 0, page_count - 1)
+    start = page_current * page_size
+    records = df.iloc[start : start + page_size][columns].to_dict(orient="records")
+    return records, page_current, page_count
+
+
+@timed
 def display_table(
-    df: DataFrame, columns: List, html_id: str, search=False
+    df: DataFrame,
+    columns: List,
+    html_id: str,
+    search=False,
+    page_size: int | None = None,
 ) -> dash_table.DataTable:
     # Dash requires a list of dictionaries with "id", "name" fields
     dash_columns = [{"id": column, "name": column} for column in columns]
-    # Data needs to be list of dictionaries for the HTML table
-    dash_data = df[columns].to_dict(orient="records")
 
     style = {"maxHeight": 350, "overflowY": "scroll"}
     kwargs = {
         "id": html_id,
         "columns": dash_columns,
-        "data": dash_data,
         "style_table": style,
     }
+    if page_size is None:
+        # Data needs to be list of dictionaries for the HTML table
+        kwargs["data"] = df[columns].to_dict(orient="records")
+    else:
+        # Only the first page goes out with the layout, callbacks
+        # send the rest one page at a time
+        kwargs["data"], _, kwargs["page_count"] = page_records(
+            df, columns, 0, page_size
+        )
+        kwargs.update(page_action="custom", page_current=0, page_size=page_size)
+
     if search:
         data_table = dash_table.DataTable(
             filter_action="custom", filter_query="", **kwargs
@@ -161,45 +278,202 @@ operators = [
 ]
 
 
-def display_network(
-    edge_trace: List, node_trace: go.Scatter3d, filtered: bool = False
-) -> dcc.Graph:
+@timed
+def network_figure(
+    edge_trace: List,
+    node_trace: go.Scatter3d,
+    filtered: bool = False,
+    ranges: np.ndarray | None = None,
+) -> Dict:
+    """Builds the network figure as a plain dict, ready to cache or send
+
+    `ranges` holds the low and high end of each axis, which keeps views of
+    parts of the network on the same scale as the whole.
+    """
     if not filtered:
-        eye = {"x": 0.7, "y": 0.7, "z": 0.7}
+        eye = OVERVIEW_EYE
     else:
         eye = {"x": 1, "y": 1, "z": 1}
-    return dcc.Graph(
-        id="network",
-        figure=go.Figure(
-            data=[edge_trace, node_trace],
-            layout=go.Layout(
-                showlegend=False,
-                hovermode="closest",
-                margin=dict(b=20, l=5, r=5, t=40),
-                scene=dict(
-                    camera=dict(center=dict(x=0, y=0, z=0), eye=eye),
-                    xaxis=dict(
-                        color="rgba(0,0,0,0)",
-                        showbackground=False,
-                        showgrid=False,
-                        zeroline=False,
-                        showticklabels=False,
-                    ),
-                    yaxis=dict(
-                        color="rgba(0,0,0,0)",
-                        showbackground=False,
-                        showgrid=False,
-                        zeroline=False,
-                        showticklabels=False,
-                    ),
-                    zaxis=dict(
-                        color="rgba(0,0,0,0)",
-                        showbackground=False,
-                        showgrid=False,
-                        zeroline=False,
-                        showticklabels=False,
-                    ),
+    if ranges is None:
+        ranges = [None] * 3
+    else:
+        # 2D layouts are drawn flat, with the z axis left to plotly
+        ranges = np.asarray(ranges, dtype=float).tolist()
+        ranges += [None] * (3 - len(ranges))
+    # The traces and layout were validated as they were built
+    return go.Figure(
+        _validate=False,
+        data=[edge_trace, node_trace],
+        layout=go.Layout(
+            showlegend=False,
+            hovermode="closest",
+            margin=dict(b=20, l=5, r=5, t=40),
+            scene=dict(
+                camera=dict(center=dict(x=0, y=0, z=0), eye=eye),
+                xaxis=dict(
+                    range=ranges[0],
+                    color="rgba(0,0,0,0)",
+                    showbackground=False,
+                    showgrid=False,
+                    zeroline=False,
+                    showticklabels=False,
+                ),
+                yaxis=dict(
+                    range=ranges[1],
+                    color="rgba(0,0,0,0)",
+                    showbackground=False,
+                    showgrid=False,
+                    zeroline=False,
+                    showticklabels=False,
+                ),
+                zaxis=dict(
+                    range=ranges[2],
+                    color="rgba(0,0,0,0)",
+                    showbackground=False,
+                    showgrid=False,
+                    zeroline=False,
+                    showticklabels=False,
                 ),
             ),
         ),
+    ).to_plotly_json()
+
+
+# The parts of the network figure that differ between views
+TRACE_UPDATES = [
+    ("x",),
+    ("y",),
+    ("z",),
+    ("customdata",),
+    ("text",),
+    ("marker", "color"),
+    ("marker", "size"),
+]
+
+
+def figure_changes(figure: Dict, camera: bool = True) -> List[Tuple[List, Any]]:
+    """The (location, value) pairs that turn any network figure into `figure`
+
+    Only trace arrays, axis ranges and the camera are included, so the
+    browser keeps its scene and the layout is only sent with the page.
+    Leaving out the camera keeps wherever the user has moved it.
+    """
+    changes = []
+    for i, trace in enumerate(figure["data"]):
+        for *parents, key in TRACE_UPDATES:
+            source = trace
+            for parent in parents:
+                source = source.get(parent)
+            if source is not None:
+                # Missing values are cleared rather than left from before
+                changes.append((["data", i, *parents, key], source.get(key)))
+    scene = figure["layout"]["scene"]
+    for axis in ("xaxis", "yaxis", "zaxis"):
+        changes.append((["layout", "scene", axis, "range"], scene[axis].get("range")))
+    if camera:
+        changes.append((["layout", "scene", "camera", "eye"], scene["camera"]["eye"]))
+    return changes
+
+
+@timed
+def figure_patch(figure: Dict, camera: bool = True) -> Patch:
+    """Updates the network figure on the page to match `figure` in place"""
+    patch = Patch()
+    for location, value in figure_changes(figure, camera):
+        target = patch
+        for key in location[:-1]:
+            target = target[key]
+        target[location[-1]] = value
+    return patch
+
+
+def encode_array(values: Any) -> Any:
+    """Packs an array into base64 for `assets/network.js` to unpack
+
+    Numbers are sent as float32 or int32 typed arrays rather than JSON
+    lists, which also keeps NaN gaps as NaN instead of null. Text with
+    repeats, like colors, is sent as int32 codes plus its distinct values.
+    Anything else is left alone.
+    """
+    if not isinstance(values, (np.ndarray, pd.Series, list)):
+        return values
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        return {"dtype": "f4", "bdata": b64encode(values.astype("<f4")).decode()}
+    if values.dtype.kind in "iub":
+        return {"dtype": "i4", "bdata": b64encode(values.astype("<i4")).decode()}
+    codes, categories = pd.factorize(values)
+    if len(categories) > len(values) // 2:
+        return values
+    return {
+        "dtype": "i4",
+        "bdata": b64encode(codes.astype("<i4")).decode(),
+        "categories": categories.tolist(),
+    }
+
+
+@timed
+def figure_update(figure: Dict, camera: bool = True) -> List[Tuple[List, Any]]:
+    """The changes of `figure_patch` with their trace arrays packed into base64
+
+    Layout values such as axis ranges stay plain lists, since plotly.js
+    ignores a range that isn't a plain array and autoscales instead.
+    """
+    return [
+        (location, encode_array(value) if location[0] == "data" else value)
+        for location, value in figure_changes(figure, camera)
+    ]
+
+
+def figure_skeleton(figure: Dict) -> Dict:
+    """A copy of a network figure without its trace arrays, for page load"""
+    data = []
+    for trace in figure["data"]:
+        trace = dict(trace)
+        for *parents, key in TRACE_UPDATES:
+            # Copy each nested dict on the way down rather than editing it
+            parent_dict = trace
+            for parent in parents:
+                if parent not in parent_dict:
+                    break
+                parent_dict[parent] = dict(parent_dict[parent])
+                parent_dict = parent_dict[parent]
+            else:
+                parent_dict.pop(key, None)
+        data.append(trace)
+    return {**figure, "data": data}
+
+
+@timed
+def subgraph_figure(
+    nodes: DataFrame,
+    positions: np.ndarray,
+    rows: np.ndarray,
+    edge_rows: np.ndarray,
+    filtered: bool = False,
+    ranges: np.ndarray | None = None,
+) -> Dict:
+    """Draws the given node rows and (n_edges, 2) edge rows of the network"""
+    shown = nodes.iloc[rows]
+    lines = scene_axes(edge_lines(positions, edge_rows))
+    edge_trace = graph_edges(*lines, ids=shown["voter_id"])
+    x, y, z = scene_axes(positions[rows].T)
+    node_trace = graph_nodes(
+        x=x,
+        y=y,
+        z=z,
+        node_colors=color_codes(shown["support"]),
+        node_text=hover_text(shown),
+        ids=shown["voter_id"],
     )
+    return network_figure(edge_trace, node_trace, filtered, ranges)
+
+
+def network_graph(figure: Dict) -> dcc.Graph:
+    return dcc.Graph(id="network", figure=figure)
+
+
+def display_network(
+    edge_trace: List, node_trace: go.Scatter3d, filtered: bool = False
+) -> dcc.Graph:
+    return network_graph(network_figure(edge_trace, node_trace, filtered))